@@ -1,5 +1,5 @@
 from a2wsgi import ASGIMiddleware
 
-from book_prices.api.app import app as fastapi_app
+from book_prices.api.app import create_app
 
-application = ASGIMiddleware(fastapi_app)
+application = ASGIMiddleware(create_app())
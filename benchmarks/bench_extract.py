@@ -0,0 +1,136 @@
+"""Product-page extraction: BeautifulSoup (before) vs lxml single pass (after).
+
+    python -m benchmarks.bench_extract [--rounds 50] [--json results.json]
+
+Runs offline against the saved pages in benchmarks/fixtures and reports CPU time and
+peak Python heap per page for both paths, after checking they extract the same offer.
+The heap figure comes from tracemalloc, which doesn't see libxml2's own (short-lived)
+C allocations; what it does show is the BeautifulSoup object tree that no longer exists.
+"""
+import argparse
+import glob
+import json
+import os
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+from book_prices.adapters import biblusi, parnasi
+from book_prices.adapters.biblusi import BiblusiAdapter
+from book_prices.adapters.parnasi import ParnasiAdapter, PRICE_RE, extract_price_fallback_ignore_cart
+from book_prices.core.models import Offer, ProductRef
+from book_prices.core.parsing import (
+    extract_availability_from_text,
+    extract_isbn_labeled,
+    extract_price_gel_from_text,
+    normalize_price,
+)
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+# The extraction code as it was before the lxml engine, kept here as the baseline.
+def legacy_biblusi(product: ProductRef, html: bytes) -> Offer:
+    soup = BeautifulSoup(html.decode("utf-8"), "lxml")
+    h1 = soup.find("h1")
+    title = h1.get_text(strip=True) if h1 else soup.title.get_text(strip=True) if soup.title else None
+    text = soup.get_text(" ", strip=True)
+    return Offer(
+        store="biblusi", url=product.url, title=title,
+        price_gel=extract_price_gel_from_text(text),
+        isbn=extract_isbn_labeled(text),
+        in_stock=extract_availability_from_text(text, biblusi.IN_STOCK_TEXT, biblusi.OUT_OF_STOCK_TEXT),
+        store_product_id=product.store_product_id,
+    )
+
+
+def legacy_parnasi(product: ProductRef, html: bytes) -> Offer:
+    soup = BeautifulSoup(html.decode("utf-8"), "lxml")
+    h1 = soup.find("h1")
+    title = h1.get_text(strip=True) if h1 else None
+    text = soup.get_text(" ", strip=True)
+
+    price_el = (
+        soup.select_one("div.product div.summary p.price") or
+        soup.select_one("div.product div.summary .price") or
+        soup.select_one("p.price") or
+        soup.select_one(".price")
+    )
+    price_gel = None
+    if price_el:
+        m = PRICE_RE.search(price_el.get_text(" ", strip=True))
+        price_gel = normalize_price(m.group(1)) if m else None
+    if price_gel is None:
+        price_gel = extract_price_fallback_ignore_cart(text)
+
+    return Offer(
+        store="parnasi", url=product.url, title=title, price_gel=price_gel,
+        isbn=extract_isbn_labeled(text),
+        in_stock=extract_availability_from_text(text, parnasi.IN_STOCK_TEXT, parnasi.OUT_OF_STOCK_TEXT),
+        store_product_id=product.store_product_id,
+    )
+
+
+PATHS = {
+    "biblusi": (legacy_biblusi, BiblusiAdapter(http=None).parse_offer),
+    "parnasi": (legacy_parnasi, ParnasiAdapter(http=None).parse_offer),
+}
+
+
+def measure(fn, product, html, rounds: int) -> dict:
+    fn(product, html)  # warm-up (regex/XPath compilation, imports)
+
+    start = time.process_time()
+    for _ in range(rounds):
+        fn(product, html)
+    cpu_ms = (time.process_time() - start) / rounds * 1000
+
+    tracemalloc.start()
+    fn(product, html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"cpu_ms": round(cpu_ms, 3), "peak_kib": round(peak / 1024, 1)}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rounds", type=int, default=50)
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    results = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES, "*_product_*.html"))):
+        name = os.path.basename(path)
+        store = name.split("_", 1)[0]
+        with open(path, "rb") as f:
+            html = f.read()
+        product = ProductRef(store=store, url=f"https://fixture/{name}", store_product_id=name)
+
+        before_fn, after_fn = PATHS[store]
+        before, after = before_fn(product, html), after_fn(product, html)
+        results.append({
+            "page": name,
+            "bytes": len(html),
+            "same_offer": before == after,
+            "before": measure(before_fn, product, html, args.rounds),
+            "after": measure(after_fn, product, html, args.rounds),
+        })
+
+    print(f"{'page':44} {'KiB':>6} {'cpu ms before/after':>22} {'py-heap KiB before/after':>24}  same")
+    for r in results:
+        b, a = r["before"], r["after"]
+        print(
+            f"{r['page']:44} {r['bytes'] / 1024:6.0f} "
+            f"{b['cpu_ms']:10.2f} / {a['cpu_ms']:<9.2f} "
+            f"{b['peak_kib']:11.0f} / {a['peak_kib']:<10.0f}  {r['same_offer']}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"benchmark": "extract", "rounds": args.rounds, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Title matching (book_prices.core.matching): accuracy and throughput.
+
+    python -m benchmarks.bench_matching [--sizes 10000,100000] [--queries 2000]
+                                        [--thresholds 0.6,0.7,0.8,0.9] [--json results.json]
+
+- accuracy:   the labelled titles in benchmarks/fixtures/title_matches.json, one row per
+              threshold: precision (links that are right), recall (expected links made)
+- throughput: generated catalogues of --sizes books, --queries product titles against
+              each, half of them typo'd / re-punctuated copies of a book title and half
+              titles that aren't in the catalogue. Reports index build time, match rate,
+              candidates scored per title (vs. every book for all-pairs), and the
+              precision / recall on the generated labels. The all-pairs baseline is timed
+              on a sample of the queries.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import time
+
+from book_prices.core.matching import MATCH_MARGIN, BookTitle, TitleIndex, jaccard, trigrams
+from book_prices.storage.common import title_norm
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "title_matches.json")
+
+LETTERS = "აბგდევზთიკლმნოპჟრსტუფქღყშჩცძწჭხჯჰ"
+
+
+def accuracy(pairs: list[tuple[str, int | None]], index: TitleIndex) -> dict:
+    right = wrong = expected = 0
+    for t, book_id in pairs:
+        expected += book_id is not None
+        r = index.match(title_norm(t))
+        if r.book_id is None:
+            continue
+        if r.book_id == book_id:
+            right += 1
+        else:
+            wrong += 1
+    return {
+        "links": right + wrong,
+        "precision": round(right / (right + wrong), 4) if right + wrong else None,
+        "recall": round(right / expected, 4) if expected else None,
+    }
+
+
+def bench_fixture(thresholds: list[float]) -> list[dict]:
+    with open(FIXTURE, encoding="utf-8") as f:
+        data = json.load(f)
+    books = [BookTitle(b["id"], title_norm(b["title"])) for b in data["books"]]
+    pairs = [(p["title"], p["book"]) for p in data["products"]]
+    return [
+        {"name": "fixture", "threshold": t, "products": len(pairs), **accuracy(pairs, TitleIndex(books, t))}
+        for t in thresholds
+    ]
+
+
+def word(rnd: random.Random) -> str:
+    return "".join(rnd.choice(LETTERS) for _ in range(rnd.randint(3, 9)))
+
+
+def typo(rnd: random.Random, t: str) -> str:
+    # One edit a listing might plausibly have: a dropped or doubled letter, or punctuation
+    i = rnd.randrange(len(t))
+    kind = rnd.random()
+    if kind < 0.3:
+        return t[:i] + t[i + 1:]
+    if kind < 0.6:
+        return t[:i] + t[i] + t[i:]
+    return f"„{t}“." if kind < 0.8 else t.upper()
+
+
+def catalogue(size: int, queries: int, seed: int = 1):
+    rnd = random.Random(seed)
+    vocab = [word(rnd) for _ in range(max(1000, size // 5))]
+    titles = set()
+    while len(titles) < size:
+        titles.add(" ".join(rnd.choice(vocab) for _ in range(rnd.randint(2, 5))))
+    books = [BookTitle(i + 1, title_norm(t)) for i, t in enumerate(sorted(titles))]
+
+    pairs = []
+    for i in range(queries):
+        if i % 2 == 0:
+            b = rnd.choice(books)
+            pairs.append((typo(rnd, b.title_norm), b.book_id))
+        else:
+            t = " ".join(rnd.choice(vocab) for _ in range(rnd.randint(2, 5)))
+            pairs.append((t, None if title_norm(t) not in titles else -1))
+    # Generated "new" titles that collide with the catalogue are dropped from the labels
+    return books, [p for p in pairs if p[1] != -1]
+
+
+def all_pairs_match(books_grams: list, t: str, threshold: float):
+    grams = trigrams(title_norm(t))
+    scored = sorted(((jaccard(grams, g), i) for i, g in enumerate(books_grams)), reverse=True)[:2]
+    if not scored or scored[0][0] < threshold:
+        return None
+    if len(scored) > 1 and scored[1][0] > scored[0][0] - MATCH_MARGIN:
+        return None
+    return scored[0][1]
+
+
+def bench_throughput(size: int, queries: int, threshold: float, baseline_sample: int) -> dict:
+    books, pairs = catalogue(size, queries)
+
+    started = time.perf_counter()
+    index = TitleIndex(books, threshold)
+    build_s = time.perf_counter() - started
+
+    candidates = 0
+    started = time.perf_counter()
+    for t, _ in pairs:
+        candidates += index.match(title_norm(t)).candidates
+    match_s = time.perf_counter() - started
+
+    grams = [trigrams(b.title_norm) for b in books]
+    sample = pairs[:baseline_sample]
+    started = time.perf_counter()
+    for t, _ in sample:
+        all_pairs_match(grams, t, threshold)
+    all_pairs_s = time.perf_counter() - started
+
+    return {
+        "name": "generated",
+        "threshold": threshold,
+        "size": size,
+        "products": len(pairs),
+        "build_s": round(build_s, 3),
+        "match_ms": round(match_s / len(pairs) * 1000, 4),
+        "titles_per_sec": round(len(pairs) / match_s, 1),
+        "candidates_per_title": round(candidates / len(pairs), 2),
+        "all_pairs_ms": round(all_pairs_s / len(sample) * 1000, 4) if sample else None,
+        **accuracy(pairs, index),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="10000,100000", help="comma separated catalogue sizes")
+    ap.add_argument("--queries", type=int, default=2000, help="product titles matched per size")
+    ap.add_argument("--thresholds", default="0.6,0.7,0.8,0.9")
+    ap.add_argument("--threshold", type=float, default=0.8, help="threshold for the generated runs")
+    ap.add_argument("--baseline-sample", type=int, default=50, help="queries timed against all pairs")
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    fixture = bench_fixture([float(t) for t in args.thresholds.split(",") if t])
+    print(f"{'fixture threshold':20} {'products':>9} {'links':>7} {'precision':>10} {'recall':>8}")
+    for r in fixture:
+        print(f"{r['threshold']:<20} {r['products']:>9} {r['links']:>7} "
+              f"{r['precision'] or 0:>10.3f} {r['recall'] or 0:>8.3f}")
+
+    generated = [
+        bench_throughput(int(s), args.queries, args.threshold, args.baseline_sample)
+        for s in args.sizes.split(",") if s
+    ]
+    print()
+    print(f"{'books':>8} {'build s':>8} {'match ms':>9} {'titles/s':>10} {'cands':>7} "
+          f"{'all-pairs ms':>13} {'precision':>10} {'recall':>8}")
+    for r in generated:
+        print(f"{r['size']:>8} {r['build_s']:>8.2f} {r['match_ms']:>9.3f} {r['titles_per_sec']:>10.1f} "
+              f"{r['candidates_per_title']:>7.1f} {r['all_pairs_ms'] or 0:>13.2f} "
+              f"{r['precision'] or 0:>10.3f} {r['recall'] or 0:>8.3f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "benchmark": "matching",
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "results": fixture + generated,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Cold start of an API worker, the way Passenger spawns one.
+
+    python -m benchmarks.bench_startup [--runs 5] [--path /api/books] [--json results.json]
+
+Each run is a fresh interpreter that imports `application` (passenger_wsgi.py minus the
+host-specific venv paths) and then sends requests through the WSGI callable:
+- import:  time to import the app, and RSS / loaded modules right after
+- first:   /health, no database involved
+- first db / second db: --path twice; the first one opens the pool
+The database comes from the usual environment (DB_BACKEND, DB_*, SQLITE_PATH).
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def rss_mib() -> float:
+    # Current resident set (Linux); peak RSS elsewhere
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def wsgi_get(application, path: str) -> tuple[str, float, int]:
+    path, _, query = path.partition("?")
+    environ = {
+        "REQUEST_METHOD": "GET",
+        "SCRIPT_NAME": "",
+        "PATH_INFO": path,
+        "QUERY_STRING": query,
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "REMOTE_ADDR": "127.0.0.1",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": "http",
+        "wsgi.input": io.BytesIO(),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    status = []
+    started = time.perf_counter()
+    body = b"".join(application(environ, lambda s, headers, exc_info=None: status.append(s)))
+    elapsed = time.perf_counter() - started
+    if not status:
+        raise RuntimeError(f"no response for {path}")
+    return status[0], elapsed, len(body)
+
+
+def child(path: str) -> None:
+    started = time.perf_counter()
+    from application import application
+    imported = time.perf_counter() - started
+    result = {
+        "import_ms": imported * 1000,
+        "rss_import_mib": rss_mib(),
+        "modules": len(sys.modules),
+        "db_driver_loaded": "psycopg2" in sys.modules or "book_prices.storage.sqlite" in sys.modules,
+    }
+
+    status, elapsed, _ = wsgi_get(application, "/health")
+    result["first_ms"] = elapsed * 1000
+    status, elapsed, _ = wsgi_get(application, path)
+    result["first_db_ms"] = elapsed * 1000
+    result["first_db_status"] = status
+    _, elapsed, _ = wsgi_get(application, path)
+    result["second_db_ms"] = elapsed * 1000
+    result["rss_after_mib"] = rss_mib()
+    print(json.dumps(result))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--path", default="/api/books", help="endpoint for the database requests")
+    ap.add_argument("--json", help="write results to this file")
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        child(args.path)
+        return
+
+    runs = []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_startup", "--child", "--path", args.path],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        )
+        run = json.loads(out.stdout.strip().splitlines()[-1])
+        run["process_ms"] = (time.perf_counter() - started) * 1000
+        runs.append(run)
+
+    print(f"{'metric':20} {'median':>10} {'min':>10} {'max':>10}")
+    summary = {}
+    for key in ("process_ms", "import_ms", "first_ms", "first_db_ms", "second_db_ms",
+                "rss_import_mib", "rss_after_mib", "modules"):
+        values = [r[key] for r in runs]
+        summary[key] = {"median": statistics.median(values), "min": min(values), "max": max(values)}
+        print(f"{key:20} {summary[key]['median']:10.1f} {min(values):10.1f} {max(values):10.1f}")
+    print(f"db driver loaded at import: {runs[0]['db_driver_loaded']}  first db status: {runs[0]['first_db_status']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "benchmark": "startup",
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "path": args.path,
+                "summary": summary,
+                "runs": runs,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
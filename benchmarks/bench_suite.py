@@ -0,0 +1,282 @@
+"""Offline benchmarks for the crawl, parsing and storage hot paths.
+
+    python -m benchmarks.bench_suite [--sizes 1000,10000] [--pages 5] [--rounds 20]
+                                     [--dsn "host=... dbname=..."] [--json results.json]
+                                     [--baseline old.json] [--tolerance 0.25]
+
+- crawl:   listing, listing-card offers (list_offers) and fetch_offer for both adapters
+           against the local stand-in sites (benchmarks.fakesite), no rate limiting, so
+           it measures our overhead
+- parsing: extract_isbn_labeled on the fixture page texts, title_norm on generated titles
+- storage: upsert_offers / upsert_offer / get_compared_books / search_books for each
+           dataset size, in a throwaway schema that is dropped afterwards
+
+Storage runs against Postgres when given a DSN (--dsn or BENCH_PG_DSN) and against a
+temporary SQLite file with --backend sqlite. Never point it at the production database:
+everything happens in a bench_<pid> schema, but it still loads data.
+With --baseline, a case more than --tolerance slower (mean) than in the baseline JSON is
+reported and the exit status is 1, so the suite can gate a deploy.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from bs4 import BeautifulSoup
+
+from benchmarks.fakesite import StandIn, product_fixtures
+from book_prices.adapters.biblusi import BiblusiAdapter
+from book_prices.adapters.parnasi import ParnasiAdapter
+from book_prices.core.http import HttpClient
+from book_prices.core.models import Offer
+from book_prices.core.parsing import extract_isbn_labeled
+from book_prices.storage.common import title_norm
+
+WORDS = (
+    "ომი მშვიდობა ზღვა დღე სახლი ოცნება ცხოვრება ფერი დრო ისტორია რომანი ქალაქი მთა ღამე "
+    "სიყვარული წიგნი ვეფხისტყაოსანი ჯინსების თაობა Harry Potter Война и мир The Great Gatsby"
+).split()
+
+SEARCH_QUERIES = ["ომი მშვიდობა", "ჯინსების", "მშვდობა", "Potter", "978994"]
+
+
+def timed(name: str, fn, n: int, size: int | None = None) -> dict:
+    # Calls fn(i) for i in range(n) and summarises per-call wall time
+    laps = []
+    started = time.perf_counter()
+    for i in range(n):
+        t0 = time.perf_counter()
+        fn(i)
+        laps.append(time.perf_counter() - t0)
+    total = time.perf_counter() - started
+    return summarize(name, laps, total, size)
+
+
+def summarize(name: str, laps: list, total: float, size: int | None = None, ops: int | None = None) -> dict:
+    ops = ops if ops is not None else len(laps)
+    laps = sorted(laps)
+    return {
+        "name": name,
+        "size": size,
+        "ops": ops,
+        "total_s": round(total, 4),
+        "mean_ms": round(total / ops * 1000, 4) if ops else None,
+        "p50_ms": round(statistics.median(laps) * 1000, 4) if laps else None,
+        "p95_ms": round(laps[min(len(laps) - 1, int(len(laps) * 0.95))] * 1000, 4) if laps else None,
+        "ops_per_sec": round(ops / total, 1) if total > 0 else None,
+    }
+
+
+def isbn13(n: int) -> str:
+    body = f"978994{n:06d}"
+    check = (10 - sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(body)) % 10) % 10
+    return body + str(check)
+
+
+def dataset(size: int, seed: int = 1) -> list[Offer]:
+    # `size` offers split over both stores; about half the books are sold by both
+    rnd = random.Random(seed)
+    offers = []
+    for i in range(size):
+        store = "biblusi" if i % 2 == 0 else "parnasi"
+        book = i // 2 if rnd.random() < 0.5 else size + i
+        words = [rnd.choice(WORDS) for _ in range(rnd.randint(2, 5))]
+        offers.append(Offer(
+            store=store,
+            url=f"https://{store}.example/products/{i}",
+            title=" ".join(words),
+            price_gel=round(rnd.uniform(5, 80), 2),
+            isbn=isbn13(book),
+            in_stock=rnd.random() < 0.8,
+            store_product_id=str(i),
+        ))
+    return offers
+
+
+def bench_crawl(pages: int) -> list[dict]:
+    results = []
+    http = HttpClient(pool_size=4)
+    with StandIn("biblusi", pages=pages) as b, StandIn("parnasi", pages=pages) as p:
+        adapters = [BiblusiAdapter(http, base_url=b.base_url), ParnasiAdapter(http, base_url=p.base_url)]
+        for adapter in adapters:
+            started = time.perf_counter()
+            refs = list(adapter.iter_products())
+            results.append(summarize(f"list_products[{adapter.store}]", [], time.perf_counter() - started,
+                                     size=len(refs), ops=pages))
+
+            started = time.perf_counter()
+            cards = list(adapter.list_offers())
+            results.append(summarize(f"list_offers[{adapter.store}]", [], time.perf_counter() - started,
+                                     size=len(cards), ops=pages))
+            if any(o.price_gel is None for o in cards):
+                print(f"[crawl] WARNING {adapter.store}: listing cards without price", file=sys.stderr)
+
+            offers = []
+            results.append(timed(
+                f"fetch_offer[{adapter.store}]",
+                lambda i: offers.append(adapter.fetch_offer(refs[i])),
+                len(refs), size=len(refs),
+            ))
+            missing = sum(1 for o in offers if o.price_gel is None or o.isbn is None)
+            if missing:
+                print(f"[crawl] WARNING {adapter.store}: {missing} offers without price/isbn", file=sys.stderr)
+    return results
+
+
+def bench_parsing(sizes: list[int]) -> list[dict]:
+    results = []
+    texts = [
+        BeautifulSoup(html, "lxml").get_text(" ", strip=True)
+        for store in ("biblusi", "parnasi")
+        for html in product_fixtures(store)
+    ]
+    results.append(timed("extract_isbn_labeled", lambda i: extract_isbn_labeled(texts[i % len(texts)]),
+                         len(texts) * 50, size=len(texts)))
+
+    for size in sizes:
+        titles = [o.title for o in dataset(size)]
+        results.append(timed("title_norm", lambda i: title_norm(titles[i]), size, size=size))
+    return results
+
+
+def bench_store(db, size: int, rounds: int) -> list[dict]:
+    results = []
+    offers = dataset(size)
+
+    batches = [offers[i:i + 500] for i in range(0, len(offers), 500)]
+    laps = []
+    started = time.perf_counter()
+    for batch in batches:
+        t0 = time.perf_counter()
+        db.upsert_offers(batch)
+        laps.append(time.perf_counter() - t0)
+    results.append(summarize("upsert_offers", laps, time.perf_counter() - started, size=size, ops=size))
+
+    # Single-offer path: re-scrape a sample with new prices
+    sample = offers[: min(size, 200)]
+    results.append(timed(
+        "upsert_offer",
+        lambda i: db.upsert_offer(Offer(**{**sample[i].__dict__, "price_gel": sample[i].price_gel + 1})),
+        len(sample), size=size,
+    ))
+
+    results.append(timed("get_compared_books", lambda i: db.get_compared_books(limit=100), rounds, size=size))
+    results.append(timed(
+        "search_books",
+        lambda i: db.search_books(SEARCH_QUERIES[i % len(SEARCH_QUERIES)]),
+        rounds * len(SEARCH_QUERIES), size=size,
+    ))
+    return results
+
+
+def bench_postgres(dsn: str, sizes: list[int], rounds: int) -> list[dict]:
+    import psycopg2
+
+    from book_prices.storage.postgres import PostgresStore, TimedConnection
+
+    results = []
+    schema = f"bench_{os.getpid()}"
+    admin = psycopg2.connect(dsn)
+    admin.autocommit = True
+    try:
+        for size in sizes:
+            with admin.cursor() as cur:
+                cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE; CREATE SCHEMA {schema}")
+            conn = psycopg2.connect(dsn, options=f"-c search_path={schema},public", connection_factory=TimedConnection)
+            db = PostgresStore(conn=conn)
+            db.init_schema()
+            results += bench_store(db, size, rounds)
+            conn.close()
+    finally:
+        with admin.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        admin.close()
+    return results
+
+
+def bench_sqlite(sizes: list[int], rounds: int) -> list[dict]:
+    from book_prices.storage.sqlite import SqliteStore
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench_sqlite_") as tmp:
+        for size in sizes:
+            db = SqliteStore(os.path.join(tmp, f"bench_{size}.sqlite3"))
+            db.init_schema()
+            results += bench_store(db, size, rounds)
+            db.close()
+    return results
+
+
+def regressions(results: list[dict], baseline_path: str, tolerance: float) -> list[str]:
+    with open(baseline_path) as f:
+        baseline = {(r["name"], r["size"]): r for r in json.load(f)["results"]}
+    slower = []
+    for r in results:
+        old = baseline.get((r["name"], r["size"]))
+        if not old or not old.get("mean_ms") or r["mean_ms"] is None:
+            continue
+        if r["mean_ms"] > old["mean_ms"] * (1 + tolerance):
+            slower.append(f"{r['name']} size={r['size']}: {old['mean_ms']:.3f} -> {r['mean_ms']:.3f} ms")
+    return slower
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="1000,10000", help="comma separated dataset sizes")
+    ap.add_argument("--pages", type=int, default=5, help="listing pages per stand-in store")
+    ap.add_argument("--rounds", type=int, default=20)
+    ap.add_argument("--backend", choices=["postgres", "sqlite"], default="postgres")
+    ap.add_argument("--dsn", default=os.getenv("BENCH_PG_DSN"), help="Postgres for the storage cases")
+    ap.add_argument("--only", choices=["crawl", "parsing", "storage"])
+    ap.add_argument("--json", help="write results to this file")
+    ap.add_argument("--baseline", help="results JSON of a previous run to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.25)
+    args = ap.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+
+    results = []
+    if args.only in (None, "crawl"):
+        results += bench_crawl(args.pages)
+    if args.only in (None, "parsing"):
+        results += bench_parsing(sizes)
+    if args.only in (None, "storage"):
+        if args.backend == "sqlite":
+            results += bench_sqlite(sizes, args.rounds)
+        elif args.dsn:
+            results += bench_postgres(args.dsn, sizes, args.rounds)
+        else:
+            print("[storage] skipped: no --dsn / BENCH_PG_DSN", file=sys.stderr)
+
+    print(f"{'case':32} {'size':>7} {'ops':>7} {'mean ms':>10} {'p50 ms':>10} {'p95 ms':>10} {'ops/s':>10}")
+    for r in results:
+        print(
+            f"{r['name']:32} {r['size'] or '':>7} {r['ops']:>7} {r['mean_ms'] or 0:10.3f} "
+            f"{r['p50_ms'] or 0:10.3f} {r['p95_ms'] or 0:10.3f} {r['ops_per_sec'] or 0:10.1f}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "benchmark": "suite",
+                "backend": args.backend,
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "results": results,
+            }, f, indent=2)
+
+    if args.baseline:
+        slower = regressions(results, args.baseline, args.tolerance)
+        for line in slower:
+            print(f"[regression] {line}")
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""Local stand-in for the store websites, serving the pages in benchmarks/fixtures.
+
+Every store gets its own server on 127.0.0.1; adapters are pointed at it with base_url.
+Listing page N renumbers the fixture's product links, so crawling `pages` listing pages
+finds pages x cards distinct products, and product URLs cycle through the saved product
+pages. Each card shows the price of the product page it links to, and a sold-out marker
+when that page says so, like the real listings.
+Responses carry an ETag and honour If-None-Match like the real sites do.
+"""
+import glob
+import hashlib
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+REAL_ORIGINS = {
+    "biblusi": "https://biblusi.ge",
+    "parnasi": "https://parnasi.ge",
+}
+
+BIBLUSI_CARD_HREF = re.compile(r'href="/products/\d+"')
+BIBLUSI_CARD = re.compile(r'<div class="product-card">.*?</button></div>\n?', re.S)
+BIBLUSI_CARD_PRICE = re.compile(r'(<div class="product-card__price">)[^<]*(</div>)')
+BIBLUSI_CARD_CART = '<button class="product-card__cart">'
+PARNASI_CARD_HREF = re.compile(r'href="https://parnasi\.ge/product/[^/"]+/"')
+PARNASI_CARD = re.compile(r'<li class="product .*?</li>', re.S)
+PARNASI_CARD_PRICE = re.compile(r'(<bdi>)[\d.,]+(&nbsp;)')
+PARNASI_CARD_STOCK = re.compile(r'\b(?:instock|outofstock)\b')
+PARNASI_LISTING_PAGE = re.compile(r"^/shop/(?:page/(\d+)/)?$")
+
+
+def _read(name: str) -> bytes:
+    with open(os.path.join(FIXTURES, name), "rb") as f:
+        return f.read()
+
+
+def product_fixtures(store: str) -> list[bytes]:
+    paths = sorted(glob.glob(os.path.join(FIXTURES, f"{store}_product_*.html")))
+    return [_read(os.path.basename(p)) for p in paths]
+
+
+class StandIn:
+    def __init__(self, store: str, pages: int = 3):
+        if store not in REAL_ORIGINS:
+            raise ValueError(f"no fixtures for store {store!r}")
+        self.store = store
+        self.pages = pages
+        self.listing = _read(f"{store}_listing.html").decode("utf-8")
+        self.products = product_fixtures(store)
+        self.offers = [self._product_offer(html) for html in self.products]
+        self.requests = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, name=f"standin-{store}", daemon=True)
+
+    def __enter__(self) -> "StandIn":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def route(self, path: str, query: str) -> tuple[int, bytes]:
+        if self.store == "biblusi":
+            if path == "/products":
+                page = int(parse_qs(query).get("page", ["1"])[0])
+                return 200, self._biblusi_listing(page)
+            m = re.match(r"^/products/(\d+)$", path)
+            if m:
+                return 200, self.products[int(m.group(1)) % len(self.products)]
+        else:
+            m = PARNASI_LISTING_PAGE.match(path)
+            if m:
+                page = int(m.group(1) or 1)
+                if page > self.pages:
+                    return 404, b"<html><body>Not found</body></html>"
+                return 200, self._parnasi_listing(page)
+            m = re.match(r"^/product/([^/]+)/$", path)
+            if m:
+                return 200, self._local_links(self.products[self._parnasi_index(m.group(1))].decode("utf-8"))
+        return 404, b"<html><body>Not found</body></html>"
+
+    def _product_offer(self, html: bytes):
+        # What the crawl reads off the product page, so the cards can show the same
+        from book_prices.adapters.biblusi import BiblusiAdapter
+        from book_prices.adapters.parnasi import ParnasiAdapter
+        from book_prices.core.models import ProductRef
+
+        adapter = (BiblusiAdapter if self.store == "biblusi" else ParnasiAdapter)(None)
+        return adapter.parse_offer(ProductRef(store=self.store, url=REAL_ORIGINS[self.store]), html)
+
+    def _parnasi_index(self, slug: str) -> int:
+        return int(hashlib.sha1(slug.encode()).hexdigest(), 16) % len(self.products)
+
+    def _biblusi_listing(self, page: int) -> bytes:
+        if page > self.pages:
+            # biblusi serves an empty grid past the last page
+            return BIBLUSI_CARD.sub("", self.listing).encode("utf-8")
+        counter = iter(range(10**6))
+
+        def card(m):
+            n = page * 10000 + next(counter)
+            html = BIBLUSI_CARD_HREF.sub(f'href="/products/{n}"', m.group(0))
+            offer = self.offers[n % len(self.products)]
+            if offer.in_stock is False:
+                from book_prices.adapters.biblusi import OUT_OF_STOCK_TEXT
+
+                html = html.replace(BIBLUSI_CARD_CART, f'<div class="product-card__stock">{OUT_OF_STOCK_TEXT}</div>'
+                                                      + BIBLUSI_CARD_CART, 1)
+            return BIBLUSI_CARD_PRICE.sub(lambda p: f"{p.group(1)}{offer.price_gel:.2f} ₾{p.group(2)}", html)
+
+        return BIBLUSI_CARD.sub(card, self.listing).encode("utf-8")
+
+    def _parnasi_listing(self, page: int) -> bytes:
+        counter = iter(range(10**6))
+
+        def card(m):
+            slug = f"wigni-{page}-{next(counter)}"
+            html = PARNASI_CARD_HREF.sub(f'href="https://parnasi.ge/product/{slug}/"', m.group(0))
+            offer = self.offers[self._parnasi_index(slug)]
+            html = PARNASI_CARD_STOCK.sub("instock" if offer.in_stock is not False else "outofstock", html, count=1)
+            return PARNASI_CARD_PRICE.sub(lambda p: f"{p.group(1)}{offer.price_gel:.2f}{p.group(2)}", html)
+
+        return self._local_links(PARNASI_CARD.sub(card, self.listing))
+
+    def _local_links(self, html: str) -> bytes:
+        return html.replace(REAL_ORIGINS[self.store], self.base_url).encode("utf-8")
+
+    def _handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; with Nagle on, keep-alive
+            # requests stall ~40ms on delayed ACKs and the benchmark measures that instead
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                site.requests += 1
+                parts = urlsplit(self.path)
+                status, body = site.route(parts.path, parts.query)
+                etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+
+                if status == 200 and self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=UTF-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -1,18 +1,66 @@
+import asyncio
 from abc import ABC, abstractmethod
-from typing import Iterable
+from typing import Iterable, Iterator, Optional
+
+from bs4 import BeautifulSoup
+
 from ..core.models import ProductRef, Offer
 from ..core.http import HttpClient
+from ..core.metrics import PARSE_SECONDS
+from .config import StoreConfig, store_config
 
 class StoreAdapter(ABC):
+    # Every store is crawled through this interface; which class serves which store, and
+    # with what URLs, selectors and limits, comes from its StoreConfig (adapters.config)
     store: str
+    in_stock_text: str = ""
+    out_of_stock_text: str = ""
 
-    def __init__(self, http: HttpClient):
+    def __init__(self, http: HttpClient, base_url: Optional[str] = None, config: Optional[StoreConfig] = None):
+        # Politeness is handled by the HttpClient's per-host rate limiter
         self.http = http
+        self.config = config if config is not None else store_config(self.store)
+        self.store = self.config.store
+        # Overridable so benchmarks can point the adapter at a local stand-in
+        self.base_url = (base_url or self.config.base_url).rstrip("/")
+        self.in_stock_text = self.config.in_stock_text or self.in_stock_text
+        self.out_of_stock_text = self.config.out_of_stock_text or self.out_of_stock_text
 
     @abstractmethod
-    def list_products(self, start_page: int, pages: int) -> list[ProductRef]:
+    def iter_products(self, start_page: int = 1, max_pages: Optional[int] = None) -> Iterator[ProductRef]:
+        # Yields refs page by page and stops at the first page without new products
         raise NotImplementedError
 
+    def fetch_listing(self, url: str) -> BeautifulSoup:
+        # Same as http.fetch_soup, with the soup build timed separately from the download
+        text = self.http.fetch_text(url)
+        with PARSE_SECONDS.time(store=self.store, page="listing", phase="parse"):
+            return BeautifulSoup(text, "lxml")
+
+    def list_products(self, start_page: int, pages: int) -> list[ProductRef]:
+        return list(self.iter_products(start_page=start_page, max_pages=pages))
+
+    def list_offers(self, start_page: int = 1, max_pages: Optional[int] = None) -> Iterator[Offer]:
+        # Partial offers straight from the listing cards (title, price, stock where the card
+        # shows it; never an ISBN), in iter_products order. Adapters whose cards carry no
+        # price keep this default, which makes every product look changed.
+        for ref in self.iter_products(start_page=start_page, max_pages=max_pages):
+            yield Offer(store=self.store, url=ref.url, title=None, price_gel=None, isbn=None,
+                        in_stock=None, store_product_id=ref.store_product_id)
+
     @abstractmethod
-    def fetch_offer(self, product: ProductRef) -> Offer:
+    def parse_offer(self, product: ProductRef, html: bytes) -> Offer:
         raise NotImplementedError
+
+    def fetch_page(self, product: ProductRef) -> bytes:
+        # Raises NotModified when the HttpClient cache says the page hasn't changed
+        return self.http.fetch_bytes(product.url, conditional=True)
+
+    def fetch_offer(self, product: ProductRef) -> Offer:
+        return self.parse_offer(product, self.fetch_page(product))
+
+    async def afetch_offer(self, product: ProductRef, http) -> Offer:
+        # `http` is an AsyncHttpClient; parsing runs off the event loop. Raises NotModified
+        # like fetch_page when the client's cache says the page hasn't changed.
+        html = await http.fetch_bytes(product.url, conditional=True)
+        return await asyncio.to_thread(self.parse_offer, product, html)
@@ -1,67 +1,119 @@
 import re
-import time
+from typing import Iterator, Optional, Union
 from urllib.parse import urljoin
-from bs4 import BeautifulSoup
 
+from .base import StoreAdapter
 from ..core.models import ProductRef, Offer
-from ..core.parsing import (
-    extract_price_gel_from_text,
-    extract_isbn_labeled,
-    extract_availability_from_text,
-)
+from ..core.extract import FIRST_H1, TITLE, element_text, first, parse_html, scan_text
+from ..core.metrics import PARSE_SECONDS
+from ..core.parsing import PRICE_RE, extract_availability_from_text, normalize_price
 
 PRODUCT_HREF_RE = re.compile(r"^/products/\d+$")
 
 IN_STOCK_TEXT = "მარაგშია"
 OUT_OF_STOCK_TEXT = "არ არის მარაგში"
 
-class BiblusiAdapter:
+class BiblusiAdapter(StoreAdapter):
     store = "biblusi"
+    in_stock_text = IN_STOCK_TEXT
+    out_of_stock_text = OUT_OF_STOCK_TEXT
 
-    def __init__(self, http, sleep_seconds=0.25):
-        self.http = http
-        self.sleep_seconds = sleep_seconds
+    def _iter_pages(self, category_id: Optional[int], start_page: int, max_pages: Optional[int],
+                    seen: Optional[set[str]] = None):
+        # (listing url, [(ref, product link)]) per listing page of one category, or of every
+        # configured category in turn; a product listed in several categories comes once
+        if seen is None:
+            seen = set()
+        if category_id is None:
+            for category in self.config.categories:
+                yield from self._iter_pages(category, start_page, max_pages, seen)
+            return
 
-    def list_products(self, category_id: int, start_page: int, pages: int) -> list[ProductRef]:
-        out: list[ProductRef] = []
-        seen: set[str] = set()
+        in_category: set[str] = set()
 
-        for page in range(start_page, start_page + pages):
-            listing_url = f"https://biblusi.ge/products?category={category_id}&page={page}"
-            soup = self.http.fetch_soup(listing_url)
+        page = start_page
+        while max_pages is None or page < start_page + max_pages:
+            listing_url = (self.config.listing_url or "{base_url}/products?category={category}&page={page}").format(
+                base_url=self.base_url, category=category_id, page=page
+            )
+            soup = self.fetch_listing(listing_url)
 
+            found = 0
+            links = []
             for a in soup.find_all("a", href=True):
                 href = a["href"].strip()
                 if not PRODUCT_HREF_RE.match(href):
                     continue
                 full = urljoin(listing_url, href)
+                if full in in_category:
+                    continue
+                in_category.add(full)
+                found += 1
                 if full in seen:
                     continue
                 seen.add(full)
-                out.append(ProductRef(store=self.store, url=full, store_product_id=href.split("/")[-1]))
+                links.append((ProductRef(store=self.store, url=full, store_product_id=href.split("/")[-1]), a))
 
-            time.sleep(self.sleep_seconds)
+            # Past the last page biblusi serves an empty listing
+            if not found:
+                return
+            yield listing_url, links
+            page += 1
 
-        return out
+    def iter_products(self, start_page: int = 1, max_pages: Optional[int] = None,
+                      category_id: Optional[int] = None) -> Iterator[ProductRef]:
+        for _, links in self._iter_pages(category_id, start_page, max_pages):
+            for ref, _ in links:
+                yield ref
 
-    def fetch_offer(self, product: ProductRef) -> Offer:
-        soup = self.http.fetch_soup(product.url)
+    def list_offers(self, start_page: int = 1, max_pages: Optional[int] = None,
+                    category_id: Optional[int] = None) -> Iterator[Union[Offer, ProductRef]]:
+        for listing_url, links in self._iter_pages(category_id, start_page, max_pages):
+            offers = [self._card_offer(ref, a.find_parent("div", class_="product-card")) for ref, a in links]
+            if offers and all(o.price_gel is None for o in offers):
+                # Product links but no card markup we can read: the page changed under us.
+                # Plain refs are planned as without the fast path (new and due products),
+                # instead of every product looking changed on every run.
+                print(f"[{self.store}] WARNING no readable product cards, using links url={listing_url}")
+                yield from (ref for ref, _ in links)
+                continue
+            yield from offers
 
-        h1 = soup.find("h1")
-        title = (
-            h1.get_text(strip=True)
-            if h1
-            else soup.title.get_text(strip=True) if soup.title else None
+    def _card_offer(self, ref: ProductRef, card) -> Offer:
+        title_el = card.find(class_="product-card__title") if card is not None else None
+        price_el = card.find(class_="product-card__price") if card is not None else None
+        m = PRICE_RE.search(price_el.get_text(" ", strip=True)) if price_el is not None else None
+        return Offer(
+            store=self.store,
+            url=ref.url,
+            title=title_el.get_text(strip=True) if title_el is not None else None,
+            price_gel=normalize_price(m.group(1)) if m else None,
+            isbn=None,
+            # Cards only say something when the book is sold out
+            in_stock=extract_availability_from_text(
+                card.get_text(" ", strip=True), self.in_stock_text, self.out_of_stock_text
+            ) if card is not None else None,
+            store_product_id=ref.store_product_id,
         )
 
-        text = soup.get_text(" ", strip=True)
+    def parse_offer(self, product: ProductRef, html: bytes) -> Offer:
+        with PARSE_SECONDS.time(store=self.store, page="product", phase="parse"):
+            root = parse_html(html)
+
+        with PARSE_SECONDS.time(store=self.store, page="product", phase="extract"):
+            h1 = first(FIRST_H1, root)
+            title_el = h1 if h1 is not None else first(TITLE, root)
+            title = element_text(title_el) if title_el is not None else None
+
+            # biblusi has no stable product container, so the whole document is scanned
+            scan = scan_text(element_text(root, " "), PRICE_RE, self.in_stock_text, self.out_of_stock_text)
 
         return Offer(
             store=self.store,
             url=product.url,
             title=title,
-            price_gel=extract_price_gel_from_text(text),
-            isbn=extract_isbn_labeled(text),
-            in_stock=extract_availability_from_text(text, IN_STOCK_TEXT, OUT_OF_STOCK_TEXT),
+            price_gel=scan.prices[0] if scan.prices else None,
+            isbn=scan.isbn,
+            in_stock=scan.in_stock,
             store_product_id=product.store_product_id,
         )
@@ -0,0 +1,88 @@
+import json
+import os
+from dataclasses import dataclass, field, fields, replace
+from typing import Optional
+
+# Declarative store definitions. The built-in stores are below; STORES_CONFIG points at a
+# JSON list of more (or overrides of these, matched by "store"), e.g.
+#   [{"store": "books", "adapter": "generic", "base_url": "https://books.example",
+#     "listing_url": "{base_url}/shop/page/{page}/", "selectors": {...}}]
+# STORES=biblusi,parnasi limits a crawl to the listed stores.
+# See book_prices.adapters.registry for the adapter names and stores.example.json for a
+# complete generic store.
+
+
+@dataclass
+class StoreConfig:
+    store: str
+    # Registry name ("biblusi", "parnasi", "generic") or "package.module:Class"
+    adapter: str
+    base_url: str
+    # Listing page URL; {base_url}, {page} and {category} are filled in
+    listing_url: Optional[str] = None
+    # Category ids crawled in turn; stores without categories leave this empty
+    categories: tuple = ()
+    # CSS selectors for listing cards, XPath for product pages; see adapters.generic
+    selectors: dict = field(default_factory=dict)
+    # Availability phrases on product pages (None = the adapter's own)
+    in_stock_text: Optional[str] = None
+    out_of_stock_text: Optional[str] = None
+    # Requests/sec and fetch workers for this host (None = SCRAPE_RATE_PER_HOST /
+    # SCRAPE_WORKERS_PER_STORE); listing pages per run (None = SCRAPE_LISTING_PAGES,
+    # 0 = until the listing runs out)
+    rate: Optional[float] = None
+    workers: Optional[int] = None
+    listing_pages: Optional[int] = None
+    enabled: bool = True
+
+
+BUILTIN_STORES = (
+    StoreConfig(
+        store="biblusi",
+        adapter="biblusi",
+        base_url="https://biblusi.ge",
+        listing_url="{base_url}/products?category={category}&page={page}",
+        categories=(291,),
+    ),
+    StoreConfig(
+        store="parnasi",
+        adapter="parnasi",
+        base_url="https://parnasi.ge",
+        listing_url="{base_url}/shop/page/{page}/",
+    ),
+)
+
+
+def store_config(store: str) -> StoreConfig:
+    # Built-in definition of a store, for adapters constructed without one
+    for config in BUILTIN_STORES:
+        if config.store == store:
+            return config
+    raise KeyError(f"no built-in config for store {store!r}")
+
+
+def config_from_dict(data: dict, base: Optional[StoreConfig] = None) -> StoreConfig:
+    known = {f.name for f in fields(StoreConfig)}
+    unknown = set(data) - known
+    if unknown:
+        raise ValueError(f"unknown store config keys for {data.get('store')!r}: {sorted(unknown)}")
+    values = dict(data)
+    if "categories" in values:
+        values["categories"] = tuple(values["categories"])
+    if base is not None:
+        return replace(base, **values)
+    return StoreConfig(**values)
+
+
+def load_stores(path: Optional[str] = None, only: Optional[str] = None) -> list[StoreConfig]:
+    path = path if path is not None else os.getenv("STORES_CONFIG")
+    only = only if only is not None else os.getenv("STORES")
+
+    stores = {c.store: c for c in BUILTIN_STORES}
+    if path:
+        with open(path, encoding="utf-8") as f:
+            for data in json.load(f):
+                stores[data["store"]] = config_from_dict(data, stores.get(data["store"]))
+
+    wanted = {s.strip() for s in only.split(",") if s.strip()} if only else None
+    return [c for c in stores.values() if c.enabled and (wanted is None or c.store in wanted)]
@@ -0,0 +1,169 @@
+import re
+from typing import Iterator, Optional
+from urllib.parse import urljoin, unquote, urlsplit
+
+import requests
+from lxml import etree
+
+from .base import StoreAdapter
+from ..core.models import ProductRef, Offer
+from ..core.extract import FIRST_H1, element_text, first, parse_html, scan_text
+from ..core.metrics import PARSE_SECONDS
+from ..core.parsing import PRICE_RE, extract_availability_from_text, normalize_price
+
+# Selector keys a StoreConfig can set for the generic adapter. Listing cards use CSS
+# (BeautifulSoup), product pages XPath (lxml), like the hand-written adapters:
+#   card            CSS, one element per product on a listing page (required)
+#   link            CSS inside the card for the product link (default: first a[href])
+#   title, price    CSS inside the card; `price` may match several, the last is used
+#                   (sale markup puts the old price first)
+#   in_stock_class, out_of_stock_class
+#                   card classes that mark availability; otherwise the card text is
+#                   checked for the store's stock phrases
+#   product_href    regex the product link's path must match
+#   product_title   XPath, default the first <h1>
+#   product_region  XPath of the element scanned for price, ISBN and stock (default: page)
+#   product_price   XPath of the price element; falls back to the first price scanned
+#   price_re        regex with the amount as group 1 (default: "12.50 ₾")
+SELECTOR_KEYS = {
+    "card", "link", "title", "price", "in_stock_class", "out_of_stock_class", "product_href",
+    "product_title", "product_region", "product_price", "price_re",
+}
+
+
+class GenericAdapter(StoreAdapter):
+    # Any store whose listings are numbered pages of product cards, described entirely
+    # by its StoreConfig; see stores.example.json
+    store = "generic"
+    in_stock_text = "მარაგშია"
+    out_of_stock_text = "არ არის მარაგში"
+
+    def __init__(self, http, base_url: Optional[str] = None, config=None):
+        if config is None:
+            raise ValueError("GenericAdapter needs a StoreConfig")
+        super().__init__(http, base_url=base_url, config=config)
+
+        selectors = config.selectors
+        unknown = set(selectors) - SELECTOR_KEYS
+        if unknown:
+            raise ValueError(f"unknown selectors for store {self.store!r}: {sorted(unknown)}")
+        if not config.listing_url or "card" not in selectors:
+            raise ValueError(f"store {self.store!r} needs listing_url and selectors.card")
+
+        self.host = urlsplit(self.base_url).netloc
+        self.card_css = selectors["card"]
+        self.link_css = selectors.get("link", "a[href]")
+        self.title_css = selectors.get("title")
+        self.price_css = selectors.get("price")
+        self.in_stock_class = selectors.get("in_stock_class")
+        self.out_of_stock_class = selectors.get("out_of_stock_class")
+        self.product_href = re.compile(selectors["product_href"]) if "product_href" in selectors else None
+        self.price_re = re.compile(selectors["price_re"]) if "price_re" in selectors else PRICE_RE
+        # Compiled once per adapter; parse workers build one adapter per store
+        self.product_title = etree.XPath(selectors["product_title"]) if "product_title" in selectors else FIRST_H1
+        self.product_region = etree.XPath(selectors["product_region"]) if "product_region" in selectors else None
+        self.product_price = etree.XPath(selectors["product_price"]) if "product_price" in selectors else None
+
+    def _iter_cards(self, start_page: int, max_pages: Optional[int]):
+        # (ref, card element) per product on the listing pages of each configured
+        # category in turn (or of the one listing)
+        seen: set[str] = set()
+
+        for category in self.config.categories or (None,):
+            page = start_page
+            while max_pages is None or page < start_page + max_pages:
+                listing_url = self.config.listing_url.format(base_url=self.base_url, category=category, page=page)
+                try:
+                    soup = self.fetch_listing(listing_url)
+                except requests.HTTPError as e:
+                    # Many shops answer 404 past the last page
+                    if e.response is not None and e.response.status_code == 404:
+                        break
+                    raise
+
+                found = 0
+                for card in soup.select(self.card_css):
+                    ref = self._card_ref(listing_url, card)
+                    if ref is None or ref.url in seen:
+                        continue
+                    seen.add(ref.url)
+                    found += 1
+                    yield ref, card
+
+                # An empty page (or one repeating earlier products) ends the listing
+                if not found:
+                    break
+                page += 1
+
+    def _card_ref(self, listing_url: str, card) -> Optional[ProductRef]:
+        a = card if card.name == "a" and card.get("href") else card.select_one(self.link_css)
+        href = a.get("href", "").strip() if a is not None else ""
+        if not href:
+            return None
+        full = urljoin(listing_url, href)
+        parts = urlsplit(full)
+        if parts.netloc != self.host:
+            return None
+        if self.product_href is not None and not self.product_href.match(parts.path):
+            return None
+        slug = unquote(parts.path.rstrip("/").rsplit("/", 1)[-1])
+        return ProductRef(store=self.store, url=full, store_product_id=slug)
+
+    def iter_products(self, start_page: int = 1, max_pages: Optional[int] = None) -> Iterator[ProductRef]:
+        for ref, _ in self._iter_cards(start_page, max_pages):
+            yield ref
+
+    def _card_stock(self, card) -> Optional[bool]:
+        classes = card.get("class", [])
+        if self.in_stock_class and self.in_stock_class in classes:
+            return True
+        if self.out_of_stock_class and self.out_of_stock_class in classes:
+            return False
+        return extract_availability_from_text(card.get_text(" ", strip=True), self.in_stock_text, self.out_of_stock_text)
+
+    def list_offers(self, start_page: int = 1, max_pages: Optional[int] = None) -> Iterator[Offer]:
+        for ref, card in self._iter_cards(start_page, max_pages):
+            title_el = card.select_one(self.title_css) if self.title_css else None
+            price_els = card.select(self.price_css) if self.price_css else []
+            m = self.price_re.search(price_els[-1].get_text(" ", strip=True)) if price_els else None
+            yield Offer(
+                store=self.store,
+                url=ref.url,
+                title=title_el.get_text(strip=True) if title_el is not None else None,
+                price_gel=normalize_price(m.group(1)) if m else None,
+                isbn=None,
+                in_stock=self._card_stock(card),
+                store_product_id=ref.store_product_id,
+            )
+
+    def parse_offer(self, product: ProductRef, html: bytes) -> Offer:
+        with PARSE_SECONDS.time(store=self.store, page="product", phase="parse"):
+            root = parse_html(html)
+
+        with PARSE_SECONDS.time(store=self.store, page="product", phase="extract"):
+            title_el = first(self.product_title, root)
+            title = element_text(title_el) if title_el is not None else None
+
+            region = first(self.product_region, root) if self.product_region is not None else None
+            scan = scan_text(
+                element_text(region if region is not None else root, " "),
+                self.price_re, self.in_stock_text, self.out_of_stock_text,
+            )
+
+            price_gel = None
+            price_el = first(self.product_price, root) if self.product_price is not None else None
+            if price_el is not None:
+                m = self.price_re.search(element_text(price_el, " "))
+                price_gel = normalize_price(m.group(1)) if m else None
+            if price_gel is None and scan.prices:
+                price_gel = scan.prices[0]
+
+        return Offer(
+            store=self.store,
+            url=product.url,
+            title=title,
+            price_gel=price_gel,
+            isbn=scan.isbn,
+            in_stock=scan.in_stock,
+            store_product_id=product.store_product_id,
+        )
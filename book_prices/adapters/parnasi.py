@@ -1,33 +1,43 @@
-import time
 import re
-from urllib.parse import urljoin, unquote
+from typing import Iterator, Optional
+from urllib.parse import urljoin, unquote, urlsplit
+import requests
+from lxml import etree
 
+from .base import StoreAdapter
 from ..core.models import ProductRef, Offer
-from ..core.parsing import (
-    extract_isbn_labeled,
-    extract_availability_from_text,
-    normalize_price,
-)
+from ..core.extract import FIRST_H1, element_text, first, has_class, parse_html, scan_text
+from ..core.metrics import PARSE_SECONDS
+from ..core.parsing import normalize_price
 
 PRICE_RE = re.compile(r"(\d+(?:[.,]\d+)?)\s*₾")
-PRODUCT_URL_RE = re.compile(r"^https?://parnasi\.ge/product/[^/]+/?$")
+PRODUCT_PATH_RE = re.compile(r"^/product/[^/]+/?$")
 
 IN_STOCK_TEXT = "მარაგში"
 OUT_OF_STOCK_TEXT = "არ არის მარაგში"
 
 
-def extract_price_from_price_block(soup) -> float | None:
+# WooCommerce markup; XPath versions of the selectors we used to run through soupsieve
+PRICE_BLOCKS = [
+    # div.product div.summary p.price, div.product div.summary .price, p.price, .price
+    etree.XPath(f"(//div[{has_class('product')}]//div[{has_class('summary')}]//p[{has_class('price')}])[1]"),
+    etree.XPath(f"(//div[{has_class('product')}]//div[{has_class('summary')}]//*[{has_class('price')}])[1]"),
+    etree.XPath(f"(//p[{has_class('price')}])[1]"),
+    etree.XPath(f"(//*[{has_class('price')}])[1]"),
+]
+
+
+def extract_price_from_price_block(root) -> float | None:
     # WooCommerce product price is typically inside summary/price
-    price_el = (
-        soup.select_one("div.product div.summary p.price") or
-        soup.select_one("div.product div.summary .price") or
-        soup.select_one("p.price") or
-        soup.select_one(".price")
-    )
-    if not price_el:
+    price_el = None
+    for xp in PRICE_BLOCKS:
+        price_el = first(xp, root)
+        if price_el is not None:
+            break
+    if price_el is None:
         return None
 
-    txt = price_el.get_text(" ", strip=True)
+    txt = element_text(price_el, " ")
     m = PRICE_RE.search(txt)
     return normalize_price(m.group(1)) if m else None
 
@@ -40,23 +50,40 @@ def extract_price_fallback_ignore_cart(text: str) -> float | None:
     return max(vals) if vals else None
 
 
-class ParnasiAdapter:
+class ParnasiAdapter(StoreAdapter):
     store = "parnasi"
+    in_stock_text = IN_STOCK_TEXT
+    out_of_stock_text = OUT_OF_STOCK_TEXT
 
-    def __init__(self, http, sleep_seconds: float = 0.25):
-        self.http = http
-        self.sleep_seconds = sleep_seconds
+    def __init__(self, http, base_url: Optional[str] = None, config=None):
+        super().__init__(http, base_url=base_url, config=config)
+        self.host = urlsplit(self.base_url).netloc
 
     def _listing_url(self, page: int) -> str:
-        return "https://parnasi.ge/shop/" if page == 1 else f"https://parnasi.ge/shop/page/{page}/"
+        if page == 1:
+            return f"{self.base_url}/shop/"
+        return (self.config.listing_url or "{base_url}/shop/page/{page}/").format(base_url=self.base_url, page=page)
+
+    def _is_product_url(self, url: str) -> bool:
+        parts = urlsplit(url)
+        return parts.netloc == self.host and not parts.query and bool(PRODUCT_PATH_RE.match(parts.path))
 
-    def list_products(self, start_page: int, pages: int) -> list[ProductRef]:
-        out: list[ProductRef] = []
+    def _iter_cards(self, start_page: int, max_pages: Optional[int]):
+        # (ref, product link) per product on the listing pages
         seen: set[str] = set()
 
-        for page in range(start_page, start_page + pages):
+        page = start_page
+        while max_pages is None or page < start_page + max_pages:
             listing_url = self._listing_url(page)
-            soup = self.http.fetch_soup(listing_url)
+            try:
+                soup = self.fetch_listing(listing_url)
+            except requests.HTTPError as e:
+                # WooCommerce answers 404 for /shop/page/N/ past the last page
+                if e.response is not None and e.response.status_code == 404:
+                    return
+                raise
+
+            found = 0
 
             links = soup.select("li.product a.woocommerce-LoopProduct-link")
             if not links:
@@ -70,7 +97,7 @@ class ParnasiAdapter:
                 full = urljoin(listing_url, href.strip())
                 if "/product/" not in full:
                     continue
-                if not PRODUCT_URL_RE.match(full):
+                if not self._is_product_url(full):
                     continue
 
                 if full in seen:
@@ -78,36 +105,62 @@ class ParnasiAdapter:
                 seen.add(full)
 
                 slug = full.rstrip("/").split("/product/")[-1]
-                out.append(
-                    ProductRef(
-                        store=self.store,
-                        url=full,
-                        store_product_id=unquote(slug),  # decode %d0%... into readable slug
-                    )
-                )
-
-            time.sleep(self.sleep_seconds)
-
-        return out
-
-    def fetch_offer(self, product: ProductRef) -> Offer:
-        soup = self.http.fetch_soup(product.url)
-
-        h1 = soup.find("h1")
-        title = h1.get_text(strip=True) if h1 else None
-
-        text = soup.get_text(" ", strip=True)
-
-        price_gel = extract_price_from_price_block(soup)
-        if price_gel is None:
-            price_gel = extract_price_fallback_ignore_cart(text)
+                found += 1
+                yield ProductRef(
+                    store=self.store,
+                    url=full,
+                    store_product_id=unquote(slug),  # decode %d0%... into readable slug
+                ), a
+
+            if not found:
+                return
+            page += 1
+
+    def iter_products(self, start_page: int = 1, max_pages: Optional[int] = None) -> Iterator[ProductRef]:
+        for ref, _ in self._iter_cards(start_page, max_pages):
+            yield ref
+
+    def list_offers(self, start_page: int = 1, max_pages: Optional[int] = None) -> Iterator[Offer]:
+        for ref, a in self._iter_cards(start_page, max_pages):
+            card = a.find_parent("li", class_="product")
+            title_el = card.select_one(".woocommerce-loop-product__title") if card is not None else None
+            # On sale the old price is in <del> and the current one in <ins>
+            price_el = card.select_one(".price ins") or card.select_one(".price") if card is not None else None
+            m = PRICE_RE.search(price_el.get_text(" ", strip=True)) if price_el is not None else None
+            classes = card.get("class", []) if card is not None else []
+            yield Offer(
+                store=self.store,
+                url=ref.url,
+                title=title_el.get_text(strip=True) if title_el is not None else None,
+                price_gel=normalize_price(m.group(1)) if m else None,
+                isbn=None,
+                # WooCommerce marks every card instock / outofstock
+                in_stock=True if "instock" in classes else False if "outofstock" in classes else None,
+                store_product_id=ref.store_product_id,
+            )
+
+    def parse_offer(self, product: ProductRef, html: bytes) -> Offer:
+        with PARSE_SECONDS.time(store=self.store, page="product", phase="parse"):
+            root = parse_html(html)
+
+        with PARSE_SECONDS.time(store=self.store, page="product", phase="extract"):
+            h1 = first(FIRST_H1, root)
+            title = element_text(h1) if h1 is not None else None
+
+            # The whole document, as before lxml: the ISBN can sit in a tab or attributes
+            # block outside the product container
+            scan = scan_text(element_text(root, " "), PRICE_RE, self.in_stock_text, self.out_of_stock_text)
+
+            price_gel = extract_price_from_price_block(root)
+            if price_gel is None and scan.prices:
+                price_gel = max(scan.prices)
 
         return Offer(
             store=self.store,
             url=product.url,
             title=title,
             price_gel=price_gel,
-            isbn=extract_isbn_labeled(text),
-            in_stock=extract_availability_from_text(text, IN_STOCK_TEXT, OUT_OF_STOCK_TEXT),
+            isbn=scan.isbn,
+            in_stock=scan.in_stock,
             store_product_id=product.store_product_id,
         )
@@ -0,0 +1,37 @@
+import importlib
+from typing import Optional
+
+from .base import StoreAdapter
+from .biblusi import BiblusiAdapter
+from .config import StoreConfig
+from .generic import GenericAdapter
+from .parnasi import ParnasiAdapter
+
+# Adapter classes by the name a StoreConfig uses. A store that needs code of its own can
+# either be registered here or name its class directly, "package.module:Class".
+ADAPTERS: dict[str, type[StoreAdapter]] = {
+    "biblusi": BiblusiAdapter,
+    "parnasi": ParnasiAdapter,
+    "generic": GenericAdapter,
+}
+
+
+def register_adapter(name: str, cls: type[StoreAdapter]) -> None:
+    ADAPTERS[name] = cls
+
+
+def adapter_class(name: str) -> type[StoreAdapter]:
+    if name in ADAPTERS:
+        return ADAPTERS[name]
+    if ":" not in name:
+        raise KeyError(f"unknown adapter {name!r}; registered: {sorted(ADAPTERS)}")
+    module, _, attr = name.partition(":")
+    cls = getattr(importlib.import_module(module), attr)
+    if not (isinstance(cls, type) and issubclass(cls, StoreAdapter)):
+        raise TypeError(f"{name} is not a StoreAdapter")
+    return cls
+
+
+def build_adapter(config: StoreConfig, http, base_url: Optional[str] = None) -> StoreAdapter:
+    # `http` may be None where only parse_offer is needed (parse worker processes)
+    return adapter_class(config.adapter)(http, base_url=base_url, config=config)
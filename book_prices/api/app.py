@@ -1,23 +1,104 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import APIRouter, FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from datetime import datetime, timedelta, timezone
+import base64
+import csv
+import io
+import json
 import os
+import threading
+import weakref
 
-from book_prices.storage.postgres import PostgresStore
+from pydantic import BaseModel
 
-app = FastAPI(title="Book Price Compare API")
+from book_prices.api.cache import MemoryBackend, ResponseCache, SqliteBackend
+from book_prices.api.middleware import MetricsMiddleware
+from book_prices.core.metrics import REGISTRY
+from book_prices.core.parsing import normalize_isbn13
+from book_prices.storage import LazyPool
+from book_prices.storage.common import compared_key
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"], 
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Read endpoints only change when run_scrape bumps the data version.
+# API_CACHE_PATH switches to a SQLite file shared by all Passenger workers.
+CACHE_TTL = float(os.getenv("API_CACHE_TTL", "300"))
+# API_PREWARM_DB=1 opens the pool on a background thread as soon as the app is built,
+# so the driver import and connect overlap with the worker's spawn instead of the first request
+PREWARM_DB = os.getenv("API_PREWARM_DB", "0") == "1"
+# Most ISBNs one /compare/batch request may ask for
+COMPARE_BATCH_MAX = int(os.getenv("API_COMPARE_BATCH_MAX", "300"))
 
-db = PostgresStore()
-db.init_schema()
+router = APIRouter()
 
-@app.get('/test')
+# Response caches of the apps built in this process (normally one). The collector is
+# registered once here, not per create_app(), so building several apps doesn't publish
+# the series twice.
+_response_caches = weakref.WeakSet()
+
+def _cache_metrics():
+    caches = list(_response_caches)
+    yield "bp_api_cache_hits_total", "counter", "Response cache hits", {(): sum(c.hits for c in caches)}
+    yield "bp_api_cache_misses_total", "counter", "Response cache misses", {(): sum(c.misses for c in caches)}
+
+REGISTRY.collector(_cache_metrics)
+
+def create_app(pool=None) -> FastAPI:
+    # Nothing here touches the database: the pool connects on the first request and the
+    # schema is created by `python -m book_prices.jobs.migrate` (or a crawl), not by
+    # every worker that Passenger spawns.
+    app = FastAPI(title="Book Price Compare API")
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    # Outermost, so the timings include CORS handling
+    app.add_middleware(MetricsMiddleware)
+
+    # Each request borrows its own connection (Postgres: size with DB_POOL_MIN / DB_POOL_MAX).
+    # DB_BACKEND=sqlite serves from a local file instead; see book_prices.storage
+    app.state.pool = pool if pool is not None else LazyPool()
+    if PREWARM_DB and isinstance(app.state.pool, LazyPool):
+        threading.Thread(target=lambda: app.state.pool.pool, name="db-prewarm", daemon=True).start()
+
+    def data_version() -> int:
+        with app.state.pool.session() as db:
+            return db.get_data_version()
+
+    app.state.response_cache = ResponseCache(
+        SqliteBackend(os.environ["API_CACHE_PATH"]) if os.getenv("API_CACHE_PATH") else MemoryBackend(),
+        version_fn=data_version,
+        ttl=CACHE_TTL,
+        version_check_interval=float(os.getenv("API_CACHE_VERSION_CHECK", "5")),
+    )
+
+    _response_caches.add(app.state.response_cache)
+
+    app.include_router(router)
+    return app
+
+def cached_json(request: Request, producer) -> Response:
+    state = request.app.state
+    key = request.url.path + "?" + "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+
+    def render() -> bytes:
+        with state.pool.session() as db:
+            data = producer(db)
+        return json.dumps(jsonable_encoder(data), ensure_ascii=False).encode("utf-8")
+
+    cached = state.response_cache.get_or_set(key, render)
+    headers = {"ETag": cached.etag, "Cache-Control": f"public, max-age={int(CACHE_TTL)}"}
+
+    inm = request.headers.get("if-none-match")
+    if inm and (inm.strip() == "*" or cached.etag in [t.strip() for t in inm.split(",")]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+@router.get('/test')
 def test_connection():
     return {
         "status": "success",
@@ -25,27 +106,170 @@ def test_connection():
         "server_time": "Now"
     }
 
-@app.get("/health")
+@router.get("/health")
 def health():
     return {"ok": True}
 
-@app.get("/compare/by-isbn/{isbn13}")
-def compare_by_isbn(isbn13: str):
-    res = db.get_book_by_isbn(isbn13)
-    if not res:
-        raise HTTPException(status_code=404, detail="Book not found")
-    book, offers = res
-    return {"book": book, "offers": offers}
+@router.get("/metrics")
+def metrics():
+    # Prometheus text format; numbers are per worker process
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@router.get("/compare/by-isbn/{isbn13}")
+def compare_by_isbn(isbn13: str, request: Request):
+    def produce(db):
+        res = db.get_book_by_isbn(isbn13)
+        if not res:
+            raise HTTPException(status_code=404, detail="Book not found")
+        book, offers = res
+        return {"book": book, "offers": offers}
+
+    return cached_json(request, produce)
+
+class CompareBatchRequest(BaseModel):
+    isbns: list[str]
 
-@app.get("/search")
-def search(q: str = Query(..., min_length=1), limit: int = Query(20, ge=1, le=100)):
-    return {"items": db.search_books(q, limit=limit)}
+@router.post("/compare/batch")
+def compare_batch(body: CompareBatchRequest, request: Request):
+    # A whole reading list / cart in one request and one query. ISBN-10s are accepted;
+    # items come back in request order, each with the ISBN as sent.
+    if len(body.isbns) > COMPARE_BATCH_MAX:
+        raise HTTPException(status_code=422, detail=f"At most {COMPARE_BATCH_MAX} ISBNs per request")
+    wanted = [(raw, normalize_isbn13(raw)) for raw in body.isbns]
+
+    with request.app.state.pool.session() as db:
+        found = db.get_books_by_isbns(sorted({isbn13 for _, isbn13 in wanted if isbn13}))
+
+    items = []
+    for raw, isbn13 in wanted:
+        if isbn13 is None:
+            items.append({"isbn": raw, "isbn13": None, "error": "invalid_isbn"})
+        elif isbn13 not in found:
+            items.append({"isbn": raw, "isbn13": isbn13, "error": "not_found"})
+        else:
+            book, offers = found[isbn13]
+            items.append({"isbn": raw, "isbn13": isbn13, "book": book, "offers": offers})
+    return {"items": items}
+
+@router.get("/history/by-isbn/{isbn13}")
+def history_by_isbn(
+    isbn13: str,
+    request: Request,
+    days: int | None = Query(None, ge=1, le=3650),
+    resolution: str = Query("day", pattern="^(day|raw)$"),
+):
+    def produce(db):
+        since = datetime.now(timezone.utc) - timedelta(days=days) if days else None
+        res = db.get_price_history(isbn13, since=since, resolution=resolution)
+        if not res:
+            raise HTTPException(status_code=404, detail="Book not found")
+        book, series = res
+        return {"book": book, "resolution": resolution, "series": series}
+
+    return cached_json(request, produce)
+
+@router.get("/search")
+def search(
+    request: Request,
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+):
+    def produce(db):
+        # One extra row tells us whether there is a next page
+        items = db.search_books(q, limit=limit + 1, offset=offset)
+        has_more = len(items) > limit
+        return {
+            "items": items[:limit],
+            "limit": limit,
+            "offset": offset,
+            "next_offset": offset + limit if has_more else None,
+        }
+
+    return cached_json(request, produce)
+
+def encode_cursor(key) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(key), ensure_ascii=False).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str):
+    try:
+        n, title, isbn = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return int(n), str(title), str(isbn)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.get("/api/books")
+def list_books(
+    request: Request,
+    limit: int | None = Query(None, ge=1, le=1000),
+    cursor: str | None = Query(None),
+):
+    # Without limit/cursor: the first 100 rows as a bare list, as before. With either,
+    # a page {"items", "limit", "next_cursor"}; pass next_cursor back for the next one.
+    paged = limit is not None or cursor is not None
+    after = decode_cursor(cursor) if cursor else None
+    limit = limit or 100
+
+    def produce(db):
+        if not paged:
+            return db.get_compared_books(limit=limit)
+        # One extra row tells us whether there is a next page
+        items = db.get_compared_books(limit=limit + 1, after=after)
+        has_more = len(items) > limit
+        items = items[:limit]
+        return {
+            "items": items,
+            "limit": limit,
+            "next_cursor": encode_cursor(compared_key(items[-1])) if has_more else None,
+        }
 
-@app.get("/api/books")
-def list_books():
     try:
-        data = db.get_compared_books()
-        return data
+        return cached_json(request, produce)
+    except HTTPException:
+        raise
     except Exception as e:
         # This will return the actual error message to Postman
         return {"error": str(e), "type": str(type(e))}
+
+# Rows are sent in chunks of about this many bytes rather than one by one
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+@router.get("/api/books/export")
+def export_books(request: Request, fmt: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$")):
+    # The full comparison table, streamed as the database produces it (not cached).
+    # The connection stays checked out until the last row is sent.
+    pool = request.app.state.pool
+
+    def chunks():
+        buf = io.StringIO()
+        writer = None
+        with pool.session() as db:
+            for row in db.iter_compared_books():
+                if fmt == "ndjson":
+                    buf.write(json.dumps(row, ensure_ascii=False) + "\n")
+                else:
+                    if writer is None:
+                        writer = csv.DictWriter(buf, fieldnames=list(row))
+                        writer.writeheader()
+                    writer.writerow(row)
+                if buf.tell() >= EXPORT_CHUNK_BYTES:
+                    yield buf.getvalue()
+                    buf.seek(0)
+                    buf.truncate()
+        yield buf.getvalue()
+
+    if fmt == "csv":
+        return StreamingResponse(
+            chunks(), media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": 'attachment; filename="books.csv"'},
+        )
+    return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+def __getattr__(name):
+    # `book_prices.api.app:app` (uvicorn etc.) keeps working; the app is only built
+    # when asked for, so importing create_app doesn't make a second one
+    if name == "app":
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(name)
@@ -0,0 +1,132 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    body: bytes
+    etag: str
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+
+class MemoryBackend:
+    # Per-process TTL + LRU map
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._data: OrderedDict[str, tuple[float, CachedResponse]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, resp = item
+            if expires < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return resp
+
+    def set(self, key: str, resp: CachedResponse, ttl: float) -> None:
+        with self._lock:
+            self._data[key] = (time.time() + ttl, resp)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+
+class SqliteBackend:
+    # File-backed cache shared by every worker process on the host
+    def __init__(self, path: str, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS response_cache (
+              key TEXT PRIMARY KEY,
+              etag TEXT NOT NULL,
+              body BLOB NOT NULL,
+              expires REAL NOT NULL,
+              last_used REAL NOT NULL
+            )
+            """
+        )
+        self.conn.commit()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT etag, body, expires FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[2] < time.time():
+            return None
+        return CachedResponse(body=bytes(row[1]), etag=row[0])
+
+    def set(self, key: str, resp: CachedResponse, ttl: float) -> None:
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO response_cache(key, etag, body, expires, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, resp.etag, resp.body, now + ttl, now),
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self.conn.execute("DELETE FROM response_cache WHERE expires < ?", (now,))
+                self.conn.execute(
+                    """
+                    DELETE FROM response_cache WHERE key IN (
+                      SELECT key FROM response_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                    )
+                    """,
+                    (self.max_entries,),
+                )
+            self.conn.commit()
+
+
+class ResponseCache:
+    # Keys embed the data version, so a scrape that bumps it invalidates every entry at once.
+    # The version itself is re-read at most every `version_check_interval` seconds.
+    def __init__(self, backend, version_fn: Callable[[], int], ttl: float = 300.0,
+                 version_check_interval: float = 5.0):
+        self.backend = backend
+        self.version_fn = version_fn
+        self.ttl = ttl
+        self.version_check_interval = version_check_interval
+        self._version: Optional[int] = None
+        self._version_checked = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def version(self) -> int:
+        with self._lock:
+            now = time.monotonic()
+            if self._version is None or now - self._version_checked >= self.version_check_interval:
+                self._version = self.version_fn()
+                self._version_checked = now
+            return self._version
+
+    def get_or_set(self, key: str, producer: Callable[[], bytes]) -> CachedResponse:
+        full_key = f"v{self.version()}:{key}"
+        resp = self.backend.get(full_key)
+        if resp is not None:
+            self.hits += 1
+            return resp
+
+        self.misses += 1
+        body = producer()
+        resp = CachedResponse(body=body, etag=make_etag(body))
+        self.backend.set(full_key, resp, self.ttl)
+        return resp
@@ -0,0 +1,36 @@
+import time
+
+from book_prices.core.metrics import API_SECONDS
+
+
+class MetricsMiddleware:
+    # Plain ASGI (no BaseHTTPMiddleware), so streaming responses pass straight through.
+    # Requests are labelled with the route template, e.g. /compare/by-isbn/{isbn13}, not
+    # the raw path, to keep one series per endpoint.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            API_SECONDS.observe(
+                time.perf_counter() - started,
+                route=getattr(route, "path", "unmatched"),
+                method=scope["method"],
+                status=status,
+            )
@@ -0,0 +1,86 @@
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Optional
+
+from lxml import etree, html as lxml_html
+
+from .parsing import normalize_price, valid_isbn
+
+# lxml parses straight from bytes (honouring <meta charset>) and drops comments up front
+HTML_PARSER = lxml_html.HTMLParser(remove_comments=True, remove_pis=True)
+
+# Same exclusions as BeautifulSoup.get_text(): script/style/template strings aren't text
+NON_TEXT_TAGS = ("script", "style", "noscript", "template")
+
+FIRST_H1 = etree.XPath("(//h1)[1]")
+TITLE = etree.XPath("(//title)[1]")
+BODY = etree.XPath("(//body)[1]")
+
+
+def has_class(name: str) -> str:
+    # XPath predicate equivalent to the CSS `.name` selector
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def parse_html(data) -> etree._Element:
+    root = lxml_html.document_fromstring(data, parser=HTML_PARSER)
+    etree.strip_elements(root, *NON_TEXT_TAGS, with_tail=False)
+    return root
+
+
+def first(xpath: etree.XPath, root) -> Optional[etree._Element]:
+    found = xpath(root)
+    return found[0] if found else None
+
+
+def element_text(el, separator: str = "") -> str:
+    # Matches BeautifulSoup's get_text(separator, strip=True)
+    return separator.join(t.strip() for t in el.itertext() if t.strip())
+
+
+@dataclass
+class TextScan:
+    prices: list[float] = field(default_factory=list)
+    isbn: Optional[str] = None
+    in_stock: Optional[bool] = None
+
+
+@lru_cache(maxsize=16)
+def _scan_re(price_pattern: str, in_stock_text: str, out_of_stock_text: str) -> re.Pattern:
+    # One alternation instead of a separate pass per field. The ISBN branch mirrors
+    # parsing.ISBN_LABELED_RE as a lookahead, so its digits stay available to the price
+    # branch exactly as with separate searches.
+    return re.compile(
+        f"(?P<price>{price_pattern})"
+        r"|\bISBN\b(?=\s*[:#]?\s*(?P<isbn>[0-9Xx][0-9Xx\s\-]{8,20}))"
+        f"|(?P<out>{re.escape(out_of_stock_text)})"
+        f"|(?P<inn>{re.escape(in_stock_text)})"
+    )
+
+
+def scan_text(text: str, price_re: re.Pattern, in_stock_text: str, out_of_stock_text: str) -> TextScan:
+    # Single pass over the page text returning every price, the first labeled ISBN and
+    # availability with the same precedence as extract_availability_from_text.
+    pattern = _scan_re(price_re.pattern, in_stock_text, out_of_stock_text)
+    scan = TextScan()
+    isbn_seen = False
+    saw_in = saw_out = False
+
+    for m in pattern.finditer(text):
+        if m.group("price") is not None:
+            scan.prices.append(normalize_price(price_re.match(m.group(0)).group(1)))
+        elif m.group("isbn") is not None:
+            if not isbn_seen:
+                isbn_seen = True
+                scan.isbn = valid_isbn(m.group("isbn"))
+        elif m.group("out") is not None:
+            saw_out = True
+        else:
+            saw_in = True
+
+    if saw_out:
+        scan.in_stock = False
+    elif saw_in:
+        scan.in_stock = True
+    return scan
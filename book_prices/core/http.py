@@ -1,17 +1,511 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
 import requests
 from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+
+from .metrics import HTTP_BYTES, HTTP_ERRORS, HTTP_FETCH_SECONDS, HTTP_RETRIES
 
 DEFAULT_HEADERS = {
     "User-Agent": "Mozilla/5.0 (compatible; bookPriceBot/0.1)"
 }
 
+class NotModified(Exception):
+    # Raised by conditional fetches when the page is unchanged since the last crawl
+    def __init__(self, url: str):
+        super().__init__(url)
+        self.url = url
+
+class CircuitOpen(requests.RequestException):
+    # Raised instead of sending a request to a host whose circuit breaker is open
+    def __init__(self, host: str, retry_in: float):
+        super().__init__(f"circuit open for {host}, retry in {retry_in:.0f}s")
+        self.host = host
+        self.retry_in = retry_in
+
+
+class HostState:
+    # Per-host numbers behind AdaptiveController. Everything is guarded by `cond`.
+    def __init__(self, host: str, initial: float, lock: threading.Lock):
+        self.host = host
+        self.limit = initial
+        self.in_flight = 0
+        self.latency: float | None = None
+        self.error_rate = 0.0
+        self.samples = 0
+        self.consecutive_failures = 0
+        self.opened_at: float | None = None
+        self.probing = False
+        self.last_decrease = 0.0
+        self.trips = 0
+        self.cond = threading.Condition(lock)
+
+    def summary(self) -> str:
+        latency = f"{self.latency:.2f}s" if self.latency is not None else "-"
+        return (
+            f"[http {self.host}] limit={self.limit:.1f} latency={latency} "
+            f"error_rate={self.error_rate:.2f} breaker_trips={self.trips}"
+        )
+
+
+class AdaptiveController:
+    # Per-host concurrency that follows what each store tolerates instead of a hand-tuned
+    # worker count: AIMD on in-flight requests (+1 per limit's worth of fast successes,
+    # halved on a throttle, error or slow response, at most once per `cooldown`), and a
+    # circuit breaker that stops sending to a host after repeated failures and lets one
+    # probe through once `open_for` has passed.
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        min_concurrency: int = 1,
+        initial: float | None = None,
+        latency_target: float = 5.0,
+        error_threshold: float = 0.5,
+        failures_to_open: int = 5,
+        open_for: float = 60.0,
+        cooldown: float = 2.0,
+        min_timeout: float = 10.0,
+        max_timeout: float = 25.0,
+        alpha: float = 0.2,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.initial = initial if initial is not None else self.min_concurrency
+        self.latency_target = latency_target
+        self.error_threshold = error_threshold
+        self.failures_to_open = failures_to_open
+        self.open_for = open_for
+        self.cooldown = cooldown
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self.hosts: dict[str, HostState] = {}
+
+    def state(self, host: str) -> HostState:
+        with self._lock:
+            st = self.hosts.get(host)
+            if st is None:
+                st = self.hosts[host] = HostState(host, float(self.initial), threading.Lock())
+            return st
+
+    def timeout(self, host: str) -> float:
+        # Generous multiple of the host's usual latency, so a stuck request gives its
+        # slot back long before the fixed maximum
+        latency = self.state(host).latency
+        if latency is None:
+            return self.max_timeout
+        return min(self.max_timeout, max(self.min_timeout, latency * 8))
+
+    def acquire(self, host: str) -> None:
+        # Blocks until the host has a free slot; raises CircuitOpen while it is tripped
+        st = self.state(host)
+        with st.cond:
+            while not self._take(host, st):
+                st.cond.wait()
+
+    def try_acquire(self, host: str) -> bool:
+        # Non-blocking acquire for callers that can't wait on a lock (the event loop)
+        st = self.state(host)
+        with st.cond:
+            return self._take(host, st)
+
+    def _take(self, host: str, st: HostState) -> bool:
+        # Caller holds st.cond
+        if st.opened_at is not None:
+            remaining = st.opened_at + self.open_for - time.monotonic()
+            if remaining > 0 or st.probing:
+                raise CircuitOpen(host, max(remaining, 0.0))
+            # Half open: this request is the probe, everyone else keeps failing fast
+            st.probing = True
+            st.in_flight += 1
+            return True
+        if st.in_flight < int(st.limit):
+            st.in_flight += 1
+            return True
+        return False
+
+    def release(self, host: str, latency: float | None, ok: bool, throttled: bool = False) -> None:
+        st = self.state(host)
+        now = time.monotonic()
+        with st.cond:
+            st.in_flight -= 1
+            st.samples += 1
+            st.error_rate += self.alpha * ((0.0 if ok else 1.0) - st.error_rate)
+            if latency is not None:
+                st.latency = latency if st.latency is None else st.latency + self.alpha * (latency - st.latency)
+
+            if st.probing:
+                st.probing = False
+                if ok:
+                    st.opened_at = None
+                    st.consecutive_failures = 0
+                    st.error_rate = 0.0
+                    st.limit = float(self.min_concurrency)
+                else:
+                    st.opened_at = now
+            elif ok and not throttled:
+                st.consecutive_failures = 0
+                if latency is not None and latency > self.latency_target:
+                    self._decrease(st, now)
+                else:
+                    st.limit = min(float(self.max_concurrency), st.limit + 1.0 / max(st.limit, 1.0))
+            else:
+                st.consecutive_failures += 1
+                self._decrease(st, now)
+                if st.consecutive_failures >= self.failures_to_open or (
+                    st.samples >= self.failures_to_open * 2 and st.error_rate > self.error_threshold
+                ):
+                    if st.opened_at is None:
+                        st.trips += 1
+                    st.opened_at = now
+            st.cond.notify_all()
+
+    def cancel(self, host: str) -> None:
+        # Gives the slot back without counting the request either way
+        st = self.state(host)
+        with st.cond:
+            st.in_flight -= 1
+            st.probing = False
+            st.cond.notify_all()
+
+    def _decrease(self, st: HostState, now: float) -> None:
+        # One cut per cooldown: a burst of failures from requests that were already in
+        # flight is a single congestion signal
+        if now - st.last_decrease >= self.cooldown:
+            st.limit = max(float(self.min_concurrency), st.limit / 2)
+            st.last_decrease = now
+
+    def retry_at(self) -> float:
+        # monotonic() time by which every open circuit lets a probe through
+        with self._lock:
+            hosts = list(self.hosts.values())
+        return max([st.opened_at + self.open_for for st in hosts if st.opened_at is not None], default=0.0)
+
+    def summary(self) -> list[str]:
+        with self._lock:
+            return [st.summary() for st in self.hosts.values()]
+
+    def metrics(self):
+        # REGISTRY collector
+        with self._lock:
+            hosts = list(self.hosts.values())
+        yield "bp_http_concurrency_limit", "gauge", "Adaptive in-flight limit by host", {
+            (("host", st.host),): st.limit for st in hosts
+        }
+        yield "bp_http_circuit_open", "gauge", "1 while the host's circuit breaker is open", {
+            (("host", st.host),): int(st.opened_at is not None) for st in hosts
+        }
+
+
 class HttpClient:
-    def __init__(self, headers=None, timeout=25):
+    def __init__(self, headers=None, timeout=25, rate_limiter=None, pool_size=10, pool_hosts=0, cache=None,
+                 controller: AdaptiveController | None = None, retries=0, backoff=1.0, max_retry_after=60.0):
         self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.controller = controller
+        # Retries of 429/5xx and connection errors, in the same request (see RETRY_STATUSES)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_retry_after = max_retry_after
         self.session = requests.Session()
         self.session.headers.update(headers or DEFAULT_HEADERS)
 
-    def fetch_soup(self, url: str) -> BeautifulSoup:
-        r = self.session.get(url, timeout=self.timeout)
+        # Concurrent scrapes share this session, so keep enough pooled connections per host,
+        # and a pool for every crawled host (pool_hosts) so they don't evict each other
+        adapter = HTTPAdapter(pool_connections=max(pool_size, pool_hosts), pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _get(self, url: str, conditional: bool = False) -> requests.Response:
+        # With conditional=True and a cache configured, raises NotModified instead of
+        # returning a page that is identical to the previous crawl.
+        cached = self.cache.get(url) if conditional and self.cache is not None else None
+
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+
+        host = urlsplit(url).hostname or ""
+        attempt = 0
+        while True:
+            r, delay = self._send(url, host, headers, attempt)
+            if r is not None:
+                break
+            attempt += 1
+            HTTP_RETRIES.inc(host=host)
+            time.sleep(delay)
+
+        if r.status_code == 304 and cached is not None:
+            self.cache.record_not_modified(url)
+            raise NotModified(url)
         r.raise_for_status()
-        return BeautifulSoup(r.text, "lxml")
+
+        if conditional and self.cache is not None:
+            unchanged = self.cache.store(
+                url, r.headers.get("ETag"), r.headers.get("Last-Modified"), r.content, previous=cached
+            )
+            if unchanged:
+                raise NotModified(url)
+
+        return r
+
+    def _send(self, url: str, host: str, headers: dict, attempt: int):
+        # One attempt: (response, 0) when done, (None, delay) when it should be retried
+        # A slot first, then the token: tokens aren't spent by requests that then wait
+        if self.controller is not None:
+            self.controller.acquire(host)
+        if self.rate_limiter is not None:
+            try:
+                self.rate_limiter.acquire(url)
+            except BaseException:
+                if self.controller is not None:
+                    self.controller.cancel(host)
+                raise
+        timeout = self.controller.timeout(host) if self.controller is not None else self.timeout
+
+        # Timed after the rate limiter, so this is the site's latency, not our politeness
+        started = time.perf_counter()
+        try:
+            r = self.session.get(url, headers=headers, timeout=timeout)
+        except requests.RequestException as e:
+            HTTP_ERRORS.inc(host=host, kind=type(e).__name__)
+            if self.controller is not None:
+                self.controller.release(host, None, ok=False)
+            if attempt >= self.retries or not isinstance(e, (requests.ConnectionError, requests.Timeout)):
+                raise
+            return None, self.backoff * (2 ** attempt)
+        except BaseException:
+            if self.controller is not None:
+                self.controller.cancel(host)
+            raise
+        elapsed = time.perf_counter() - started
+        HTTP_FETCH_SECONDS.observe(elapsed, host=host, status=r.status_code)
+        HTTP_BYTES.inc(len(r.content), host=host)
+        if r.status_code >= 400:
+            HTTP_ERRORS.inc(host=host, kind=f"http_{r.status_code}")
+
+        retryable = r.status_code in RETRY_STATUSES
+        if self.controller is not None:
+            # A 404 is the page's problem, not the host's
+            self.controller.release(host, elapsed, ok=r.status_code < 500 and r.status_code != 429,
+                                    throttled=r.status_code == 429)
+        if retryable and attempt < self.retries:
+            hinted = retry_after_seconds(r.headers.get("Retry-After"))
+            return None, min(hinted, self.max_retry_after) if hinted is not None else self.backoff * (2 ** attempt)
+        return r, 0.0
+
+    def fetch_text(self, url: str, conditional: bool = False) -> str:
+        return self._get(url, conditional=conditional).text
+
+    def fetch_bytes(self, url: str, conditional: bool = False) -> bytes:
+        # Raw body for parsers that do their own charset detection (lxml)
+        return self._get(url, conditional=conditional).content
+
+    def fetch_soup(self, url: str, conditional: bool = False) -> BeautifulSoup:
+        return BeautifulSoup(self.fetch_text(url, conditional=conditional), "lxml")
+
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# How often a coroutine waiting for an AdaptiveController slot checks again (seconds)
+ASYNC_SLOT_POLL = 0.05
+
+
+def retry_after_seconds(value: str | None) -> float | None:
+    # Retry-After is either delta-seconds or an HTTP-date
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class AsyncHttpClient:
+    # aiohttp is only needed for async crawls, so it is imported on first use.
+    # rate_limiter and controller are the same objects the threaded HttpClient uses, so
+    # both crawl modes keep to one per-host politeness budget; `cache` answers conditional
+    # fetches with NotModified like HttpClient does.
+    def __init__(
+        self,
+        headers=None,
+        timeout=25,
+        per_host_limit=8,
+        total_limit=200,
+        retries=3,
+        backoff=1.0,
+        max_retry_after=60.0,
+        rate_limiter=None,
+        controller: AdaptiveController | None = None,
+        cache=None,
+    ):
+        self.headers = headers or DEFAULT_HEADERS
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.controller = controller
+        self.cache = cache
+        self.per_host_limit = per_host_limit
+        self.total_limit = total_limit
+        self.retries = retries
+        self.backoff = backoff
+        self.max_retry_after = max_retry_after
+        self._session = None
+        self._host_slots: dict = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self):
+        import aiohttp
+
+        if self._session is None:
+            # One keep-alive pool shared by all hosts, capped per host
+            connector = aiohttp.TCPConnector(
+                limit=self.total_limit,
+                limit_per_host=self.per_host_limit,
+                keepalive_timeout=30,
+            )
+            self._session = aiohttp.ClientSession(
+                headers=self.headers,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                connector=connector,
+            )
+        return self._session
+
+    def _slots(self, host: str):
+        sem = self._host_slots.get(host)
+        if sem is None:
+            sem = asyncio.Semaphore(self.per_host_limit)
+            self._host_slots[host] = sem
+        return sem
+
+    def _delay(self, attempt: int, retry_after: str | None = None) -> float:
+        hinted = retry_after_seconds(retry_after)
+        if hinted is not None:
+            return min(hinted, self.max_retry_after)
+        return self.backoff * (2 ** attempt)
+
+    async def fetch_text(self, url: str) -> str:
+        return await self._fetch(url, lambda r: r.text())
+
+    async def fetch_bytes(self, url: str, conditional: bool = False) -> bytes:
+        if not conditional or self.cache is None:
+            return await self._fetch(url, lambda r: r.read())
+
+        # The cache is a SQLite file the writer thread also commits to, so it is used off
+        # the event loop
+        cached = await asyncio.to_thread(self.cache.get, url)
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+
+        response = {}
+
+        async def read(r):
+            response.update(status=r.status, etag=r.headers.get("ETag"), last_modified=r.headers.get("Last-Modified"))
+            return await r.read()
+
+        body = await self._fetch(url, read, headers=headers)
+        if response["status"] == 304 and cached is not None:
+            await asyncio.to_thread(self.cache.record_not_modified, url)
+            raise NotModified(url)
+        if await asyncio.to_thread(
+            self.cache.store, url, response["etag"], response["last_modified"], body, cached
+        ):
+            raise NotModified(url)
+        return body
+
+    async def _acquire(self, url: str, host: str) -> None:
+        # Same order as HttpClient._send: a slot first, then the token
+        if self.controller is not None:
+            while not self.controller.try_acquire(host):
+                await asyncio.sleep(ASYNC_SLOT_POLL)
+        if self.rate_limiter is not None:
+            try:
+                await asyncio.sleep(self.rate_limiter.reserve(url))
+            except BaseException:
+                if self.controller is not None:
+                    self.controller.cancel(host)
+                raise
+
+    def _release(self, host: str, latency: float | None, status: int | None) -> None:
+        if self.controller is not None:
+            ok = status is not None and status < 500 and status != 429
+            self.controller.release(host, latency, ok=ok, throttled=status == 429)
+
+    async def _fetch(self, url: str, read, headers: dict | None = None):
+        import aiohttp
+
+        session = self._get_session()
+        host = urlsplit(url).hostname or ""
+        async with self._slots(host):
+            attempt = 0
+            while True:
+                await self._acquire(url, host)
+                kwargs = {"headers": headers} if headers else {}
+                if self.controller is not None:
+                    kwargs["timeout"] = aiohttp.ClientTimeout(total=self.controller.timeout(host))
+                started = time.perf_counter()
+                released = False
+                try:
+                    async with session.get(url, **kwargs) as r:
+                        self._release(host, time.perf_counter() - started, r.status)
+                        released = True
+                        if r.status in RETRY_STATUSES and attempt < self.retries:
+                            HTTP_ERRORS.inc(host=host, kind=f"http_{r.status}")
+                            delay = self._delay(attempt, r.headers.get("Retry-After"))
+                        else:
+                            if r.status >= 400:
+                                HTTP_ERRORS.inc(host=host, kind=f"http_{r.status}")
+                            r.raise_for_status()
+                            body = await read(r)
+                            HTTP_FETCH_SECONDS.observe(time.perf_counter() - started, host=host, status=r.status)
+                            HTTP_BYTES.inc(r.content_length or len(body), host=host)
+                            return body
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                    if not released:
+                        self._release(host, None, None)
+                    HTTP_ERRORS.inc(host=host, kind=type(e).__name__)
+                    if attempt >= self.retries:
+                        raise
+                    delay = self._delay(attempt)
+                except BaseException:
+                    if not released and self.controller is not None:
+                        self.controller.cancel(host)
+                    raise
+
+                attempt += 1
+                HTTP_RETRIES.inc(host=host)
+                await asyncio.sleep(delay)
+
+    async def fetch_soup(self, url: str) -> BeautifulSoup:
+        text = await self.fetch_text(url)
+        # Parse off the event loop so slow pages don't stall other fetches
+        return await asyncio.to_thread(BeautifulSoup, text, "lxml")
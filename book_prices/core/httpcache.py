@@ -0,0 +1,158 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    url: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    content_hash: str
+
+
+def content_hash(body: bytes) -> str:
+    return hashlib.sha1(body).hexdigest()
+
+
+class HttpCache:
+    # Validators only (no bodies), so entries stay ~200 bytes and the file stays small.
+    # With deferred=True, store() only stages a page's validators and commit(urls) saves
+    # them once the data taken from those pages is safely written. A page whose parse or
+    # write failed is then fetched in full next time instead of answering NotModified.
+    def __init__(self, path: str, max_entries: int = 100_000, deferred: bool = False):
+        self.path = path
+        self.max_entries = max_entries
+        self.deferred = deferred
+        self.pending: dict[str, tuple] = {}
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS http_cache (
+              url TEXT PRIMARY KEY,
+              etag TEXT,
+              last_modified TEXT,
+              content_hash TEXT NOT NULL,
+              last_used REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_http_cache_last_used ON http_cache(last_used)")
+        self.conn.commit()
+
+        self.hits = 0          # 304 or identical body
+        self.misses = 0        # new or changed page
+        self.not_modified = 0  # subset of hits answered with a 304
+        self.evictions = 0
+        self._puts_since_evict = 0
+
+    def close(self):
+        with self.lock:
+            # Whatever is still staged belongs to pages that never made it to the DB
+            self.pending.clear()
+            self._evict_locked()
+            self.conn.commit()
+            self.conn.close()
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT etag, last_modified, content_hash FROM http_cache WHERE url = ?",
+                (url,),
+            ).fetchone()
+        if row is None:
+            return None
+        return CacheEntry(url=url, etag=row[0], last_modified=row[1], content_hash=row[2])
+
+    def record_not_modified(self, url: str) -> None:
+        with self.lock:
+            self.hits += 1
+            self.not_modified += 1
+            self.conn.execute("UPDATE http_cache SET last_used = ? WHERE url = ?", (time.time(), url))
+            self.conn.commit()
+
+    def store(self, url: str, etag: Optional[str], last_modified: Optional[str], body: bytes,
+              previous: Optional[CacheEntry] = None) -> bool:
+        # Returns True when the body is identical to the previously cached one
+        h = content_hash(body)
+        unchanged = previous is not None and previous.content_hash == h
+
+        with self.lock:
+            if unchanged:
+                self.hits += 1
+            else:
+                self.misses += 1
+            row = (url, etag, last_modified, h, time.time())
+            if self.deferred:
+                self.pending[url] = row
+            else:
+                self._put_locked([row])
+
+        return unchanged
+
+    def commit(self, urls) -> int:
+        # Saves the staged validators of these URLs (deferred mode); returns how many
+        with self.lock:
+            rows = [row for row in (self.pending.pop(url, None) for url in urls) if row is not None]
+            if rows:
+                self._put_locked(rows)
+        return len(rows)
+
+    def discard(self, url: str) -> None:
+        with self.lock:
+            self.pending.pop(url, None)
+
+    def _put_locked(self, rows: list[tuple]) -> None:
+        self.conn.executemany(
+            """
+            INSERT INTO http_cache(url, etag, last_modified, content_hash, last_used)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET
+              etag = excluded.etag,
+              last_modified = excluded.last_modified,
+              content_hash = excluded.content_hash,
+              last_used = excluded.last_used
+            """,
+            rows,
+        )
+        self._puts_since_evict += len(rows)
+        if self._puts_since_evict >= 500:
+            self._evict_locked()
+        self.conn.commit()
+
+    def _evict_locked(self) -> None:
+        self._puts_since_evict = 0
+        (count,) = self.conn.execute("SELECT COUNT(*) FROM http_cache").fetchone()
+        excess = count - self.max_entries
+        if excess <= 0:
+            return
+        # Least recently used entries go first
+        self.conn.execute(
+            """
+            DELETE FROM http_cache WHERE url IN (
+              SELECT url FROM http_cache ORDER BY last_used ASC LIMIT ?
+            )
+            """,
+            (excess,),
+        )
+        self.evictions += excess
+
+    def evict(self) -> None:
+        with self.lock:
+            self._evict_locked()
+            self.conn.commit()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
@@ -0,0 +1,144 @@
+import math
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+# Links store products without an ISBN to known books by normalized title (the
+# title_norm both stores already compute). Titles are compared as sets of character
+# trigrams with Jaccard similarity; candidates come from prefix-filtered trigram
+# blocking, so a title is only compared with books that can possibly reach the
+# threshold instead of with every book.
+
+# Minimum Jaccard similarity for a link
+MATCH_THRESHOLD = float(os.getenv("MATCH_THRESHOLD", "0.8"))
+# The best book has to beat the runner-up by this much, otherwise the title is ambiguous
+# (same title, different editions) and stays unlinked
+MATCH_MARGIN = float(os.getenv("MATCH_MARGIN", "0.05"))
+
+NUMBER_RE = re.compile(r"\d+")
+
+
+def trigrams(title_norm: str) -> FrozenSet[str]:
+    # Padded, so short words and word boundaries still produce grams
+    t = f" {title_norm} "
+    return frozenset(t[i:i + 3] for i in range(len(t) - 2))
+
+
+def numbers(title_norm: str) -> FrozenSet[str]:
+    # Volume / part numbers: "ჰარი პოტერი 2" must not link to part 3
+    return frozenset(n.lstrip("0") or "0" for n in NUMBER_RE.findall(title_norm))
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    inter = len(a & b)
+    return inter / (len(a) + len(b) - inter)
+
+
+def prefix_length(size: int, threshold: float) -> int:
+    # Two sets with Jaccard >= threshold share at least one token within their first
+    # size - ceil(threshold * size) + 1 tokens, under any fixed global token order
+    return size - math.ceil(threshold * size - 1e-9) + 1
+
+
+@dataclass
+class BookTitle:
+    book_id: int
+    title_norm: str
+    # Stores that already sell this book; a product isn't linked to a book its own
+    # store already has (that is another edition or a duplicate listing)
+    stores: FrozenSet[str] = frozenset()
+
+
+@dataclass
+class MatchResult:
+    book_id: Optional[int]
+    score: float
+    # matched / ambiguous / below_threshold / no_candidates / number_mismatch
+    status: str
+    candidates: int = 0
+
+
+class TitleIndex:
+    def __init__(self, books: Iterable[BookTitle], threshold: float = MATCH_THRESHOLD,
+                 margin: float = MATCH_MARGIN):
+        self.threshold = threshold
+        self.margin = margin
+        self.books: List[BookTitle] = []
+        self.grams: List[FrozenSet[str]] = []
+        self.nums: List[FrozenSet[str]] = []
+        for b in books:
+            g = trigrams(b.title_norm) if b.title_norm else frozenset()
+            if not g:
+                continue
+            self.books.append(b)
+            self.grams.append(g)
+            self.nums.append(numbers(b.title_norm))
+
+        # Rare grams first: prefixes then consist of the most selective grams and the
+        # posting lists probed per query stay short
+        df = Counter(g for grams in self.grams for g in grams)
+        self._rank: Dict[str, int] = {
+            g: i for i, (g, _) in enumerate(sorted(df.items(), key=lambda kv: (kv[1], kv[0])))
+        }
+        self.postings: Dict[str, List[int]] = {}
+        for idx, grams in enumerate(self.grams):
+            for g in self._prefix(grams):
+                self.postings.setdefault(g, []).append(idx)
+
+    def __len__(self) -> int:
+        return len(self.books)
+
+    def _prefix(self, grams: FrozenSet[str]) -> List[str]:
+        # Grams the index has never seen rank before all others (they can't match anyway)
+        ordered = sorted(grams, key=lambda g: (self._rank.get(g, -1), g))
+        return ordered[:prefix_length(len(ordered), self.threshold)]
+
+    def candidates(self, grams: FrozenSet[str]) -> List[int]:
+        n = len(grams)
+        lo, hi = self.threshold * n, n / self.threshold if self.threshold > 0 else float("inf")
+        seen = set()
+        out = []
+        for g in self._prefix(grams):
+            for idx in self.postings.get(g, ()):
+                if idx in seen:
+                    continue
+                seen.add(idx)
+                # Length filter: |B| outside [t|A|, |A|/t] can't reach the threshold
+                if lo <= len(self.grams[idx]) <= hi:
+                    out.append(idx)
+        return out
+
+    def match(self, title_norm: Optional[str], store: Optional[str] = None) -> MatchResult:
+        grams = trigrams(title_norm) if title_norm else frozenset()
+        if not grams:
+            return MatchResult(None, 0.0, "no_candidates")
+        cands = self.candidates(grams)
+        if not cands:
+            return MatchResult(None, 0.0, "no_candidates")
+
+        nums = numbers(title_norm)
+        scored: List[Tuple[float, int]] = []
+        mismatched = False
+        for idx in cands:
+            if store is not None and store in self.books[idx].stores:
+                continue
+            score = jaccard(grams, self.grams[idx])
+            if score < self.threshold:
+                continue
+            if self.nums[idx] != nums:
+                mismatched = True
+                continue
+            scored.append((score, idx))
+
+        if not scored:
+            return MatchResult(None, 0.0, "number_mismatch" if mismatched else "below_threshold", len(cands))
+
+        scored.sort(reverse=True)
+        best_score, best = scored[0]
+        if len(scored) > 1 and scored[1][0] > best_score - self.margin:
+            return MatchResult(None, best_score, "ambiguous", len(cands))
+        return MatchResult(self.books[best].book_id, best_score, "matched", len(cands))
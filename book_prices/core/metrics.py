@@ -0,0 +1,248 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# In-process metrics with Prometheus text exposition. Each process (crawl, every API
+# worker) has its own registry; /metrics shows the serving worker's numbers.
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# Seconds; covers sub-millisecond SQLite lookups up to slow page downloads
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+
+def _key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    items = key + extra
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, lock: threading.Lock):
+        self.name = name
+        self.help = help
+        self._lock = lock
+        self.values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self.values.get(_key(labels), 0)
+
+    def export(self) -> list:
+        with self._lock:
+            return sorted(self.values.items())
+
+    def samples(self) -> Iterable[str]:
+        for key, v in self.export():
+            yield f"{self.name}{_fmt_labels(key)} {_fmt_value(v)}"
+
+    def merge(self, data: list) -> None:
+        with self._lock:
+            for key, v in data:
+                key = tuple(tuple(kv) for kv in key)
+                self.values[key] = self.values.get(key, 0) + v
+
+    def reset(self) -> None:
+        with self._lock:
+            self.values.clear()
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, lock: threading.Lock, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self._lock = lock
+        self.buckets = tuple(buckets)
+        # label key -> [per-bucket counts..., +Inf count, sum]
+        self.values: Dict[LabelKey, List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = _key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self.values.get(key)
+            if row is None:
+                row = self.values[key] = [0] * (len(self.buckets) + 2)
+            row[i] += 1
+            row[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def stats(self, row: List[float]) -> dict:
+        count = sum(row[:-1])
+        return {
+            "count": count,
+            "sum": row[-1],
+            "avg": row[-1] / count if count else 0.0,
+            "p50": self._quantile(row, 0.5),
+            "p95": self._quantile(row, 0.95),
+        }
+
+    def _quantile(self, row: List[float], q: float) -> float:
+        # Linear interpolation inside the bucket, like Prometheus' histogram_quantile
+        count = sum(row[:-1])
+        if not count:
+            return 0.0
+        rank = q * count
+        seen = 0
+        for i, n in enumerate(row[:-1]):
+            if seen + n >= rank and n:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+    def export(self) -> list:
+        with self._lock:
+            return sorted((key, list(row)) for key, row in self.values.items())
+
+    def samples(self) -> Iterable[str]:
+        for key, row in self.export():
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), row[:-1]):
+                cumulative += n
+                yield f"{self.name}_bucket{_fmt_labels(key, (('le', _fmt_value(bound)),))} {_fmt_value(cumulative)}"
+            yield f"{self.name}_sum{_fmt_labels(key)} {_fmt_value(row[-1])}"
+            yield f"{self.name}_count{_fmt_labels(key)} {_fmt_value(cumulative)}"
+
+    def merge(self, data: list) -> None:
+        with self._lock:
+            for key, row in data:
+                key = tuple(tuple(kv) for kv in key)
+                mine = self.values.setdefault(key, [0] * (len(self.buckets) + 2))
+                for i, v in enumerate(row):
+                    mine[i] += v
+
+    def reset(self) -> None:
+        with self._lock:
+            self.values.clear()
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.metrics: Dict[str, object] = {}
+        # Callbacks yielding (name, type, help, {label key: value}) for numbers that live
+        # elsewhere (cache stats...), read at scrape time
+        self.collectors: List[Callable[[], Iterable[Tuple[str, str, str, Dict[LabelKey, float]]]]] = []
+
+    def counter(self, name: str, help: str) -> Counter:
+        with self._lock:
+            if name not in self.metrics:
+                self.metrics[name] = Counter(name, help, threading.Lock())
+            return self.metrics[name]
+
+    def histogram(self, name: str, help: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        with self._lock:
+            if name not in self.metrics:
+                self.metrics[name] = Histogram(name, help, threading.Lock(), buckets)
+            return self.metrics[name]
+
+    def collector(self, fn) -> None:
+        self.collectors.append(fn)
+
+    def render(self) -> str:
+        lines = []
+        for m in self.metrics.values():
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            lines.extend(m.samples())
+        for fn in self.collectors:
+            for name, kind, help, values in fn():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for key, v in sorted(values.items()):
+                    lines.append(f"{name}{_fmt_labels(key)} {_fmt_value(v)}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, reset: bool = False) -> dict:
+        # Picklable snapshot, e.g. to ship a parse worker's numbers to the crawl process
+        with self._lock:
+            data = {name: m.export() for name, m in self.metrics.items() if m.values}
+            if reset:
+                for m in self.metrics.values():
+                    m.reset()
+        return data
+
+    def merge(self, data: dict) -> None:
+        for name, values in data.items():
+            m = self.metrics.get(name)
+            if m is not None:
+                m.merge(values)
+
+    def summary(self, prefixes: Optional[Tuple[str, ...]] = None) -> List[str]:
+        # Human readable, one line per label set; used for the end-of-crawl report
+        lines = []
+        for m in self.metrics.values():
+            if prefixes and not m.name.startswith(prefixes):
+                continue
+            for key, value in m.export():
+                labels = " ".join(f"{k}={v}" for k, v in key)
+                if isinstance(m, Histogram):
+                    s = m.stats(value)
+                    lines.append(
+                        f"[metrics] {m.name} {labels} count={s['count']:.0f} avg={s['avg'] * 1000:.2f}ms "
+                        f"p50={s['p50'] * 1000:.2f}ms p95={s['p95'] * 1000:.2f}ms total={s['sum']:.2f}s"
+                    )
+                else:
+                    lines.append(f"[metrics] {m.name} {labels} {_fmt_value(value)}")
+        return lines
+
+
+REGISTRY = Registry()
+
+# HTTP client (per host)
+HTTP_FETCH_SECONDS = REGISTRY.histogram("bp_http_fetch_seconds", "Page download time by host and status")
+HTTP_BYTES = REGISTRY.counter("bp_http_bytes_total", "Response bytes downloaded by host")
+HTTP_ERRORS = REGISTRY.counter("bp_http_errors_total", "Failed requests by host and error kind")
+HTTP_RETRIES = REGISTRY.counter("bp_http_retries_total", "Retried requests by host")
+
+# Adapters (per store): HTML parsing and field extraction
+PARSE_SECONDS = REGISTRY.histogram("bp_parse_seconds", "Product page processing by store and phase")
+
+# Crawl pipeline (per store)
+CRAWL_PAGES = REGISTRY.counter("bp_crawl_pages_total", "Product pages by store and outcome")
+CRAWL_BYTES = REGISTRY.counter("bp_crawl_bytes_total", "Product page bytes by store")
+CRAWL_ERRORS = REGISTRY.counter("bp_crawl_errors_total", "Crawl errors by store and stage")
+
+# Storage (per backend and store method)
+DB_SECONDS = REGISTRY.histogram("bp_db_statement_seconds", "Database statement time by backend and operation")
+DB_ERRORS = REGISTRY.counter("bp_db_errors_total", "Failed database statements by backend and operation")
+
+# API (per route template)
+API_SECONDS = REGISTRY.histogram("bp_api_request_seconds", "API request latency by route, method and status")
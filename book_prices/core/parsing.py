@@ -35,17 +35,40 @@ def is_valid_isbn13(isbn13: str) -> bool:
     check = (10 - (total % 10)) % 10
     return check == int(isbn13[12])
 
-def extract_isbn_labeled(text: str) -> str | None:
-    m = ISBN_LABELED_RE.search(text)
-    if not m:
-        return None
-    candidate = _clean_isbn(m.group(1))
+def valid_isbn(raw: str) -> str | None:
+    candidate = _clean_isbn(raw)
     if len(candidate) == 13 and is_valid_isbn13(candidate):
         return candidate
     if len(candidate) == 10 and is_valid_isbn10(candidate):
         return candidate
     return None
 
+def isbn10_to_isbn13(isbn10: str) -> str:
+    body = "978" + isbn10[:9]
+    total = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(body))
+    return body + str((10 - (total % 10)) % 10)
+
+def isbn13_to_isbn10(isbn13: str) -> str | None:
+    # Only 978- ISBNs have an ISBN-10 form
+    if not isbn13.startswith("978"):
+        return None
+    body = isbn13[3:12]
+    check = (11 - sum((10 - i) * int(d) for i, d in enumerate(body)) % 11) % 11
+    return body + ("X" if check == 10 else str(check))
+
+def normalize_isbn13(raw: str) -> str | None:
+    # Any valid ISBN-10/13 spelling as ISBN-13, None if it isn't one
+    isbn = valid_isbn(raw)
+    if isbn is not None and len(isbn) == 10:
+        return isbn10_to_isbn13(isbn)
+    return isbn
+
+def extract_isbn_labeled(text: str) -> str | None:
+    m = ISBN_LABELED_RE.search(text)
+    if not m:
+        return None
+    return valid_isbn(m.group(1))
+
 def extract_availability_from_text(
     text: str,
     in_stock_text: str,
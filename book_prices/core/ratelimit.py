@@ -0,0 +1,68 @@
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float = 1.0):
+        # rate <= 0 disables limiting
+        self.rate = rate
+        self.capacity = max(burst, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        # Takes a token right away, going into debt if there is none, and returns how long
+        # the caller has to wait before using it; for asyncio callers that can't block
+        if self.rate <= 0:
+            return 0.0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self) -> float:
+        # Blocks until a token is available and returns the seconds spent waiting.
+        if self.rate <= 0:
+            return 0.0
+
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class HostRateLimiter:
+    def __init__(self, default_rate: float = 4.0, burst: float = 1.0, per_host: dict[str, float] | None = None):
+        self.default_rate = default_rate
+        self.burst = burst
+        self.per_host = dict(per_host or {})
+        self._buckets: dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, host: str) -> TokenBucket:
+        with self._lock:
+            b = self._buckets.get(host)
+            if b is None:
+                b = TokenBucket(self.per_host.get(host, self.default_rate), self.burst)
+                self._buckets[host] = b
+            return b
+
+    def acquire(self, url: str) -> float:
+        host = urlsplit(url).hostname or ""
+        return self.bucket(host).acquire()
+
+    def reserve(self, url: str) -> float:
+        host = urlsplit(url).hostname or ""
+        return self.bucket(host).reserve()
@@ -0,0 +1,18 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv(os.path.join(os.path.dirname(__file__), "../../.env"))
+
+from book_prices.storage import open_store
+
+def main():
+    db = open_store()
+    db.init_schema()
+
+    n = db.backfill_offer_history()
+    print(f"[backfill] offer_history rows written={n}")
+
+    db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,556 @@
+import asyncio
+import concurrent.futures
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Iterable
+
+import requests
+
+from book_prices.core.http import NotModified
+from book_prices.core.metrics import CRAWL_BYTES, CRAWL_ERRORS, CRAWL_PAGES
+from book_prices.core.models import ProductRef, Offer
+
+
+@dataclass
+class StoreJob:
+    store: str
+    iter_products: Callable[[], Iterable[ProductRef]]
+    fetch_page: Callable[[ProductRef], bytes]
+    parse_offer: Callable[[ProductRef, bytes], Offer]
+    # Coroutine variant used by run_async, e.g. lambda p: adapter.afetch_offer(p, ahttp)
+    afetch_offer: Callable[[ProductRef], Awaitable[Offer]] | None = None
+    # Fetch threads for this store (None = the Pipeline's workers_per_store)
+    workers: int | None = None
+
+
+@dataclass
+class StoreStats:
+    store: str
+    products: int = 0
+    fetched: int = 0
+    unchanged: int = 0
+    errors: int = 0
+    retried: int = 0
+    started: float = field(default_factory=time.monotonic)
+    finished: float | None = None
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def incr(self, **counts: int) -> None:
+        with self.lock:
+            for name, n in counts.items():
+                setattr(self, name, getattr(self, name) + n)
+
+    @property
+    def elapsed(self) -> float:
+        end = self.finished if self.finished is not None else time.monotonic()
+        return end - self.started
+
+    @property
+    def pages_per_sec(self) -> float:
+        return self.fetched / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"[{self.store}] done products={self.products} fetched={self.fetched} "
+            f"unchanged={self.unchanged} errors={self.errors} retried={self.retried} elapsed={self.elapsed:.1f}s pages/sec={self.pages_per_sec:.2f}"
+        )
+
+
+@dataclass
+class StageStats:
+    name: str
+    workers: int = 1
+    items: int = 0
+    busy: float = 0.0
+    started: float = field(default_factory=time.monotonic)
+    finished: float | None = None
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, seconds: float) -> None:
+        with self.lock:
+            self.items += 1
+            self.busy += seconds
+
+    def summary(self) -> str:
+        wall = (self.finished or time.monotonic()) - self.started
+        rate = self.items / wall if wall > 0 else 0.0
+        return (
+            f"[stage {self.name}] workers={self.workers} items={self.items} "
+            f"wall={wall:.1f}s items/sec={rate:.2f} busy={self.busy:.1f}s"
+        )
+
+
+_STOP = object()
+
+
+class BufferedWriter:
+    # Writer stage between fetch workers and the DB: offers are queued and written in
+    # batches on a background thread, so fetching never waits on a round trip.
+    # ProductRefs passed to unchanged() are products whose page didn't change; they go
+    # to mark_unchanged in the same batches. After a batch is written, on_written gets the
+    # URLs it covered (e.g. HttpCache.commit).
+    def __init__(
+        self,
+        write_many: Callable[[list[Offer]], int],
+        batch_size: int = 200,
+        flush_interval: float = 2.0,
+        mark_unchanged: Callable[[list[ProductRef]], None] | None = None,
+        on_written: Callable[[list[str]], None] | None = None,
+    ):
+        self.write_many = write_many
+        self.mark_unchanged = mark_unchanged
+        self.on_written = on_written
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: queue.Queue = queue.Queue(maxsize=batch_size * 4)
+        self.received = 0
+        self.inserted = 0
+        self.batches = 0
+        self.busy = 0.0
+        self.error: BaseException | None = None
+        self.thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self.thread.start()
+
+    def add(self, offer: Offer) -> None:
+        if self.error is not None:
+            raise self.error
+        self.queue.put(offer)
+
+    def unchanged(self, ref: ProductRef) -> None:
+        if self.error is not None:
+            raise self.error
+        if self.mark_unchanged is not None:
+            self.queue.put(ref)
+
+    def close(self) -> None:
+        self.queue.put(_STOP)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def _flush(self, buf: list) -> None:
+        if not buf or self.error is not None:
+            return
+        offers = [x for x in buf if isinstance(x, Offer)]
+        refs = [x for x in buf if isinstance(x, ProductRef)]
+        started = time.monotonic()
+        try:
+            if offers:
+                self.inserted += self.write_many(offers)
+            if refs:
+                self.mark_unchanged(refs)
+            if self.on_written is not None:
+                self.on_written([x.url for x in buf])
+            self.batches += 1
+            self.busy += time.monotonic() - started
+        except BaseException as e:
+            # Keep draining the queue so producers don't block; add() re-raises
+            self.error = e
+
+    def _run(self) -> None:
+        buf: list = []
+        while True:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self._flush(buf)
+                buf = []
+                continue
+
+            if item is _STOP:
+                break
+            buf.append(item)
+            if isinstance(item, Offer):
+                self.received += 1
+            if len(buf) >= self.batch_size:
+                self._flush(buf)
+                buf = []
+
+        self._flush(buf)
+
+    def summary(self) -> str:
+        rate = self.received / self.busy if self.busy > 0 else 0.0
+        return (
+            f"[stage write] offers={self.received} batches={self.batches} inserted={self.inserted} "
+            f"busy={self.busy:.1f}s offers/busy-sec={rate:.1f}"
+        )
+
+
+class Pipeline:
+    # listing -> fetching -> parsing -> writing, connected by bounded queues so work
+    # starts with the first listing page and memory doesn't grow with the catalog.
+    # Listing and fetching run per store (each host is rate limited on its own);
+    # parsing is shared by all stores and writing goes through the BufferedWriter.
+    # Product pages that fail to download are set aside and fetched again after the
+    # listing is done (retry_rounds times, not before retry_at(), a monotonic() time such
+    # as AdaptiveController.retry_at); only failures in the last round count as errors.
+    # A failure that isn't about one page (the writer can't write) aborts every stage
+    # and run() raises it.
+    def __init__(
+        self,
+        jobs: list[StoreJob],
+        writer: BufferedWriter,
+        workers_per_store: int = 4,
+        parse_workers: int = 2,
+        queue_size: int = 100,
+        retry_rounds: int = 1,
+        retry_at: Callable[[], float] | None = None,
+    ):
+        self.jobs = jobs
+        self.writer = writer
+        self.workers_per_store = max(1, workers_per_store)
+        self.parse_workers = max(1, parse_workers)
+        self.queue_size = queue_size
+        self.stores = {job.store: StoreStats(store=job.store) for job in jobs}
+        self.stages = {
+            "list": StageStats("list", workers=len(jobs)),
+            "fetch": StageStats("fetch", workers=sum(self._workers(job) for job in jobs)),
+            "parse": StageStats("parse", workers=self.parse_workers),
+        }
+        self.parse_q: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.retry_rounds = max(0, retry_rounds)
+        self.retry_at = retry_at
+        self.retry: dict[str, list[ProductRef]] = {job.store: [] for job in jobs}
+        self.abort = threading.Event()
+        self.failure: BaseException | None = None
+
+    def run(self) -> "Pipeline":
+        started = time.monotonic()
+        upstream = []
+        for job in self.jobs:
+            fetch_q: queue.Queue = queue.Queue(maxsize=self.queue_size)
+            upstream.append(threading.Thread(target=self._list, args=(job, fetch_q), name=f"list-{job.store}"))
+            retry = self.retry[job.store] if self.retry_rounds else None
+            upstream += [
+                threading.Thread(target=self._fetch, args=(job, fetch_q, retry), name=f"fetch-{job.store}-{i}")
+                for i in range(self._workers(job))
+            ]
+        parsers = [
+            threading.Thread(target=self._parse, name=f"parse-{i}") for i in range(self.parse_workers)
+        ]
+
+        for t in upstream + parsers:
+            t.start()
+        for t in upstream:
+            t.join()
+        for round_no in range(1, self.retry_rounds + 1):
+            if self.abort.is_set():
+                break
+            self._replay(last=round_no == self.retry_rounds)
+        self.stages["fetch"].finished = time.monotonic()
+
+        for _ in parsers:
+            self._put(self.parse_q, _STOP)
+        for t in parsers:
+            t.join()
+        self.stages["parse"].finished = time.monotonic()
+
+        for stats in self.stores.values():
+            print(stats.summary())
+        for stage in self.stages.values():
+            print(stage.summary())
+        print(f"[crawl] stores={len(self.stores)} wall={time.monotonic() - started:.1f}s")
+        if self.failure is not None:
+            raise self.failure
+        return self
+
+    def _fail(self, e: BaseException) -> None:
+        if self.failure is None:
+            self.failure = e
+            print(f"[crawl] ABORT err={e!r}")
+        self.abort.set()
+
+    def _put(self, q: queue.Queue, item) -> bool:
+        # Blocking put that gives up once the crawl is aborted (nobody may be consuming)
+        while not self.abort.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _get(self, q: queue.Queue):
+        while not self.abort.is_set():
+            try:
+                return q.get(timeout=0.5)
+            except queue.Empty:
+                pass
+        return _STOP
+
+    def _workers(self, job: StoreJob) -> int:
+        return max(1, job.workers) if job.workers else self.workers_per_store
+
+    def _list(self, job: StoreJob, fetch_q: queue.Queue) -> None:
+        stats = self.stores[job.store]
+        stage = self.stages["list"]
+        try:
+            t0 = time.monotonic()
+            for ref in job.iter_products():
+                stage.record(time.monotonic() - t0)
+                stats.incr(products=1)
+                if not self._put(fetch_q, ref):
+                    return
+                t0 = time.monotonic()
+        except Exception as e:
+            if self.writer.error is not None:
+                # on_unchanged hit the failed writer; that is not a listing problem
+                self._fail(self.writer.error)
+                return
+            # What was listed so far still gets fetched
+            stats.incr(errors=1)
+            CRAWL_ERRORS.inc(store=job.store, stage="list")
+            print(f"[{job.store}] ERROR listing stopped err={e}")
+        finally:
+            for _ in range(self._workers(job)):
+                self._put(fetch_q, _STOP)
+            self.stages["list"].finished = time.monotonic()
+
+    def _replay(self, last: bool) -> None:
+        pending, self.retry = self.retry, {job.store: [] for job in self.jobs}
+        if not any(pending.values()):
+            return
+        wait = self.retry_at() - time.monotonic() if self.retry_at is not None else 0.0
+        print(f"[retry] products={sum(map(len, pending.values()))} wait={max(wait, 0.0):.1f}s")
+        if wait > 0:
+            time.sleep(wait)
+
+        threads = []
+        for job in self.jobs:
+            refs = pending[job.store]
+            if not refs:
+                continue
+            fetch_q: queue.Queue = queue.Queue()
+            for ref in refs:
+                fetch_q.put(ref)
+            workers = min(self._workers(job), len(refs))
+            for _ in range(workers):
+                fetch_q.put(_STOP)
+            retry = None if last else self.retry[job.store]
+            threads += [
+                threading.Thread(target=self._fetch, args=(job, fetch_q, retry), name=f"retry-{job.store}-{i}")
+                for i in range(workers)
+            ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    def _fetch(self, job: StoreJob, fetch_q: queue.Queue, retry: list[ProductRef] | None = None) -> None:
+        stats = self.stores[job.store]
+        stage = self.stages["fetch"]
+        while True:
+            ref = self._get(fetch_q)
+            if ref is _STOP:
+                break
+
+            t0 = time.monotonic()
+            try:
+                html = job.fetch_page(ref)
+            except NotModified:
+                # Page identical to the last crawl: nothing to parse or write
+                stage.record(time.monotonic() - t0)
+                stats.incr(fetched=1, unchanged=1)
+                CRAWL_PAGES.inc(store=job.store, outcome="unchanged")
+                try:
+                    self.writer.unchanged(ref)
+                except Exception as e:
+                    self._fail(e)
+                    break
+                continue
+            except requests.RequestException as e:
+                if retry is not None:
+                    retry.append(ref)
+                    stats.incr(retried=1)
+                    print(f"[{job.store}] RETRY later url={ref.url} err={e}")
+                    continue
+                stats.incr(errors=1)
+                CRAWL_ERRORS.inc(store=job.store, stage="fetch")
+                print(f"[{job.store}] ERROR url={ref.url} err={e}")
+                continue
+            except Exception as e:
+                # Anything else (cache, adapter bug) is this page's problem, not the worker's
+                stats.incr(errors=1)
+                CRAWL_ERRORS.inc(store=job.store, stage="fetch")
+                print(f"[{job.store}] ERROR url={ref.url} err={e!r}")
+                continue
+
+            stage.record(time.monotonic() - t0)
+            stats.incr(fetched=1)
+            CRAWL_PAGES.inc(store=job.store, outcome="fetched")
+            CRAWL_BYTES.inc(len(html), store=job.store)
+            if not self._put(self.parse_q, (job, ref, html)):
+                break
+
+        with stats.lock:
+            stats.finished = time.monotonic()
+
+    def _parse(self) -> None:
+        stage = self.stages["parse"]
+        while True:
+            item = self._get(self.parse_q)
+            if item is _STOP:
+                break
+
+            job, ref, html = item
+            t0 = time.monotonic()
+            try:
+                offer = job.parse_offer(ref, html)
+            except Exception as e:
+                self.stores[job.store].incr(errors=1)
+                CRAWL_ERRORS.inc(store=job.store, stage="parse")
+                print(f"[{job.store}] ERROR parse url={ref.url} err={e}")
+                continue
+            stage.record(time.monotonic() - t0)
+
+            try:
+                self.writer.add(offer)
+            except Exception as e:
+                self._fail(e)
+                break
+            print(f"[{job.store}] price={offer.price_gel} isbn={offer.isbn} stock={offer.in_stock} url={ref.url}")
+
+
+async def scrape_store_async(
+    job: StoreJob,
+    upsert_fn: Callable[[Offer], None],
+    write_lock: asyncio.Lock,
+    concurrency: int = 64,
+    queue_size: int = 100,
+    unchanged_fn: Callable[[ProductRef], None] | None = None,
+    retry_rounds: int = 0,
+    retry_at: Callable[[], float] | None = None,
+) -> StoreStats:
+    # Same outcomes as Pipeline: NotModified pages go to unchanged_fn, pages that fail to
+    # download are fetched again after the listing is done (retry_rounds times, not before
+    # retry_at()) and only failures in the last round count as errors
+    import aiohttp
+
+    stats = StoreStats(store=job.store)
+    loop = asyncio.get_running_loop()
+    refs: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    stopped = threading.Event()
+    retry: list[ProductRef] | None = [] if retry_rounds > 0 else None
+
+    def list_products() -> None:
+        # Runs in a thread (listing pages are fetched with the blocking client) and hands
+        # refs over as they are listed; the bounded queue keeps it close to the fetchers
+        try:
+            for ref in job.iter_products():
+                stats.products += 1
+                put = asyncio.run_coroutine_threadsafe(refs.put(ref), loop)
+                while True:
+                    try:
+                        put.result(timeout=0.5)
+                        break
+                    except concurrent.futures.TimeoutError:
+                        if stopped.is_set():
+                            put.cancel()
+                            return
+        except Exception as e:
+            stats.errors += 1
+            CRAWL_ERRORS.inc(store=job.store, stage="list")
+            print(f"[{job.store}] ERROR listing stopped err={e}")
+
+    # In-flight limits per host live in AsyncHttpClient; `concurrency` only bounds how
+    # many products are being worked on at once
+    async def worker() -> None:
+        while True:
+            p = await refs.get()
+            try:
+                await one(p)
+            finally:
+                refs.task_done()
+
+    async def one(p: ProductRef) -> None:
+        try:
+            offer = await job.afetch_offer(p)
+        except NotModified:
+            # Page identical to the last crawl: nothing to parse or write
+            stats.fetched += 1
+            stats.unchanged += 1
+            CRAWL_PAGES.inc(store=job.store, outcome="unchanged")
+            if unchanged_fn is not None:
+                async with write_lock:
+                    await asyncio.to_thread(unchanged_fn, p)
+            return
+        except (aiohttp.ClientError, asyncio.TimeoutError, requests.RequestException) as e:
+            if retry is not None:
+                retry.append(p)
+                stats.retried += 1
+                print(f"[{job.store}] RETRY later url={p.url} err={e}")
+                return
+            stats.errors += 1
+            CRAWL_ERRORS.inc(store=job.store, stage="fetch")
+            print(f"[{job.store}] ERROR url={p.url} err={e}")
+            return
+        except Exception as e:
+            # afetch_offer parses too; one bad page doesn't stop the store
+            stats.errors += 1
+            CRAWL_ERRORS.inc(store=job.store, stage="parse")
+            print(f"[{job.store}] ERROR parse url={p.url} err={e!r}")
+            return
+
+        stats.fetched += 1
+        CRAWL_PAGES.inc(store=job.store, outcome="fetched")
+        # A writer error is not the page's fault: it ends the worker and the crawl
+        async with write_lock:
+            await asyncio.to_thread(upsert_fn, offer)
+        print(f"[{job.store}] price={offer.price_gel} isbn={offer.isbn} stock={offer.in_stock} url={p.url}")
+
+    async def drain() -> None:
+        nonlocal retry
+        await lister
+        await refs.join()
+        for round_no in range(1, retry_rounds + 1):
+            pending, retry = retry, [] if round_no < retry_rounds else None
+            if not pending:
+                break
+            wait = retry_at() - time.monotonic() if retry_at is not None else 0.0
+            print(f"[{job.store}] retry products={len(pending)} wait={max(wait, 0.0):.1f}s")
+            if wait > 0:
+                await asyncio.sleep(wait)
+            for p in pending:
+                await refs.put(p)
+            await refs.join()
+
+    lister = asyncio.ensure_future(asyncio.to_thread(list_products))
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, concurrency))]
+    finished = asyncio.ensure_future(drain())
+    try:
+        # Workers only end by raising, so this returns when everything is written or on
+        # the first writer failure
+        await asyncio.wait([finished, *workers], return_when=asyncio.FIRST_COMPLETED)
+        for w in workers:
+            if w.done() and not w.cancelled() and w.exception() is not None:
+                raise w.exception()
+        await finished
+    finally:
+        stopped.set()
+        finished.cancel()
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(finished, *workers, return_exceptions=True)
+
+    stats.finished = time.monotonic()
+    return stats
+
+
+async def run_async(jobs: list[StoreJob], upsert_fn: Callable[[Offer], None], concurrency: int = 64,
+                    unchanged_fn: Callable[[ProductRef], None] | None = None, retry_rounds: int = 0,
+                    retry_at: Callable[[], float] | None = None) -> list[StoreStats]:
+    write_lock = asyncio.Lock()
+    started = time.monotonic()
+
+    results = await asyncio.gather(*(
+        scrape_store_async(job, upsert_fn, write_lock, concurrency, unchanged_fn=unchanged_fn,
+                           retry_rounds=retry_rounds, retry_at=retry_at)
+        for job in jobs
+    ))
+
+    for stats in results:
+        print(stats.summary())
+    print(f"[crawl] stores={len(results)} wall={time.monotonic() - started:.1f}s")
+    return list(results)
@@ -0,0 +1,38 @@
+import os
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+
+load_dotenv(os.path.join(os.path.dirname(__file__), "../../.env"))
+
+from book_prices.storage import open_store
+from book_prices.storage.common import add_months, month_start
+
+# Months kept at full detail, then thinned to one offer per product and day
+COMPACT_AFTER_MONTHS = int(os.getenv("OFFERS_COMPACT_AFTER_MONTHS", "3"))
+# Partitions older than this are dropped; offer_history and latest_offers keep their data
+RETENTION_MONTHS = int(os.getenv("OFFERS_RETENTION_MONTHS", "24"))
+
+def main():
+    db = open_store()
+    db.init_schema()
+
+    created = db.ensure_offer_partitions()
+    print(f"[partitions] created={created}")
+
+    this_month = month_start(datetime.now(timezone.utc))
+    compact_before = add_months(this_month, -COMPACT_AFTER_MONTHS)
+    drop_before = add_months(this_month, -RETENTION_MONTHS)
+    compacted = db.compacted_offer_partitions()
+
+    for name, month in db.list_offer_partitions():
+        if month < drop_before:
+            db.drop_offer_partition(name)
+            print(f"[drop] {name}")
+        elif month < compact_before and name not in compacted:
+            n = db.compact_offer_partition(name)
+            print(f"[compact] {name} rows_deleted={n}")
+
+    db.close()
+
+if __name__ == "__main__":
+    main()
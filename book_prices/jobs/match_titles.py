@@ -0,0 +1,60 @@
+import os
+import time
+from collections import Counter
+from dotenv import load_dotenv
+
+load_dotenv(os.path.join(os.path.dirname(__file__), "../../.env"))
+
+from book_prices.core.matching import BookTitle, TitleIndex, trigrams
+from book_prices.storage import open_store
+
+# Links store products that have no ISBN to books by title (book_prices.core.matching).
+# Runs after each crawl and only looks at:
+#   - products title matching hasn't seen yet (new, or their title changed), and
+#   - already checked, still unlinked products that share a block with a book created
+#     since the last run (one of those could be their match now)
+# Run with MATCH_FULL=1 to re-check every unlinked product.
+MATCH_FULL = os.getenv("MATCH_FULL", "0") == "1"
+# meta key: highest books.id the previous run had in its index
+BOOKS_SEEN_KEY = "match_books_seen"
+
+def main():
+    started = time.monotonic()
+    db = open_store()
+
+    seen = 0 if MATCH_FULL else db.get_meta(BOOKS_SEEN_KEY)
+    books = [BookTitle(book_id, t, frozenset(stores)) for book_id, t, stores in db.load_match_books()]
+    index = TitleIndex(books)
+    new_books = TitleIndex([b for b in books if b.book_id > seen]) if seen else index
+
+    todo = db.load_unmatched_products()
+    recheck = db.load_unmatched_products(checked=True) if len(new_books) else []
+    if new_books is not index:
+        # Cheap blocking against the new books only; the full match happens below
+        recheck = [p for p in recheck if new_books.candidates(trigrams(p[2]))]
+    todo += recheck
+
+    matches = []
+    statuses = Counter()
+    for sp_id, store, t in todo:
+        r = index.match(t, store)
+        statuses[r.status] += 1
+        if r.book_id is not None:
+            matches.append((sp_id, r.book_id, r.score))
+
+    linked = db.save_matches(matches, [p[0] for p in todo])
+    if books:
+        db.set_meta(BOOKS_SEEN_KEY, max(b.book_id for b in books))
+    if linked:
+        # New rows in /api/books: rebuild it and tell API response caches to drop what they hold
+        print(f"[compared-books] {db.refresh_compared_books()}")
+        print(f"[data-version] {db.bump_data_version()}")
+
+    parts = [f"books={len(index)}", f"new_books={len(new_books) if seen else len(index)}",
+             f"products={len(todo)}", f"rechecked={len(recheck)}", f"linked={linked}"]
+    parts += [f"{k}={v}" for k, v in sorted(statuses.items())]
+    print(f"[match] {' '.join(parts)} elapsed={time.monotonic() - started:.1f}s")
+    db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+import os
+import time
+from dotenv import load_dotenv
+
+load_dotenv(os.path.join(os.path.dirname(__file__), "../../.env"))
+
+from book_prices.storage import backend, open_store
+
+# Creates/upgrades the schema (tables, partitions, search indexes, backfills). The API
+# no longer does this on startup, so run it on deploy, before workers restart:
+#   python -m book_prices.jobs.migrate
+# Every step is idempotent; crawls run it too.
+
+def main():
+    started = time.monotonic()
+    db = open_store()
+    db.init_schema()
+    print(
+        f"[migrate] backend={backend()} data_version={db.get_data_version()} "
+        f"partitions={len(db.list_offer_partitions())} elapsed={time.monotonic() - started:.1f}s"
+    )
+    db.close()
+
+if __name__ == "__main__":
+    main()
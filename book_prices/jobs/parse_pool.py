@@ -0,0 +1,95 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+from book_prices.adapters.config import StoreConfig
+from book_prices.adapters.registry import build_adapter
+from book_prices.core import metrics
+from book_prices.core.models import ProductRef, Offer
+
+# Store configs handed to each worker process when it starts (parsing needs no HttpClient)
+_configs: dict[str, StoreConfig] = {}
+# One adapter per store, built lazily inside each worker process
+_adapters = {}
+
+
+def init_worker(configs: list[StoreConfig]) -> None:
+    _configs.update((c.store, c) for c in configs)
+
+
+def parse_page(store: str, product: ProductRef, html: bytes) -> tuple[Offer, int, float, dict]:
+    # Runs in the worker: raw bytes in, a small Offer plus timing out. The adapter's
+    # parse/extract timings are handed back too, they only count in the crawl process.
+    adapter = _adapters.get(store)
+    if adapter is None:
+        adapter = _adapters[store] = build_adapter(_configs[store], http=None)
+
+    started = time.process_time()
+    offer = adapter.parse_offer(product, html)
+    return offer, os.getpid(), time.process_time() - started, metrics.REGISTRY.export(reset=True)
+
+
+@dataclass
+class WorkerStats:
+    pid: int
+    pages: int = 0
+    cpu: float = 0.0
+    bytes_in: int = 0
+
+    def summary(self) -> str:
+        rate = self.pages / self.cpu if self.cpu > 0 else 0.0
+        return (
+            f"[parse-worker pid={self.pid}] pages={self.pages} cpu={self.cpu:.2f}s "
+            f"pages/cpu-sec={rate:.1f} kib_in={self.bytes_in // 1024}"
+        )
+
+
+class ParsePool:
+    # Extraction is CPU-bound and holds the GIL, so it runs in worker processes.
+    # parse() blocks the calling thread until its page is done, which lets the
+    # pipeline's parse threads feed the pool without any other changes.
+    def __init__(self, stores: list[StoreConfig], workers: int | None = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.stores = {c.store for c in stores}
+        # spawn, not fork: the crawler already has threads (and sockets) running
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(list(stores),),
+        )
+        self.per_worker: dict[int, WorkerStats] = {}
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+
+    def parse(self, store: str, product: ProductRef, html: bytes) -> Offer:
+        offer, pid, cpu, worker_metrics = self.executor.submit(parse_page, store, product, html).result()
+        metrics.REGISTRY.merge(worker_metrics)
+        with self.lock:
+            stats = self.per_worker.setdefault(pid, WorkerStats(pid=pid))
+            stats.pages += 1
+            stats.cpu += cpu
+            stats.bytes_in += len(html)
+        return offer
+
+    def parser_for(self, store: str):
+        # Drop-in replacement for adapter.parse_offer in a StoreJob
+        if store not in self.stores:
+            raise KeyError(f"no process parser registered for store {store!r}")
+        return lambda product, html: self.parse(store, product, html)
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
+
+    def summary(self) -> list[str]:
+        lines = [s.summary() for s in sorted(self.per_worker.values(), key=lambda s: s.pid)]
+        pages = sum(s.pages for s in self.per_worker.values())
+        wall = time.monotonic() - self.started
+        lines.append(
+            f"[parse-pool] workers={self.workers} pages={pages} wall={wall:.1f}s "
+            f"pages/sec={pages / wall if wall > 0 else 0.0:.1f}"
+        )
+        return lines
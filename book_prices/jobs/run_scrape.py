@@ -1,65 +1,227 @@
-import time
-import requests
+import asyncio
 import os
+from urllib.parse import urlsplit
 from dotenv import load_dotenv
 
 # Load database credentials from .env file
 # We look one level up since the script is in book_prices/jobs/
 load_dotenv(os.path.join(os.path.dirname(__file__), "../../.env"))
 
-from book_prices.core.http import HttpClient
-from book_prices.adapters.biblusi import BiblusiAdapter
-from book_prices.adapters.parnasi import ParnasiAdapter
-from book_prices.storage.postgres import PostgresStore
+from book_prices.core.http import AdaptiveController, HttpClient, AsyncHttpClient
+from book_prices.core.httpcache import HttpCache
+from book_prices.core.metrics import REGISTRY
+from book_prices.core.ratelimit import HostRateLimiter
+from book_prices.adapters.config import load_stores
+from book_prices.adapters.registry import build_adapter
+from book_prices.storage import open_store
+from book_prices.jobs.engine import StoreJob, BufferedWriter, Pipeline, run_async
+from book_prices.jobs.parse_pool import ParsePool
+from book_prices.jobs.scheduler import CrawlScheduler
 
-SLEEP_SECONDS = 0.25
+# Stores come from book_prices.adapters.config: the built-in ones plus STORES_CONFIG,
+# narrowed down with STORES=a,b. Every store is crawled at the same time.
+# Per-host politeness: requests/sec and fetch workers per store (a store's config can
+# set its own rate and workers)
+RATE_PER_HOST = float(os.getenv("SCRAPE_RATE_PER_HOST", "4"))
+WORKERS_PER_STORE = int(os.getenv("SCRAPE_WORKERS_PER_STORE", "4"))
+# Adaptive per-host concurrency (up to SCRAPE_WORKERS_PER_STORE) with a circuit breaker;
+# SCRAPE_ADAPTIVE=0 keeps every worker fetching regardless of how the store responds
+SCRAPE_ADAPTIVE = os.getenv("SCRAPE_ADAPTIVE", "1") == "1"
+# Responses slower than this (seconds) count as the store struggling
+SCRAPE_LATENCY_TARGET = float(os.getenv("SCRAPE_LATENCY_TARGET", "5"))
+# Seconds a tripped host is left alone before one probe request
+SCRAPE_BREAKER_OPEN_FOR = float(os.getenv("SCRAPE_BREAKER_OPEN_FOR", "60"))
+# In-request retries of 429/5xx/connection errors, then end-of-run passes over what failed
+HTTP_RETRIES = int(os.getenv("SCRAPE_HTTP_RETRIES", "2"))
+RETRY_ROUNDS = int(os.getenv("SCRAPE_RETRY_ROUNDS", "1"))
+# Threads turning fetched pages into offers, shared by all stores
+PARSE_WORKERS = int(os.getenv("SCRAPE_PARSE_WORKERS", "2"))
+# Worker processes doing the actual extraction (0 = parse on the threads above). Off by
+# default: a product page parses in a few ms and arrives at a few per second per host,
+# and on a shared host os.cpu_count() is the machine's cores, not our quota.
+PARSE_PROCESSES = int(os.getenv("SCRAPE_PARSE_PROCESSES", "0"))
+# Bound on items waiting between pipeline stages
+PIPELINE_QUEUE_SIZE = int(os.getenv("SCRAPE_QUEUE_SIZE", "100"))
+# SCRAPE_ASYNC=1 fetches product pages as coroutines through AsyncHttpClient, with the
+# same rate limits, controller, HTTP cache and retry rounds (parsing stays on threads)
+SCRAPE_ASYNC = os.getenv("SCRAPE_ASYNC", "0") == "1"
+ASYNC_PER_HOST = int(os.getenv("SCRAPE_ASYNC_PER_HOST", "16"))
+# Where to leave the crawl's metrics in Prometheus text format, e.g. for node_exporter's
+# textfile collector (the crawl is too short-lived to be scraped)
+METRICS_PATH = os.getenv("SCRAPE_METRICS_PATH")
+# Conditional-GET validators for product pages; set HTTP_CACHE_PATH= (empty) to disable
+HTTP_CACHE_PATH = os.getenv("HTTP_CACHE_PATH", "http_cache.sqlite3")
+HTTP_CACHE_MAX_ENTRIES = int(os.getenv("HTTP_CACHE_MAX_ENTRIES", "100000"))
+# Offers per DB transaction
+WRITE_BATCH_SIZE = int(os.getenv("SCRAPE_WRITE_BATCH_SIZE", "200"))
+# Listing pages read per store to discover new products (0 = until the listing runs out);
+# known products are refreshed from crawl_state whether or not they show up on these pages
+LISTING_PAGES = int(os.getenv("SCRAPE_LISTING_PAGES", "2")) or None
+# Read price/stock off the listing cards and only open product pages that are new, have
+# no ISBN on record yet or whose card changed; SCRAPE_LISTING_FAST_PATH=0 opens every due page
+LISTING_FAST_PATH = os.getenv("SCRAPE_LISTING_FAST_PATH", "1") == "1"
+# Product pages fetched per store and run (0 = everything that is due)
+MAX_PRODUCTS_PER_STORE = int(os.getenv("SCRAPE_MAX_PRODUCTS_PER_STORE", "0")) or None
+# Upper bound on preloaded latest offers kept in memory for change detection
+LAST_OFFER_CACHE_MAX = int(os.getenv("SCRAPE_LAST_OFFER_CACHE_MAX", "500000"))
 
-def scrape_adapter(list_products_fn, fetch_offer_fn, upsert_fn, store_name: str) -> None:
-    products = list_products_fn()
-    print(f"[{store_name}] products={len(products)}")
+def main():
+    stores = load_stores()
+    if not stores:
+        raise SystemExit("no stores to crawl (check STORES / STORES_CONFIG)")
+    workers = {c.store: c.workers or WORKERS_PER_STORE for c in stores}
 
-    for i in range(len(products)):
-        p = products[i]
-        try:
-            offer = fetch_offer_fn(p)
-            upsert_fn(offer)
-            print(
-                f"[{store_name} {i+1}/{len(products)}] "
-                f"price={offer.price_gel} isbn={offer.isbn} stock={offer.in_stock}"
-            )
-        except requests.RequestException as e:
-            url = getattr(p, "url", None)
-            print(f"[{store_name} {i+1}/{len(products)}] ERROR url={url} err={e}")
-
-        time.sleep(SLEEP_SECONDS)
+    limiter = HostRateLimiter(default_rate=RATE_PER_HOST, per_host={
+        urlsplit(c.base_url).hostname: c.rate for c in stores if c.rate is not None
+    })
+    # Validators are only saved once the page's offer is committed (writer.on_written)
+    cache = HttpCache(HTTP_CACHE_PATH, max_entries=HTTP_CACHE_MAX_ENTRIES, deferred=True) if HTTP_CACHE_PATH else None
+    controller = None
+    if SCRAPE_ADAPTIVE:
+        controller = AdaptiveController(
+            max_concurrency=max(workers.values()),
+            latency_target=SCRAPE_LATENCY_TARGET,
+            open_for=SCRAPE_BREAKER_OPEN_FOR,
+        )
+        REGISTRY.collector(controller.metrics)
+    http = HttpClient(
+        rate_limiter=limiter, pool_size=max(workers.values()) * 2, pool_hosts=len(stores), cache=cache,
+        controller=controller, retries=HTTP_RETRIES,
+    )
 
-def main():
-    http = HttpClient()
-    
-    # This will now find the DB_HOST, DB_NAME, etc. from the .env file loaded above
-    db = PostgresStore()
+    # This will now find the DB_HOST, DB_NAME, etc. (or DB_BACKEND=sqlite) from the .env file loaded above
+    db = open_store()
     db.init_schema()
 
-    biblusi = BiblusiAdapter(http)
-    parnasi = ParnasiAdapter(http)
+    adapters = {c.store: build_adapter(c, http) for c in stores}
 
-    # Biblusi
-    scrape_adapter(
-        list_products_fn=lambda: biblusi.list_products(category_id=291, start_page=1, pages=2),
-        fetch_offer_fn=biblusi.fetch_offer,
-        upsert_fn=db.upsert_offer,
-        store_name="biblusi",
-    )
+    # Only new and due products are fetched; see book_prices.jobs.scheduler
+    schedulers = {
+        c.store: CrawlScheduler.for_store(db, c.store, max_products=MAX_PRODUCTS_PER_STORE)
+        for c in stores
+    }
+
+    for c in stores:
+        db.preload_last_offers(c.store, max_entries=LAST_OFFER_CACHE_MAX)
 
-    # Parnasi
-    scrape_adapter(
-        list_products_fn=lambda: parnasi.list_products(start_page=1, pages=2),
-        fetch_offer_fn=parnasi.fetch_offer,
-        upsert_fn=db.upsert_offer,
-        store_name="parnasi",
+    writer = BufferedWriter(
+        lambda batch: db.upsert_offers(batch, batch_size=WRITE_BATCH_SIZE),
+        batch_size=WRITE_BATCH_SIZE,
+        mark_unchanged=lambda refs: _mark_unchanged(db, refs),
+        on_written=cache.commit if cache is not None else None,
     )
+    jobs = [
+        _store_job(c, adapters[c.store], schedulers[c.store], writer.unchanged, workers[c.store])
+        for c in stores
+    ]
 
+    # All stores are crawled at the same time; each host has its own rate limit and fetch
+    # threads, the parse workers and the writer are shared
+    parse_pool = None
+    try:
+        # Pages go to worker processes as bytes and come back as Offers, so parsing
+        # isn't capped at one core by the GIL
+        parse_workers = PARSE_WORKERS
+        if PARSE_PROCESSES > 0 and not SCRAPE_ASYNC:
+            parse_pool = ParsePool(stores, PARSE_PROCESSES)
+            for job in jobs:
+                job.parse_offer = parse_pool.parser_for(job.store)
+            # Each parse thread waits on one page; two per process keeps every process busy
+            parse_workers = max(PARSE_WORKERS, parse_pool.workers * 2)
+
+        if SCRAPE_ASYNC:
+            asyncio.run(_main_async(jobs, [adapters[job.store] for job in jobs], writer, limiter, controller, cache))
+        else:
+            Pipeline(
+                jobs,
+                writer,
+                workers_per_store=WORKERS_PER_STORE,
+                parse_workers=parse_workers,
+                queue_size=PIPELINE_QUEUE_SIZE,
+                retry_rounds=RETRY_ROUNDS,
+                retry_at=controller.retry_at if controller is not None else None,
+            ).run()
+    finally:
+        if parse_pool is not None:
+            parse_pool.close()
+            for line in parse_pool.summary():
+                print(line)
+        # A failed write is re-raised only after the summaries and metrics below, which
+        # are what a failed run needs most
+        write_error = None
+        try:
+            writer.close()
+        except BaseException as e:
+            write_error = e
+            print(f"[stage write] ERROR err={e!r}")
+        print(writer.summary())
+        for scheduler in schedulers.values():
+            print(scheduler.summary())
+        if controller is not None:
+            for line in controller.summary():
+                print(line)
+        print(f"[last-offer-cache] {db.last_offers.stats()}")
+        for line in REGISTRY.summary():
+            print(line)
+        if METRICS_PATH:
+            _write_metrics(METRICS_PATH)
+        if write_error is not None:
+            raise write_error
+
+    # Everything is committed: rebuild /api/books and tell API response caches to drop what they hold
+    print(f"[compared-books] {db.refresh_compared_books()}")
+    print(f"[data-version] {db.bump_data_version()}")
+
+    if cache is not None:
+        print(f"[http-cache] {cache.stats()}")
+        cache.close()
     db.close()
 
+def _store_job(config, adapter, scheduler, on_unchanged, workers):
+    # Listings are streamed: product pages are fetched while later listing pages load.
+    # With the fast path, products the listing shows as unchanged go straight to
+    # on_unchanged (the writer).
+    max_pages = LISTING_PAGES if config.listing_pages is None else config.listing_pages or None
+    list_listing = adapter.list_offers if LISTING_FAST_PATH else adapter.iter_products
+    return StoreJob(
+        store=config.store,
+        iter_products=lambda: scheduler.iter_plan(
+            list_listing(start_page=1, max_pages=max_pages), on_unchanged=on_unchanged if LISTING_FAST_PATH else None
+        ),
+        fetch_page=adapter.fetch_page,
+        parse_offer=adapter.parse_offer,
+        workers=workers,
+    )
+
+def _write_metrics(path):
+    # Written next to the target and renamed, so a collector never reads half a file
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(REGISTRY.render())
+    os.replace(tmp, path)
+
+def _mark_unchanged(db, refs):
+    by_store = {}
+    for ref in refs:
+        by_store.setdefault(ref.store, []).append(ref.store_product_id)
+    for store, ids in by_store.items():
+        db.mark_fetched(store, ids)
+
+async def _main_async(jobs, adapters, writer, limiter, controller, cache):
+    # Same per-host rate limits, adaptive controller and validator cache as the listing's
+    # HttpClient
+    async with AsyncHttpClient(
+        per_host_limit=ASYNC_PER_HOST, rate_limiter=limiter, controller=controller, cache=cache, retries=HTTP_RETRIES,
+    ) as ahttp:
+        for job, adapter in zip(jobs, adapters):
+            job.afetch_offer = lambda p, a=adapter: a.afetch_offer(p, ahttp)
+        await run_async(
+            jobs,
+            upsert_fn=writer.add,
+            unchanged_fn=writer.unchanged,
+            retry_rounds=RETRY_ROUNDS,
+            retry_at=controller.retry_at if controller is not None else None,
+        )
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
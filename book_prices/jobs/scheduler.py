@@ -0,0 +1,170 @@
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Iterable, Iterator, Optional, Union
+
+from book_prices.core.models import Offer, ProductRef
+from book_prices.storage.history import to_cents
+
+# Refresh policy: a product that keeps coming back unchanged is revisited less and less
+# often (doubling per unchanged fetch), bounded by MIN/MAX. Tunable from the environment.
+MIN_INTERVAL = timedelta(hours=float(os.getenv("SCRAPE_MIN_REFRESH_HOURS", "6")))
+MAX_INTERVAL = timedelta(hours=float(os.getenv("SCRAPE_MAX_REFRESH_HOURS", str(14 * 24))))
+
+
+@dataclass
+class CrawlState:
+    store_product_id: str
+    url: str
+    last_fetched_at: Optional[datetime]
+    last_changed_at: Optional[datetime]
+    fetch_count: int
+    change_count: int
+    unchanged_streak: int
+    in_stock: Optional[bool]
+    # Latest stored price, and whether the product's page gave us its ISBN
+    price_gel: Optional[float] = None
+    isbn_known: bool = False
+
+    @property
+    def volatility(self) -> float:
+        # Share of fetches that saw a price/stock change, smoothed for new products
+        return (self.change_count + 1) / (self.fetch_count + 2)
+
+
+def refresh_interval(state: CrawlState) -> timedelta:
+    interval = MIN_INTERVAL * (2 ** min(state.unchanged_streak, 16))
+    if state.volatility >= 0.5:
+        interval /= 2
+    if state.in_stock is False:
+        # Out-of-stock items rarely matter for comparisons
+        interval *= 2
+    return max(MIN_INTERVAL, min(interval, MAX_INTERVAL))
+
+
+def due_at(state: CrawlState) -> Optional[datetime]:
+    # None = never fetched, due right away
+    if state.last_fetched_at is None:
+        return None
+    return state.last_fetched_at + refresh_interval(state)
+
+
+def listing_changed(state: CrawlState, offer: Offer) -> bool:
+    # Whether a listing card disagrees with what we stored; a card without a price or
+    # a product we have no price for can't be trusted to be unchanged
+    if offer.price_gel is None or state.price_gel is None:
+        return True
+    if to_cents(offer.price_gel) != to_cents(state.price_gel):
+        return True
+    if offer.in_stock is None:
+        # A card that says nothing about stock can't confirm a sold-out product still is
+        return state.in_stock is False
+    return offer.in_stock != state.in_stock
+
+
+def priority(state: CrawlState, now: datetime) -> float:
+    due = due_at(state)
+    if due is None:
+        return float("inf")
+    overdue = (now - due) / refresh_interval(state)
+    return overdue + state.volatility + (1.0 if state.in_stock else 0.0)
+
+
+class CrawlScheduler:
+    def __init__(self, store: str, states: Iterable[CrawlState], max_products: Optional[int] = None,
+                 now: Optional[datetime] = None):
+        self.store = store
+        self.states = {s.store_product_id: s for s in states}
+        self.max_products = max_products
+        self.now = now or datetime.now(timezone.utc)
+        self.stats = {
+            "listed": 0, "new": 0, "due": 0, "skipped": 0, "planned": 0,
+            "listing_changed": 0, "listing_unchanged": 0, "listing_no_card": 0,
+        }
+
+    @classmethod
+    def for_store(cls, db, store: str, max_products: Optional[int] = None) -> "CrawlScheduler":
+        return cls(store, (CrawlState(**row) for row in db.load_crawl_state(store)), max_products)
+
+    def is_due(self, state: CrawlState) -> bool:
+        due = due_at(state)
+        return due is None or due <= self.now
+
+    def iter_plan(self, refs: Iterable[Union[ProductRef, Offer]],
+                  on_unchanged: Optional[Callable[[ProductRef], None]] = None) -> Iterator[ProductRef]:
+        # Streams the plan: new and due products are yielded as the listing produces them,
+        # then the remaining due known products by priority, all within the budget.
+        # Known products are refreshed even when they weren't on the listing pages crawled.
+        # Listing offers (adapter.list_offers) settle products whose ISBN we already have
+        # from the card alone: a different price or stock is fetched whether due or not,
+        # an identical one goes to on_unchanged and counts as refreshed. Plain refs in a
+        # fast path plan (one with on_unchanged: a page whose cards didn't parse) are planned
+        # like any listed ref and counted in listing_no_card.
+        emitted: set[str] = set()
+        listed: set[str] = set()
+        refreshed: set[str] = set()
+        new = due = changed = no_card = 0
+
+        def budget_left() -> bool:
+            return self.max_products is None or len(emitted) < self.max_products
+
+        for item in refs:
+            if not budget_left():
+                break
+            ref = item if isinstance(item, ProductRef) else ProductRef(
+                store=item.store, url=item.url, store_product_id=item.store_product_id
+            )
+            key = str(ref.store_product_id)
+            if key in listed:
+                continue
+            listed.add(key)
+            if on_unchanged is not None and not isinstance(item, Offer):
+                no_card += 1
+            state = self.states.get(key)
+            if state is None:
+                new += 1
+            elif isinstance(item, Offer) and state.isbn_known:
+                if not listing_changed(state, item):
+                    refreshed.add(key)
+                    if on_unchanged is not None:
+                        on_unchanged(ref)
+                    continue
+                changed += 1
+            elif self.is_due(state):
+                due += 1
+            else:
+                continue
+            emitted.add(key)
+            yield ref
+
+        remaining = sorted(
+            (
+                s for s in self.states.values()
+                if s.store_product_id not in emitted and s.store_product_id not in refreshed and self.is_due(s)
+            ),
+            key=lambda s: priority(s, self.now),
+            reverse=True,
+        )
+        for state in remaining:
+            if not budget_left():
+                break
+            due += 1
+            emitted.add(state.store_product_id)
+            yield ProductRef(store=self.store, url=state.url, store_product_id=state.store_product_id)
+
+        self.stats.update(
+            listed=len(listed),
+            new=new,
+            due=due,
+            skipped=len(self.states) - due - changed - len(refreshed),
+            planned=len(emitted),
+            listing_changed=changed,
+            listing_unchanged=len(refreshed),
+            listing_no_card=no_card,
+        )
+
+    def plan(self, listed: Iterable[ProductRef]) -> list[ProductRef]:
+        return list(self.iter_plan(listed))
+
+    def summary(self) -> str:
+        return f"[{self.store}] schedule " + " ".join(f"{k}={v}" for k, v in self.stats.items())
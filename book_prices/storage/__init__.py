@@ -0,0 +1,52 @@
+import os
+import threading
+
+# DB_BACKEND picks the storage for the API and every job:
+#   postgres (default) - DB_HOST / DB_NAME / DB_USER / DB_PASS / DB_PORT
+#   sqlite             - one local file at SQLITE_PATH, for single-host installs
+# Backends are imported lazily so each install only needs its own driver.
+
+
+def backend() -> str:
+    return os.getenv("DB_BACKEND", "postgres").strip().lower()
+
+
+def open_store():
+    if backend() == "sqlite":
+        from .sqlite import DEFAULT_PATH, SqliteStore
+        return SqliteStore(os.getenv("SQLITE_PATH", DEFAULT_PATH))
+    from .postgres import PostgresStore
+    return PostgresStore()
+
+
+def open_pool():
+    if backend() == "sqlite":
+        from .sqlite import SqlitePool
+        return SqlitePool.from_env()
+    from .postgres import PostgresPool
+    return PostgresPool.from_env()
+
+
+class LazyPool:
+    # Opens the real pool on the first session(), so creating the API costs no
+    # connection; each worker connects when it serves its first request
+    def __init__(self, factory=open_pool):
+        self._factory = factory
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = self._factory()
+        return self._pool
+
+    def session(self):
+        return self.pool.session()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
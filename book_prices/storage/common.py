@@ -0,0 +1,136 @@
+import functools
+import inspect
+import os
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from ..core.metrics import DB_ERRORS, DB_SECONDS
+from ..core.parsing import normalize_isbn13
+
+# Helpers shared by the storage backends (postgres.py, sqlite.py)
+
+
+def title_norm(s: Optional[str]) -> Optional[str]:
+    if not s:
+        return None
+    t = s.strip().lower()
+    t = t.replace("ё", "е")
+    t = re.sub(r"[\"'`“”„’]", "", t)
+    t = re.sub(r"[\(\)\[\]\{\}]", " ", t)
+    t = re.sub(r"[^0-9a-zA-Z\u10A0-\u10FF\u0400-\u04FF\s]+", " ", t)
+    t = re.sub(r"\s+", " ", t).strip()
+    return t or None
+
+
+def offer_changed(last_price, last_in_stock, offer) -> bool:
+    return (str(last_price) != str(offer.price_gel)) or (last_in_stock != offer.in_stock)
+
+
+# Partitions created ahead of time so inserts never hit a missing month
+OFFERS_MONTHS_AHEAD = int(os.getenv("OFFERS_PARTITIONS_AHEAD", "2"))
+OFFER_PARTITION_RE = re.compile(r"^offers_y(\d{4})m(\d{2})$")
+
+
+def month_start(d: datetime) -> datetime:
+    d = d.astimezone(timezone.utc) if d.tzinfo else d.replace(tzinfo=timezone.utc)
+    return datetime(d.year, d.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(d: datetime, n: int) -> datetime:
+    y, m = divmod(d.month - 1 + n, 12)
+    return d.replace(year=d.year + y, month=m + 1)
+
+
+def offer_partition_name(month: datetime) -> str:
+    return f"offers_y{month.year:04d}m{month.month:02d}"
+
+
+def compared_row(isbn13: str, title: Optional[str], store_count: int, prices: dict, stores: List[str]) -> dict:
+    # One /api/books row: a price column per known store (None where it doesn't sell the
+    # book), plus the keyset the next page starts after
+    row = {"title": title, "isbn": isbn13}
+    for store in stores:
+        price = prices.get(store)
+        row[store] = float(price) if price is not None else None
+    row["store_count"] = int(store_count)
+    return row
+
+
+def compared_key(row: dict) -> Tuple[int, str, str]:
+    # Sort position of a compared_row: most stores first, then title, then ISBN
+    return (-row["store_count"], row["title"] or "", row["isbn"])
+
+
+# What /search looks up by ISBN: a 978/979 prefix, or 10 to 13 characters (an ISBN-10 or
+# most of an ISBN-13). Shorter numbers ("1984", "2666") are searched as titles.
+ISBN_PREFIX_RE = re.compile(r"^(?:97[89]\d{0,10}|\d{9}[\dX]|\d{10,13})$")
+
+
+def isbn_prefix(q: str) -> Optional[str]:
+    # isbn13 prefix for an ISBN-looking query (a whole ISBN-10 becomes its ISBN-13), or
+    # None when the query is a title
+    isbn_q = re.sub(r"[\s\-]", "", q).upper()
+    if not ISBN_PREFIX_RE.match(isbn_q):
+        return None
+    if len(isbn_q) == 10:
+        return normalize_isbn13(isbn_q) or isbn_q
+    return isbn_q
+
+# word_similarity cutoff for /search; lower is more typo tolerant but noisier
+SEARCH_SIMILARITY = float(os.getenv("SEARCH_SIMILARITY", "0.4"))
+
+
+# The `op` label of bp_db_statement_seconds: the public store method running the
+# statement, set by @db_op. Statements outside one (connection setup) count as "other".
+_current_op: ContextVar[str] = ContextVar("db_op", default="other")
+
+
+def db_op(name: str):
+    # Labels the statements a store method runs. The name is spelled out rather than taken
+    # from the function, so the metric series survive a rename.
+    def wrap(fn):
+        if inspect.isgeneratorfunction(fn):
+            # Set around each resume: an export may be iterated from several threads
+            @functools.wraps(fn)
+            def gen(*args, **kwargs):
+                it = fn(*args, **kwargs)
+                try:
+                    while True:
+                        token = _current_op.set(name)
+                        try:
+                            item = next(it)
+                        except StopIteration:
+                            return
+                        finally:
+                            _current_op.reset(token)
+                        yield item
+                finally:
+                    it.close()
+            return gen
+
+        @functools.wraps(fn)
+        def call(*args, **kwargs):
+            token = _current_op.set(name)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _current_op.reset(token)
+        return call
+    return wrap
+
+
+@contextmanager
+def timed_statement(backend: str):
+    op = _current_op.get()
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        DB_ERRORS.inc(backend=backend, op=op)
+        raise
+    finally:
+        DB_SECONDS.observe(time.perf_counter() - started, backend=backend, op=op)
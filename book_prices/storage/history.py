@@ -0,0 +1,103 @@
+import struct
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Tuple
+
+# One history point: (epoch seconds, price in tetri/cents or None, in_stock)
+Point = Tuple[int, Optional[int], Optional[bool]]
+
+# Packed form for backends without arrays (SQLite): 13 bytes per point
+PACKED_POINT = struct.Struct("<qiB")
+NO_PRICE = -1
+STOCK_CODES = {False: 0, True: 1, None: 2}
+STOCK_VALUES = {0: False, 1: True, 2: None}
+
+
+def to_cents(price_gel) -> Optional[int]:
+    return int(round(float(price_gel) * 100)) if price_gel is not None else None
+
+
+def from_cents(cents: Optional[int]) -> Optional[float]:
+    return cents / 100 if cents is not None else None
+
+
+def zip_points(epochs: List[int], cents: List[Optional[int]], stock: List[Optional[bool]]) -> List[Point]:
+    return list(zip(epochs, cents, stock))
+
+
+def pack_points(points: Iterable[Point]) -> bytes:
+    return b"".join(
+        PACKED_POINT.pack(ts, NO_PRICE if cents is None else cents, STOCK_CODES[in_stock])
+        for ts, cents, in_stock in points
+    )
+
+
+def unpack_points(blob: bytes) -> List[Point]:
+    return [
+        (ts, None if cents == NO_PRICE else cents, STOCK_VALUES[stock])
+        for ts, cents, stock in PACKED_POINT.iter_unpack(blob)
+    ]
+
+
+def raw_series(points: Iterable[Point]) -> List[dict]:
+    return [
+        {
+            "at": datetime.fromtimestamp(ts, timezone.utc).isoformat(),
+            "price": from_cents(cents),
+            "in_stock": in_stock,
+        }
+        for ts, cents, in_stock in points
+    ]
+
+
+def daily_series(points: Iterable[Point]) -> List[dict]:
+    # Points are stored only when price/stock changes, so a day opens at the price the
+    # previous day closed with; min/max include that carried-over price.
+    days: List[dict] = []
+    last_price: Optional[int] = None
+    for ts, cents, in_stock in sorted(points, key=lambda p: p[0]):
+        day = datetime.fromtimestamp(ts, timezone.utc).date().isoformat()
+        if not days or days[-1]["date"] != day:
+            seed = [last_price] if last_price is not None else []
+            days.append({"date": day, "_prices": seed, "last": None, "in_stock": None})
+        bucket = days[-1]
+        if cents is not None:
+            bucket["_prices"].append(cents)
+        bucket["last"] = cents
+        bucket["in_stock"] = in_stock
+        last_price = cents if cents is not None else last_price
+
+    out = []
+    for d in days:
+        prices = d.pop("_prices")
+        out.append(
+            {
+                "date": d["date"],
+                "min": from_cents(min(prices)) if prices else None,
+                "max": from_cents(max(prices)) if prices else None,
+                "last": from_cents(d["last"]),
+                "in_stock": d["in_stock"],
+            }
+        )
+    return out
+
+
+def build_series(rows: Iterable[Tuple[int, str, str, List[Point]]], since: Optional[datetime] = None,
+                 resolution: str = "day") -> List[dict]:
+    # rows: (store_products.id, store, url, points), several per product when history
+    # is chunked by year
+    cutoff = int(since.timestamp()) if since else None
+    series: dict = {}
+    for sp_id, store, url, points in rows:
+        s = series.setdefault(sp_id, {"store": store, "url": url, "points": []})
+        s["points"] += points
+
+    out = []
+    for s in series.values():
+        points = sorted(s.pop("points"), key=lambda p: p[0])
+        if cutoff is not None:
+            # The last change before the window becomes its starting price
+            before = [(cutoff, c, st) for ts, c, st in points if ts < cutoff]
+            points = before[-1:] + [p for p in points if p[0] >= cutoff]
+        s["points"] = daily_series(points) if resolution == "day" else raw_series(points)
+        out.append(s)
+    return out
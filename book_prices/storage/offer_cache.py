@@ -0,0 +1,60 @@
+from typing import Iterable, Optional, Tuple
+
+# (price as the string change detection compares, in_stock)
+LastOffer = Tuple[str, Optional[bool]]
+
+
+class LastOfferCache:
+    # Latest (price_gel, in_stock) per store_products.id, preloaded once per crawl.
+    # A store is "complete" when every one of its rows fit under max_entries; for
+    # complete stores a miss means "no offer yet" and needs no DB read.
+    def __init__(self, max_entries: int = 500_000):
+        self.max_entries = max_entries
+        self._data: dict[int, LastOffer] = {}
+        self.complete_stores: set[str] = set()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def load(self, store: str, rows: Iterable[tuple]) -> bool:
+        complete = True
+        for sp_id, price_gel, in_stock in rows:
+            if len(self._data) >= self.max_entries and sp_id not in self._data:
+                complete = False
+                break
+            self._data[int(sp_id)] = (str(price_gel), in_stock)
+
+        if complete:
+            self.complete_stores.add(store)
+        else:
+            self.complete_stores.discard(store)
+        return complete
+
+    def lookup(self, store: str, sp_id: int) -> Tuple[bool, Optional[LastOffer]]:
+        # Returns (known, last); known=False means the caller has to ask the DB
+        last = self._data.get(sp_id)
+        if last is not None:
+            self.hits += 1
+            return True, last
+        if store in self.complete_stores:
+            self.hits += 1
+            return True, None
+        self.misses += 1
+        return False, None
+
+    def put(self, store: str, sp_id: int, price_gel, in_stock: Optional[bool]) -> None:
+        if sp_id not in self._data and len(self._data) >= self.max_entries:
+            # Out of room: this store can no longer answer misses authoritatively
+            self.complete_stores.discard(store)
+            return
+        self._data[sp_id] = (str(price_gel), in_stock)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._data),
+            "db_reads_avoided": self.hits,
+            "db_reads": self.misses,
+            "complete_stores": sorted(self.complete_stores),
+        }
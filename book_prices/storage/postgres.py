@@ -1,40 +1,205 @@
 import os
-import re
-from typing import Optional, Tuple, List, Dict
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, Optional, Tuple, List, Dict
 
 import psycopg2
+import psycopg2.extensions
 import psycopg2.extras
+import psycopg2.pool
 
+from ..core.parsing import isbn13_to_isbn10
+from .common import (
+    isbn_prefix,
+    OFFER_PARTITION_RE,
+    OFFERS_MONTHS_AHEAD,
+    SEARCH_SIMILARITY,
+    offer_changed,
+    add_months,
+    compared_row,
+    month_start,
+    offer_partition_name,
+    db_op,
+    timed_statement,
+    title_norm,
+)
+from .history import build_series, to_cents, zip_points
+from .offer_cache import LastOfferCache
 
-def title_norm(s: Optional[str]) -> Optional[str]:
-    if not s:
-        return None
-    t = s.strip().lower()
-    t = t.replace("ё", "е")
-    t = re.sub(r"[\"'`“”„’]", "", t)
-    t = re.sub(r"[\(\)\[\]\{\}]", " ", t)
-    t = re.sub(r"[^0-9a-zA-Z\u10A0-\u10FF\u0400-\u04FF\s]+", " ", t)
-    t = re.sub(r"\s+", " ", t).strip()
-    return t or None
+
+# Store products carry their own title so products without an ISBN can be linked to a
+# book by title later (see book_prices.core.matching). An ISBN link always wins over a
+# title match; a changed title makes the product eligible for matching again and drops
+# its title link (stores reuse product ids), so the old book doesn't keep its price.
+UPSERT_STORE_PRODUCTS_SQL = """
+    INSERT INTO store_products(store, store_product_id, url, book_id, title, title_norm, match_method)
+    VALUES %s
+    ON CONFLICT (store, store_product_id) DO UPDATE SET
+      url = EXCLUDED.url,
+      book_id = CASE
+        WHEN EXCLUDED.book_id IS NOT NULL THEN EXCLUDED.book_id
+        WHEN store_products.match_method = 'title' AND EXCLUDED.book_id IS NULL
+          AND EXCLUDED.title_norm IS NOT NULL AND EXCLUDED.title_norm IS DISTINCT FROM store_products.title_norm THEN NULL
+        ELSE store_products.book_id END,
+      match_method = CASE
+        WHEN EXCLUDED.match_method IS NOT NULL THEN EXCLUDED.match_method
+        WHEN store_products.match_method = 'title' AND EXCLUDED.book_id IS NULL
+          AND EXCLUDED.title_norm IS NOT NULL AND EXCLUDED.title_norm IS DISTINCT FROM store_products.title_norm THEN NULL
+        ELSE store_products.match_method END,
+      match_score = CASE
+        WHEN EXCLUDED.book_id IS NOT NULL THEN NULL
+        WHEN store_products.match_method = 'title' AND EXCLUDED.book_id IS NULL
+          AND EXCLUDED.title_norm IS NOT NULL AND EXCLUDED.title_norm IS DISTINCT FROM store_products.title_norm THEN NULL
+        ELSE store_products.match_score END,
+      title = COALESCE(EXCLUDED.title, store_products.title),
+      title_norm = COALESCE(EXCLUDED.title_norm, store_products.title_norm),
+      match_checked_at = CASE
+        WHEN EXCLUDED.title_norm IS DISTINCT FROM store_products.title_norm AND EXCLUDED.title_norm IS NOT NULL
+        THEN NULL ELSE store_products.match_checked_at END
+    RETURNING store, store_product_id, id
+"""
+
+# Rebuilds compared_books: current price per book and store (the highest, should a store
+# list a book twice). Run with the data version bump, in the same snapshot as the store list.
+REFRESH_COMPARED_BOOKS_SQL = """
+    DELETE FROM compared_books;
+    INSERT INTO compared_books(book_id, isbn13, title, sort_title, store_count, prices)
+    SELECT b.id, b.isbn13, b.title, COALESCE(b.title, ''), COUNT(*), json_object_agg(ps.store, ps.price_gel)
+    FROM (
+      SELECT sp.book_id, sp.store, MAX(lo.price_gel) AS price_gel
+      FROM store_products sp
+      JOIN latest_offers lo ON lo.store_product_id = sp.id
+      WHERE sp.book_id IS NOT NULL
+      GROUP BY sp.book_id, sp.store
+    ) ps
+    JOIN books b ON b.id = ps.book_id
+    GROUP BY b.id;
+    DELETE FROM compared_stores;
+    INSERT INTO compared_stores(store) SELECT DISTINCT store FROM store_products;
+"""
+
+# /api/books: books sold by the most stores first, read off idx_compared_books_order.
+# {after} is the optional keyset filter, {limit} the page size (left empty for a full export).
+COMPARED_BOOKS_SQL = """
+    SELECT isbn13, title, store_count, prices
+    FROM compared_books
+    {after}
+    ORDER BY -store_count, sort_title, isbn13
+    {limit}
+"""
+
+# One row per fetched product page: (store_products.id, whether price/stock changed)
+RECORD_FETCHES_SQL = """
+    INSERT INTO crawl_state AS cs
+      (store_product_id, last_fetched_at, last_changed_at, fetch_count, change_count, unchanged_streak)
+    SELECT v.sp_id, now(), CASE WHEN v.changed THEN now() END, 1, v.changed::int, 0
+    FROM (VALUES %s) AS v(sp_id, changed)
+    ON CONFLICT (store_product_id) DO UPDATE SET
+      last_fetched_at = EXCLUDED.last_fetched_at,
+      last_changed_at = COALESCE(EXCLUDED.last_changed_at, cs.last_changed_at),
+      fetch_count = cs.fetch_count + 1,
+      change_count = cs.change_count + EXCLUDED.change_count,
+      unchanged_streak = CASE WHEN EXCLUDED.change_count > 0 THEN 0 ELSE cs.unchanged_streak + 1 END
+"""
+
+# Appends offers, extends the compact offer_history arrays and moves latest_offers forward
+# in the same statement. DISTINCT ON keeps the upsert valid when a batch holds two changes
+# for one store product.
+INSERT_OFFERS_SQL = """
+    WITH o AS (
+      INSERT INTO offers(store_product_id, price_gel, in_stock)
+      VALUES %s
+      RETURNING id, store_product_id, captured_at, price_gel, in_stock
+    ), h AS (
+      INSERT INTO offer_history AS oh (store_product_id, year, epochs, price_cents, in_stock)
+      SELECT store_product_id,
+             extract(year FROM captured_at AT TIME ZONE 'UTC')::int,
+             array_agg(extract(epoch FROM captured_at)::bigint ORDER BY id),
+             array_agg(round(price_gel * 100)::int ORDER BY id),
+             array_agg(in_stock ORDER BY id)
+      FROM o
+      GROUP BY 1, 2
+      ON CONFLICT (store_product_id, year) DO UPDATE SET
+        epochs = oh.epochs || EXCLUDED.epochs,
+        price_cents = oh.price_cents || EXCLUDED.price_cents,
+        in_stock = oh.in_stock || EXCLUDED.in_stock
+    )
+    INSERT INTO latest_offers(store_product_id, offer_id, captured_at, price_gel, in_stock)
+    SELECT DISTINCT ON (store_product_id) store_product_id, id, captured_at, price_gel, in_stock
+    FROM o
+    ORDER BY store_product_id, id DESC
+    ON CONFLICT (store_product_id) DO UPDATE SET
+      offer_id = EXCLUDED.offer_id,
+      captured_at = EXCLUDED.captured_at,
+      price_gel = EXCLUDED.price_gel,
+      in_stock = EXCLUDED.in_stock
+"""
+
+
+def _dsn() -> str:
+    # This will now find the variables loaded by load_dotenv()
+    host = os.getenv('DB_HOST')
+    dbname = os.getenv('DB_NAME')
+    user = os.getenv('DB_USER')
+    password = os.getenv('DB_PASS')
+    port = os.getenv('DB_PORT', '5432')
+    return f"host={host} dbname={dbname} user={user} password={password} port={port}"
+
+
+_timed_cursors: Dict[type, type] = {}
+
+
+def _timed_cursor_class(base: type) -> type:
+    cls = _timed_cursors.get(base)
+    if cls is None:
+        class TimedCursor(base):
+            def execute(self, query, vars=None):
+                with timed_statement("postgres"):
+                    return super().execute(query, vars)
+
+            def executemany(self, query, vars_list):
+                with timed_statement("postgres"):
+                    return super().executemany(query, vars_list)
+
+        cls = _timed_cursors[base] = TimedCursor
+    return cls
+
+
+class TimedConnection(psycopg2.extensions.connection):
+    # Every cursor, whatever its cursor_factory, times its statements into
+    # bp_db_statement_seconds labelled with the store method that ran them
+    def cursor(self, *args, **kwargs):
+        base = kwargs.get("cursor_factory") or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs["cursor_factory"] = _timed_cursor_class(base)
+        return super().cursor(*args, **kwargs)
+
+
+def connect(dsn: Optional[str] = None):
+    return psycopg2.connect(dsn or _dsn(), connection_factory=TimedConnection)
 
 
 class PostgresStore:
-    def __init__(self):
-        # This will now find the variables loaded by load_dotenv()
-        host = os.getenv('DB_HOST')
-        dbname = os.getenv('DB_NAME')
-        user = os.getenv('DB_USER')
-        password = os.getenv('DB_PASS')
-        port = os.getenv('DB_PORT', '5432')
-        
-        dsn = f"host={host} dbname={dbname} user={user} password={password} port={port}"
-        self.conn = psycopg2.connect(dsn)
+    # Whether pg_trgm is installed, looked up once per process
+    _trgm_available: Optional[bool] = None
+
+    def __init__(self, conn=None):
+        # With `conn` the store works on a borrowed (pooled) connection and doesn't own it
+        self._owns_conn = conn is None
+        self.conn = conn if conn is not None else connect()
+        # Set up by preload_last_offers() for crawls; None means always query
+        self.last_offers: Optional[LastOfferCache] = None
 
     def close(self):
-        self.conn.close()
+        if self._owns_conn:
+            self.conn.close()
 
+    @db_op("init_schema")
     def init_schema(self):
         cur = self.conn.cursor()
+        # Databases from before partitioning have a plain offers table; convert it first
+        self._migrate_offers_to_partitions(cur)
         cur.execute(
             """
             CREATE TABLE IF NOT EXISTS books (
@@ -55,21 +220,288 @@ class PostgresStore:
               UNIQUE(store, store_product_id)
             );
 
+            -- How book_id was set ('isbn' or 'title') and when title matching last looked
+            -- at the product; added after the table, so existing databases get them too
+            ALTER TABLE store_products
+              ADD COLUMN IF NOT EXISTS title TEXT,
+              ADD COLUMN IF NOT EXISTS title_norm TEXT,
+              ADD COLUMN IF NOT EXISTS match_method TEXT,
+              ADD COLUMN IF NOT EXISTS match_score REAL,
+              ADD COLUMN IF NOT EXISTS match_checked_at TIMESTAMPTZ;
+
+            -- Monthly range partitions (offers_yYYYYmMM), managed by ensure_offer_partitions()
+            -- and jobs.maintain_offers; the primary key has to include the partition key
             CREATE TABLE IF NOT EXISTS offers (
-              id BIGSERIAL PRIMARY KEY,
+              id BIGSERIAL,
               store_product_id BIGINT NOT NULL REFERENCES store_products(id),
               captured_at TIMESTAMPTZ NOT NULL DEFAULT now(),
               price_gel NUMERIC,
+              in_stock BOOLEAN,
+              PRIMARY KEY (id, captured_at)
+            ) PARTITION BY RANGE (captured_at);
+
+            -- Current offer per store product, maintained by the write path so reads
+            -- don't have to scan the offers history
+            CREATE TABLE IF NOT EXISTS latest_offers (
+              store_product_id BIGINT PRIMARY KEY REFERENCES store_products(id),
+              offer_id BIGINT NOT NULL,
+              captured_at TIMESTAMPTZ NOT NULL,
+              price_gel NUMERIC,
               in_stock BOOLEAN
             );
 
+            -- Price history as parallel arrays, one row per store product and UTC year:
+            -- a multi-year chart is a handful of (TOAST-compressed) rows. Points are
+            -- appended by the write path on every price/stock change.
+            CREATE TABLE IF NOT EXISTS offer_history (
+              store_product_id BIGINT NOT NULL REFERENCES store_products(id),
+              year INT NOT NULL,
+              epochs BIGINT[] NOT NULL,
+              price_cents INT[] NOT NULL,
+              in_stock BOOLEAN[] NOT NULL,
+              PRIMARY KEY (store_product_id, year)
+            );
+
+            -- Per-product fetch history; the incremental scheduler derives refresh
+            -- intervals from it (see book_prices.jobs.scheduler)
+            CREATE TABLE IF NOT EXISTS crawl_state (
+              store_product_id BIGINT PRIMARY KEY REFERENCES store_products(id),
+              last_fetched_at TIMESTAMPTZ NOT NULL,
+              last_changed_at TIMESTAMPTZ,
+              fetch_count INT NOT NULL DEFAULT 0,
+              change_count INT NOT NULL DEFAULT 0,
+              unchanged_streak INT NOT NULL DEFAULT 0
+            );
+
+            -- data_version is bumped by the scrape job; API response caches key on it
+            CREATE TABLE IF NOT EXISTS meta (
+              key TEXT PRIMARY KEY,
+              value BIGINT NOT NULL
+            );
+            INSERT INTO meta(key, value) VALUES ('data_version', 0) ON CONFLICT (key) DO NOTHING;
+
+            -- /api/books rows and columns as of the last data version bump, so a page is an
+            -- index range scan instead of an aggregate over every latest offer; see
+            -- refresh_compared_books()
+            CREATE TABLE IF NOT EXISTS compared_books (
+              book_id BIGINT PRIMARY KEY,
+              isbn13 TEXT NOT NULL,
+              title TEXT,
+              sort_title TEXT NOT NULL,
+              store_count INT NOT NULL,
+              prices JSON NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_compared_books_order ON compared_books((-store_count), sort_title, isbn13);
+            CREATE TABLE IF NOT EXISTS compared_stores (
+              store TEXT PRIMARY KEY
+            );
+
             CREATE INDEX IF NOT EXISTS idx_books_title_norm ON books(title_norm);
             CREATE INDEX IF NOT EXISTS idx_store_products_book_id ON store_products(book_id);
+            CREATE INDEX IF NOT EXISTS idx_store_products_unmatched ON store_products(id)
+              WHERE book_id IS NULL AND title_norm IS NOT NULL;
+            UPDATE store_products SET match_method = 'isbn' WHERE book_id IS NOT NULL AND match_method IS NULL;
             CREATE INDEX IF NOT EXISTS idx_offers_storeprod_time ON offers(store_product_id, captured_at DESC);
             """
         )
         self.conn.commit()
 
+        self.ensure_offer_partitions()
+        self._init_search(cur)
+
+        # Databases created before latest_offers existed get it filled on first start
+        cur.execute(
+            "SELECT NOT EXISTS (SELECT 1 FROM latest_offers) AND EXISTS (SELECT 1 FROM offers)"
+        )
+        if cur.fetchone()[0]:
+            self.backfill_latest_offers()
+
+        cur.execute(
+            "SELECT NOT EXISTS (SELECT 1 FROM offer_history) AND EXISTS (SELECT 1 FROM offers)"
+        )
+        if cur.fetchone()[0]:
+            self.backfill_offer_history()
+
+        cur.execute(
+            "SELECT NOT EXISTS (SELECT 1 FROM compared_stores) AND EXISTS (SELECT 1 FROM store_products)"
+        )
+        if cur.fetchone()[0]:
+            self.refresh_compared_books()
+
+    def _offers_relkind(self, cur) -> Optional[str]:
+        cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('offers')")
+        row = cur.fetchone()
+        return row[0] if row else None
+
+    def _migrate_offers_to_partitions(self, cur) -> None:
+        # 'r' = ordinary table, 'p' = already partitioned
+        if self._offers_relkind(cur) != "r":
+            return
+
+        cur.execute("SELECT pg_get_serial_sequence('offers', 'id')")
+        (seq,) = cur.fetchone()
+        cur.execute("ALTER TABLE offers RENAME TO offers_legacy")
+        if seq:
+            cur.execute(f"ALTER SEQUENCE {seq} RENAME TO offers_legacy_id_seq")
+        cur.execute("ALTER INDEX IF EXISTS offers_pkey RENAME TO offers_legacy_pkey")
+        cur.execute("ALTER INDEX IF EXISTS idx_offers_storeprod_time RENAME TO idx_offers_legacy_storeprod_time")
+        cur.execute(
+            """
+            CREATE TABLE offers (
+              id BIGSERIAL,
+              store_product_id BIGINT NOT NULL REFERENCES store_products(id),
+              captured_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+              price_gel NUMERIC,
+              in_stock BOOLEAN,
+              PRIMARY KEY (id, captured_at)
+            ) PARTITION BY RANGE (captured_at)
+            """
+        )
+
+        cur.execute("SELECT min(captured_at) FROM offers_legacy")
+        (oldest,) = cur.fetchone()
+        self._create_offer_partitions(cur, oldest or datetime.now(timezone.utc))
+
+        cur.execute(
+            """
+            INSERT INTO offers(id, store_product_id, captured_at, price_gel, in_stock)
+            SELECT id, store_product_id, captured_at, price_gel, in_stock FROM offers_legacy
+            """
+        )
+        cur.execute(
+            "SELECT setval(pg_get_serial_sequence('offers', 'id'), COALESCE((SELECT max(id) FROM offers), 0) + 1, false)"
+        )
+        cur.execute("DROP TABLE offers_legacy")
+        self.conn.commit()
+
+    def _create_offer_partitions(self, cur, start: datetime, months_ahead: int = OFFERS_MONTHS_AHEAD) -> List[str]:
+        # One partition per month from `start` through `months_ahead` months from now
+        created = []
+        cur.execute(
+            """
+            SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'offers'::regclass
+            """
+        )
+        existing = {r[0] for r in cur.fetchall()}
+        month = month_start(start)
+        last = add_months(month_start(datetime.now(timezone.utc)), months_ahead)
+        while month <= last:
+            name = offer_partition_name(month)
+            if name not in existing:
+                cur.execute(
+                    f"CREATE TABLE {name} PARTITION OF offers FOR VALUES FROM (%s) TO (%s)",
+                    (month, add_months(month, 1)),
+                )
+                created.append(name)
+            month = add_months(month, 1)
+        return created
+
+    @db_op("ensure_offer_partitions")
+    def ensure_offer_partitions(self, months_ahead: int = OFFERS_MONTHS_AHEAD) -> List[str]:
+        # Current month plus `months_ahead`; run by init_schema and the maintenance job
+        with self.conn.cursor() as cur:
+            created = self._create_offer_partitions(cur, datetime.now(timezone.utc), months_ahead)
+        self.conn.commit()
+        return created
+
+    @db_op("list_offer_partitions")
+    def list_offer_partitions(self) -> List[Tuple[str, datetime]]:
+        # (partition name, first day of its month), oldest first
+        with self.conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT c.relname
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = 'offers'::regclass
+                """
+            )
+            names = [r[0] for r in cur.fetchall()]
+        self.conn.commit()
+
+        parts = []
+        for name in names:
+            m = OFFER_PARTITION_RE.match(name)
+            if m:
+                parts.append((name, datetime(int(m.group(1)), int(m.group(2)), 1, tzinfo=timezone.utc)))
+        return sorted(parts, key=lambda p: p[1])
+
+    @db_op("compact_offer_partition")
+    def compact_offer_partition(self, name: str) -> int:
+        # Keeps the last offer per store product and day. Offers are change points
+        # already, so this only thins out products that changed several times a day;
+        # the last row of each day survives, so latest_offers.offer_id stays valid.
+        # Full detail lives on in offer_history.
+        if not OFFER_PARTITION_RE.match(name):
+            raise ValueError(f"not an offers partition: {name}")
+        with self.conn.cursor() as cur:
+            cur.execute(
+                f"""
+                DELETE FROM {name} o
+                USING (
+                  SELECT id, row_number() OVER (
+                    PARTITION BY store_product_id, (captured_at AT TIME ZONE 'UTC')::date
+                    ORDER BY captured_at DESC, id DESC
+                  ) AS rn
+                  FROM {name}
+                ) ranked
+                WHERE o.id = ranked.id AND ranked.rn > 1
+                """
+            )
+            n = cur.rowcount
+            cur.execute(
+                """
+                INSERT INTO meta(key, value) VALUES (%s, extract(epoch FROM now())::bigint)
+                ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value
+                """,
+                (f"compacted:{name}",),
+            )
+        self.conn.commit()
+        return n
+
+    @db_op("compacted_offer_partitions")
+    def compacted_offer_partitions(self) -> set:
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT key FROM meta WHERE key LIKE %s", ("compacted:%",))
+            keys = {r[0].split(":", 1)[1] for r in cur.fetchall()}
+        self.conn.commit()
+        return keys
+
+    @db_op("drop_offer_partition")
+    def drop_offer_partition(self, name: str) -> None:
+        # latest_offers and offer_history keep their own copies, so current prices and
+        # charts survive the drop
+        if not OFFER_PARTITION_RE.match(name):
+            raise ValueError(f"not an offers partition: {name}")
+        with self.conn.cursor() as cur:
+            cur.execute(f"ALTER TABLE offers DETACH PARTITION {name}")
+            cur.execute(f"DROP TABLE {name}")
+            cur.execute("DELETE FROM meta WHERE key = %s", (f"compacted:{name}",))
+        self.conn.commit()
+
+    def _init_search(self, cur) -> None:
+        # pg_trgm may not be installable on shared hosts; search then falls back to ILIKE
+        try:
+            cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            cur.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_books_title_norm_trgm ON books USING gin (title_norm gin_trgm_ops);
+                CREATE INDEX IF NOT EXISTS idx_books_isbn13_prefix ON books(isbn13 text_pattern_ops);
+                """
+            )
+            self.conn.commit()
+        except psycopg2.Error:
+            self.conn.rollback()
+        PostgresStore._trgm_available = None
+
+    def _has_trgm(self) -> bool:
+        if PostgresStore._trgm_available is None:
+            with self.conn.cursor() as cur:
+                cur.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")
+                PostgresStore._trgm_available = bool(cur.fetchone()[0])
+        return PostgresStore._trgm_available
+
     def _upsert_book(self, isbn13: str, title: Optional[str]) -> int:
         tnorm = title_norm(title)
         cur = self.conn.cursor()
@@ -86,35 +518,66 @@ class PostgresStore:
         )
         return int(cur.fetchone()[0])
 
-    def _upsert_store_product(self, store: str, store_product_id: str, url: str, book_id: Optional[int]) -> int:
+    def _upsert_store_product(self, store: str, store_product_id: str, url: str, book_id: Optional[int],
+                              title: Optional[str] = None) -> int:
         cur = self.conn.cursor()
-        cur.execute(
-            """
-            INSERT INTO store_products(store, store_product_id, url, book_id)
-            VALUES (%s, %s, %s, %s)
-            ON CONFLICT (store, store_product_id) DO UPDATE SET
-              url = EXCLUDED.url,
-              book_id = COALESCE(EXCLUDED.book_id, store_products.book_id)
-            RETURNING id
-            """,
-            (store, store_product_id, url, book_id),
+        rows = psycopg2.extras.execute_values(
+            cur,
+            UPSERT_STORE_PRODUCTS_SQL,
+            [(store, store_product_id, url, book_id, title, title_norm(title), "isbn" if book_id else None)],
+            fetch=True,
         )
-        return int(cur.fetchone()[0])
+        return int(rows[0][2])
 
     def _last_offer(self, store_product_row_id: int):
         cur = self.conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
         cur.execute(
             """
             SELECT price_gel, in_stock
-            FROM offers
+            FROM latest_offers
             WHERE store_product_id = %s
-            ORDER BY captured_at DESC, id DESC
-            LIMIT 1
             """,
             (store_product_row_id,),
         )
         return cur.fetchone()
 
+    @db_op("preload_last_offers")
+    def preload_last_offers(self, store: str, max_entries: int = 500_000) -> bool:
+        # Loads the latest (price_gel, in_stock) of every store product of `store` so change
+        # detection during the crawl doesn't need a query per product.
+        if self.last_offers is None:
+            self.last_offers = LastOfferCache(max_entries=max_entries)
+
+        with self.conn.cursor(name="preload_last_offers") as cur:
+            cur.itersize = 5000
+            cur.execute(
+                """
+                SELECT lo.store_product_id, lo.price_gel, lo.in_stock
+                FROM latest_offers lo
+                JOIN store_products sp ON sp.id = lo.store_product_id
+                WHERE sp.store = %s
+                """,
+                (store,),
+            )
+            complete = self.last_offers.load(store, cur)
+        self.conn.commit()
+        return complete
+
+    def _lookup_last_offer(self, store: str, sp_id: int):
+        # (price_gel, in_stock) of the latest offer, or None when there is none
+        if self.last_offers is not None:
+            known, last = self.last_offers.lookup(store, sp_id)
+            if known:
+                return last
+
+        row = self._last_offer(sp_id)
+        return (row["price_gel"], row["in_stock"]) if row is not None else None
+
+    def _remember_offer(self, store: str, sp_id: int, offer) -> None:
+        if self.last_offers is not None:
+            self.last_offers.put(store, sp_id, offer.price_gel, offer.in_stock)
+
+    @db_op("upsert_offer")
     def upsert_offer(self, offer) -> None:
         cur = self.conn.cursor()
         try:
@@ -123,26 +586,422 @@ class PostgresStore:
                 book_id = self._upsert_book(offer.isbn, offer.title)
 
             sp_id = self._upsert_store_product(
-                offer.store, str(offer.store_product_id), offer.url, book_id
+                offer.store, str(offer.store_product_id), offer.url, book_id, offer.title
             )
 
-            last = self._last_offer(sp_id)
+            last = self._lookup_last_offer(offer.store, sp_id)
 
             changed = True
             if last is not None:
-                changed = (str(last["price_gel"]) != str(offer.price_gel)) or (last["in_stock"] != offer.in_stock)
+                changed = offer_changed(last[0], last[1], offer)
 
             if changed:
+                psycopg2.extras.execute_values(
+                    cur, INSERT_OFFERS_SQL, [(sp_id, offer.price_gel, offer.in_stock)]
+                )
+            psycopg2.extras.execute_values(cur, RECORD_FETCHES_SQL, [(sp_id, changed)])
+
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+        if changed:
+            self._remember_offer(offer.store, sp_id, offer)
+
+    @db_op("upsert_offers")
+    def upsert_offers(self, offers: Iterable, batch_size: int = 500) -> int:
+        # Bulk variant of upsert_offer: a handful of statements and one commit per batch.
+        # Returns the number of offer rows inserted (i.e. price/stock changes).
+        inserted = 0
+        batch = []
+        for offer in offers:
+            batch.append(offer)
+            if len(batch) >= batch_size:
+                inserted += self._write_batch(batch)
+                batch = []
+        if batch:
+            inserted += self._write_batch(batch)
+        return inserted
+
+    def _write_batch(self, batch: list) -> int:
+        cur = self.conn.cursor()
+        try:
+            # Dedupe first: ON CONFLICT DO UPDATE can't touch the same row twice per statement
+            books: Dict[str, Tuple] = {}
+            for o in batch:
+                if not o.isbn:
+                    continue
+                prev = books.get(o.isbn)
+                title = o.title or (prev[1] if prev else None)
+                books[o.isbn] = (o.isbn, title, title_norm(title))
+
+            book_ids: Dict[str, int] = {}
+            if books:
+                rows = psycopg2.extras.execute_values(
+                    cur,
+                    """
+                    INSERT INTO books(isbn13, title, title_norm)
+                    VALUES %s
+                    ON CONFLICT (isbn13) DO UPDATE SET
+                      title = COALESCE(EXCLUDED.title, books.title),
+                      title_norm = COALESCE(EXCLUDED.title_norm, books.title_norm)
+                    RETURNING isbn13, id
+                    """,
+                    list(books.values()),
+                    page_size=len(books),
+                    fetch=True,
+                )
+                book_ids = {r[0]: int(r[1]) for r in rows}
+
+            products: Dict[Tuple[str, str], Tuple] = {}
+            for o in batch:
+                key = (o.store, str(o.store_product_id))
+                book_id = book_ids.get(o.isbn) if o.isbn else None
+                prev = products.get(key)
+                if book_id is None and prev is not None:
+                    book_id = prev[3]
+                title = o.title or (prev[4] if prev else None)
+                products[key] = (
+                    key[0], key[1], o.url, book_id, title, title_norm(title), "isbn" if book_id else None
+                )
+
+            rows = psycopg2.extras.execute_values(
+                cur,
+                UPSERT_STORE_PRODUCTS_SQL,
+                list(products.values()),
+                page_size=len(products),
+                fetch=True,
+            )
+            sp_ids = {(r[0], r[1]): int(r[2]) for r in rows}
+
+            # Latest offer per store product: from the preloaded cache where possible,
+            # the rest set-wise in one query
+            last = {}
+            unknown = []
+            for (store, _), sp_id in sp_ids.items():
+                if self.last_offers is not None:
+                    known, cached = self.last_offers.lookup(store, sp_id)
+                    if known:
+                        if cached is not None:
+                            last[sp_id] = cached
+                        continue
+                unknown.append(sp_id)
+
+            if unknown:
                 cur.execute(
-                    "INSERT INTO offers(store_product_id, price_gel, in_stock) VALUES (%s, %s, %s)",
-                    (sp_id, offer.price_gel, offer.in_stock),
+                    """
+                    SELECT store_product_id, price_gel, in_stock
+                    FROM latest_offers
+                    WHERE store_product_id = ANY(%s)
+                    """,
+                    (unknown,),
                 )
+                last.update({int(r[0]): (r[1], r[2]) for r in cur.fetchall()})
+
+            new_rows = []
+            written = []
+            fetched: Dict[int, bool] = {}
+            for o in batch:
+                sp_id = sp_ids[(o.store, str(o.store_product_id))]
+                prev = last.get(sp_id)
+                fetched.setdefault(sp_id, False)
+                if prev is None or offer_changed(prev[0], prev[1], o):
+                    fetched[sp_id] = True
+                    new_rows.append((sp_id, o.price_gel, o.in_stock))
+                    written.append((o.store, sp_id, o))
+                    # A later duplicate in the same batch compares against this one
+                    last[sp_id] = (o.price_gel, o.in_stock)
+
+            if new_rows:
+                psycopg2.extras.execute_values(
+                    cur,
+                    INSERT_OFFERS_SQL,
+                    new_rows,
+                    page_size=len(new_rows),
+                )
+            psycopg2.extras.execute_values(
+                cur, RECORD_FETCHES_SQL, list(fetched.items()), page_size=len(fetched)
+            )
+
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+        for store, sp_id, o in written:
+            self._remember_offer(store, sp_id, o)
+        return len(new_rows)
+
+    @db_op("mark_fetched")
+    def mark_fetched(self, store: str, store_product_ids: List[str]) -> None:
+        # Pages fetched but known unchanged (HTTP 304 / same body) still count as fetches
+        if not store_product_ids:
+            return
+        with self.conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE crawl_state cs SET
+                  last_fetched_at = now(),
+                  fetch_count = cs.fetch_count + 1,
+                  unchanged_streak = cs.unchanged_streak + 1
+                FROM store_products sp
+                WHERE sp.id = cs.store_product_id
+                  AND sp.store = %s
+                  AND sp.store_product_id = ANY(%s)
+                """,
+                (store, [str(x) for x in store_product_ids]),
+            )
+        self.conn.commit()
+
+    @db_op("load_crawl_state")
+    def load_crawl_state(self, store: str) -> List[Dict]:
+        # Every known product of a store with its fetch history (NULLs if never recorded)
+        with self.conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            cur.execute(
+                """
+                SELECT sp.store_product_id, sp.url,
+                       cs.last_fetched_at, cs.last_changed_at,
+                       COALESCE(cs.fetch_count, 0) AS fetch_count,
+                       COALESCE(cs.change_count, 0) AS change_count,
+                       COALESCE(cs.unchanged_streak, 0) AS unchanged_streak,
+                       lo.in_stock, lo.price_gel::float8 AS price_gel,
+                       COALESCE(sp.match_method = 'isbn', FALSE) AS isbn_known
+                FROM store_products sp
+                LEFT JOIN crawl_state cs ON cs.store_product_id = sp.id
+                LEFT JOIN latest_offers lo ON lo.store_product_id = sp.id
+                WHERE sp.store = %s
+                """,
+                (store,),
+            )
+            rows = [dict(r) for r in cur.fetchall()]
+        self.conn.commit()
+        return rows
+
+    @db_op("load_match_books")
+    def load_match_books(self, min_id: int = 0) -> List[Tuple[int, str, List[str]]]:
+        # (books.id, title_norm, stores already linked) of titled books with id > min_id,
+        # the reference side of title matching
+        with self.conn.cursor(name="load_match_books") as cur:
+            cur.itersize = 10000
+            cur.execute(
+                """
+                SELECT b.id, b.title_norm,
+                       COALESCE(array_agg(DISTINCT sp.store) FILTER (WHERE sp.store IS NOT NULL), '{}')
+                FROM books b
+                LEFT JOIN store_products sp ON sp.book_id = b.id
+                WHERE b.title_norm IS NOT NULL AND b.id > %s
+                GROUP BY b.id
+                """,
+                (min_id,),
+            )
+            rows = [(int(r[0]), r[1], list(r[2])) for r in cur]
+        self.conn.commit()
+        return rows
+
+    @db_op("load_unmatched_products")
+    def load_unmatched_products(self, checked: bool = False) -> List[Tuple[int, str, str]]:
+        # (store_products.id, store, title_norm) of titled products without a book: the ones
+        # title matching hasn't looked at yet, or with checked=True the ones it already has
+        with self.conn.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT id, store, title_norm
+                FROM store_products
+                WHERE book_id IS NULL AND title_norm IS NOT NULL
+                  AND match_checked_at IS {"NOT NULL" if checked else "NULL"}
+                ORDER BY id
+                """
+            )
+            rows = [(int(r[0]), r[1], r[2]) for r in cur.fetchall()]
+        self.conn.commit()
+        return rows
 
+    @db_op("save_matches")
+    def save_matches(self, matches: List[Tuple[int, int, float]], checked_ids: List[int]) -> int:
+        # matches: (store_products.id, books.id, score). Products that got a book from
+        # their ISBN in the meantime keep it. Everything in checked_ids is marked as looked at.
+        try:
+            with self.conn.cursor() as cur:
+                linked = 0
+                if matches:
+                    psycopg2.extras.execute_values(
+                        cur,
+                        """
+                        UPDATE store_products sp SET
+                          book_id = v.book_id, match_method = 'title', match_score = v.score
+                        FROM (VALUES %s) AS v(id, book_id, score)
+                        WHERE sp.id = v.id AND sp.book_id IS NULL
+                        """,
+                        matches,
+                        template="(%s::bigint, %s::bigint, %s::real)",
+                        page_size=len(matches),
+                    )
+                    linked = cur.rowcount
+                if checked_ids:
+                    cur.execute(
+                        "UPDATE store_products SET match_checked_at = now() WHERE id = ANY(%s)",
+                        (list(checked_ids),),
+                    )
             self.conn.commit()
         except Exception:
             self.conn.rollback()
             raise
+        return linked
+
+    @db_op("get_meta")
+    def get_meta(self, key: str, default: int = 0) -> int:
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT value FROM meta WHERE key = %s", (key,))
+            row = cur.fetchone()
+        self.conn.commit()
+        return int(row[0]) if row else default
+
+    @db_op("set_meta")
+    def set_meta(self, key: str, value: int) -> None:
+        with self.conn.cursor() as cur:
+            cur.execute(
+                "INSERT INTO meta(key, value) VALUES (%s, %s) ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value",
+                (key, value),
+            )
+        self.conn.commit()
+
+    @db_op("get_data_version")
+    def get_data_version(self) -> int:
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT value FROM meta WHERE key = 'data_version'")
+            row = cur.fetchone()
+        return int(row[0]) if row else 0
+
+    @db_op("bump_data_version")
+    def bump_data_version(self) -> int:
+        with self.conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO meta(key, value) VALUES ('data_version', 1)
+                ON CONFLICT (key) DO UPDATE SET value = meta.value + 1
+                RETURNING value
+                """
+            )
+            version = int(cur.fetchone()[0])
+        self.conn.commit()
+        return version
 
+    @db_op("refresh_compared_books")
+    def refresh_compared_books(self) -> int:
+        # Readers keep seeing the previous rows until the commit
+        with self.conn.cursor() as cur:
+            cur.execute(REFRESH_COMPARED_BOOKS_SQL)
+            cur.execute("SELECT COUNT(*) FROM compared_books")
+            count = int(cur.fetchone()[0])
+        self.conn.commit()
+        return count
+
+    @db_op("backfill_latest_offers")
+    def backfill_latest_offers(self) -> int:
+        # Rebuilds latest_offers from the offers history (existing databases, repairs)
+        with self.conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO latest_offers(store_product_id, offer_id, captured_at, price_gel, in_stock)
+                SELECT DISTINCT ON (store_product_id) store_product_id, id, captured_at, price_gel, in_stock
+                FROM offers
+                ORDER BY store_product_id, captured_at DESC, id DESC
+                ON CONFLICT (store_product_id) DO UPDATE SET
+                  offer_id = EXCLUDED.offer_id,
+                  captured_at = EXCLUDED.captured_at,
+                  price_gel = EXCLUDED.price_gel,
+                  in_stock = EXCLUDED.in_stock
+                """
+            )
+            n = cur.rowcount
+        self.conn.commit()
+        return n
+
+    @db_op("backfill_offer_history")
+    def backfill_offer_history(self) -> int:
+        # Fills offer_history for product-years it doesn't have yet. offers only holds the
+        # retention window (see jobs.maintain_offers), so existing rows are never rebuilt.
+        with self.conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO offer_history(store_product_id, year, epochs, price_cents, in_stock)
+                SELECT store_product_id,
+                       extract(year FROM captured_at AT TIME ZONE 'UTC')::int,
+                       array_agg(extract(epoch FROM captured_at)::bigint ORDER BY captured_at, id),
+                       array_agg(round(price_gel * 100)::int ORDER BY captured_at, id),
+                       array_agg(in_stock ORDER BY captured_at, id)
+                FROM offers
+                GROUP BY 1, 2
+                ON CONFLICT (store_product_id, year) DO NOTHING
+                """
+            )
+            n = cur.rowcount
+        self.conn.commit()
+        return n
+
+    @db_op("append_history")
+    def append_history(self, points: Iterable[Tuple[int, int, Optional[float], Optional[bool]]]) -> None:
+        # (store_products.id, epoch seconds, price_gel, in_stock) for history written
+        # outside the offers path, e.g. imports
+        rows: Dict[Tuple[int, int], Tuple[list, list, list]] = {}
+        for sp_id, epoch, price_gel, in_stock in sorted(points, key=lambda p: (p[0], p[1])):
+            year = datetime.fromtimestamp(epoch, timezone.utc).year
+            e, c, s = rows.setdefault((int(sp_id), year), ([], [], []))
+            e.append(int(epoch))
+            c.append(to_cents(price_gel))
+            s.append(in_stock)
+        if not rows:
+            return
+        with self.conn.cursor() as cur:
+            psycopg2.extras.execute_values(
+                cur,
+                """
+                INSERT INTO offer_history AS oh (store_product_id, year, epochs, price_cents, in_stock)
+                VALUES %s
+                ON CONFLICT (store_product_id, year) DO UPDATE SET
+                  epochs = oh.epochs || EXCLUDED.epochs,
+                  price_cents = oh.price_cents || EXCLUDED.price_cents,
+                  in_stock = oh.in_stock || EXCLUDED.in_stock
+                """,
+                [(sp_id, year, e, c, s) for (sp_id, year), (e, c, s) in rows.items()],
+                template="(%s, %s, %s::bigint[], %s::int[], %s::boolean[])",
+            )
+        self.conn.commit()
+
+    @db_op("get_price_history")
+    def get_price_history(self, isbn13: str, since: Optional[datetime] = None,
+                          resolution: str = "day"):
+        # Per store product series for a book, or None when the ISBN is unknown.
+        # resolution: "day" (min/max/last per UTC day) or "raw" (every stored change).
+        with self.conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            cur.execute("SELECT id, isbn13, title FROM books WHERE isbn13 = %s", (isbn13,))
+            book = cur.fetchone()
+            if not book:
+                self.conn.commit()
+                return None
+
+            cur.execute(
+                """
+                SELECT sp.id, sp.store, sp.url, oh.year, oh.epochs, oh.price_cents, oh.in_stock
+                FROM store_products sp
+                JOIN offer_history oh ON oh.store_product_id = sp.id
+                WHERE sp.book_id = %s
+                ORDER BY sp.store, sp.id, oh.year
+                """,
+                (book["id"],),
+            )
+            rows = cur.fetchall()
+        self.conn.commit()
+
+        out = build_series(
+            ((r["id"], r["store"], r["url"], zip_points(r["epochs"], r["price_cents"], r["in_stock"])) for r in rows),
+            since,
+            resolution,
+        )
+        return dict(book), out
+
+    @db_op("get_book_by_isbn")
     def get_book_by_isbn(self, isbn13: str):
         cur = self.conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
@@ -155,13 +1014,7 @@ class PostgresStore:
             """
             SELECT sp.store, sp.url, o.price_gel, o.in_stock, o.captured_at
             FROM store_products sp
-            JOIN LATERAL (
-              SELECT price_gel, in_stock, captured_at
-              FROM offers
-              WHERE store_product_id = sp.id
-              ORDER BY captured_at DESC, id DESC
-              LIMIT 1
-            ) o ON TRUE
+            JOIN latest_offers o ON o.store_product_id = sp.id
             WHERE sp.book_id = %s
             ORDER BY (o.in_stock IS NULL) ASC, o.in_stock DESC, o.price_gel ASC
             """,
@@ -170,67 +1023,207 @@ class PostgresStore:
         offers = cur.fetchall()
         return dict(book), [dict(x) for x in offers]
 
-    def search_books(self, q: str, limit: int = 20):
-        qn = title_norm(q) or ""
+    @db_op("get_books_by_isbns")
+    def get_books_by_isbns(self, isbns: List[str]) -> Dict[str, Tuple[dict, List[dict]]]:
+        # Several get_book_by_isbn in one statement, keyed by the requested ISBN-13.
+        # Books stored under their ISBN-10 (pages that only print that) are found too.
+        keys = {}
+        for isbn in isbns:
+            keys[isbn] = isbn
+            isbn10 = isbn13_to_isbn10(isbn)
+            if isbn10 is not None:
+                keys.setdefault(isbn10, isbn)
+        if not keys:
+            return {}
+
         cur = self.conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
         cur.execute(
             """
-            SELECT id, isbn13, title
+            SELECT b.id, b.isbn13, b.title, b.title_norm, b.created_at,
+                   sp.store, sp.url, o.price_gel, o.in_stock, o.captured_at
+            FROM books b
+            LEFT JOIN store_products sp ON sp.book_id = b.id
+            LEFT JOIN latest_offers o ON o.store_product_id = sp.id
+            WHERE b.isbn13 = ANY(%s)
+            ORDER BY b.id, (o.in_stock IS NULL) ASC, o.in_stock DESC, o.price_gel ASC
+            """,
+            (list(keys),),
+        )
+        found: Dict[str, Tuple[dict, List[dict]]] = {}
+        for r in cur.fetchall():
+            requested = keys[r["isbn13"]]
+            if requested not in found:
+                book = {k: r[k] for k in ("id", "isbn13", "title", "title_norm", "created_at")}
+                found[requested] = (book, [])
+            if r["captured_at"] is not None:
+                found[requested][1].append({k: r[k] for k in ("store", "url", "price_gel", "in_stock", "captured_at")})
+        return found
+
+    @db_op("search_books")
+    def search_books(self, q: str, limit: int = 20, offset: int = 0):
+        cur = self.conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+
+        prefix = isbn_prefix(q)
+        if prefix is not None:
+            cur.execute(
+                """
+                SELECT id, isbn13, title, 1.0 AS score
+                FROM books
+                WHERE isbn13 LIKE %s
+                ORDER BY isbn13
+                LIMIT %s OFFSET %s
+                """,
+                (prefix + "%", limit, offset),
+            )
+            rows = [dict(r) for r in cur.fetchall()]
+            # No such ISBN: the digits may be (part of) a title
+            if rows:
+                return rows
+
+        qn = title_norm(q) or ""
+        if not self._has_trgm():
+            cur.execute(
+                """
+                SELECT id, isbn13, title, NULL AS score
+                FROM books
+                WHERE title_norm ILIKE %s
+                ORDER BY id DESC
+                LIMIT %s OFFSET %s
+                """,
+                (f"%{qn}%", limit, offset),
+            )
+            return [dict(r) for r in cur.fetchall()]
+
+        # Both predicates can use the trigram GIN index; substring hits rank first,
+        # then fuzzy (typo) matches by word similarity.
+        cur.execute("SET LOCAL pg_trgm.word_similarity_threshold = %s", (SEARCH_SIMILARITY,))
+        cur.execute(
+            """
+            SELECT id, isbn13, title,
+                   round(word_similarity(%(q)s, title_norm)::numeric, 3) AS score
             FROM books
-            WHERE title_norm ILIKE %s
-            ORDER BY id DESC
-            LIMIT %s
+            WHERE title_norm ILIKE %(like)s OR %(q)s <%% title_norm
+            ORDER BY (title_norm ILIKE %(like)s) DESC,
+                     word_similarity(%(q)s, title_norm) DESC,
+                     similarity(%(q)s, title_norm) DESC,
+                     id DESC
+            LIMIT %(limit)s OFFSET %(offset)s
             """,
-            (f"%{qn}%", limit),
+            {"q": qn, "like": f"%{qn}%", "limit": limit, "offset": offset},
         )
         return [dict(r) for r in cur.fetchall()]
                
-    def get_compared_books(self, limit=100):
+    @db_op("list_stores")
+    def list_stores(self) -> List[str]:
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT store FROM compared_stores ORDER BY store")
+            return [r[0] for r in cur.fetchall()]
+
+    @db_op("get_compared_books")
+    def get_compared_books(self, limit: int = 100, after: Optional[Tuple[int, str, str]] = None):
+        # One page in compared_key order; `after` is the compared_key of the previous
+        # page's last row. Both seek into idx_compared_books_order, so a page reads about
+        # `limit` rows however deep it is.
         try:
+            stores = self.list_stores()
             with self.conn.cursor() as cur:
-                query = """
-                WITH latest_offers AS (
-                    SELECT DISTINCT ON (store_product_id) 
-                        store_product_id, price_gel 
-                    FROM offers 
-                    ORDER BY store_product_id, captured_at DESC
-                ),
-                store_data AS (
-                    SELECT 
-                        b.isbn13, 
-                        b.title,
-                        sp.store,
-                        lo.price_gel
-                    FROM books b
-                    JOIN store_products sp ON b.id = sp.book_id
-                    JOIN latest_offers lo ON sp.id = lo.store_product_id
+                cur.execute(
+                    COMPARED_BOOKS_SQL.format(
+                        after="WHERE (-store_count, sort_title, isbn13) > (%s, %s, %s)" if after else "",
+                        limit="LIMIT %s",
+                    ),
+                    (*(after or ()), limit),
                 )
-                SELECT 
-                    isbn13, 
-                    title,
-                    MAX(CASE WHEN store = 'biblusi' THEN price_gel END) as biblusi_price,
-                    MAX(CASE WHEN store = 'parnasi' THEN price_gel END) as parnasi_price
-                FROM store_data
-                GROUP BY isbn13, title
-                ORDER BY 
-                    (MAX(CASE WHEN store = 'biblusi' THEN 1 ELSE 0 END) + 
-                    MAX(CASE WHEN store = 'parnasi' THEN 1 ELSE 0 END)) DESC, 
-                    title ASC
-                LIMIT %s;
-                """
-                cur.execute(query, (limit,))
-                rows = cur.fetchall()
-                
-                return [
-                    {
-                        "title": r[1],
-                        "isbn": r[0],
-                        "biblusi": float(r[2]) if r[2] is not None else None,
-                        "parnasi": float(r[3]) if r[3] is not None else None
-                    }
-                    for r in rows
-                ]
+                return [compared_row(r[0], r[1], r[2], r[3], stores) for r in cur.fetchall()]
         except Exception as e:
             # This is the magic fix: it clears the "Failed Transaction" state
             self.conn.rollback()
-            raise e
\ No newline at end of file
+            raise e
+
+    @db_op("iter_compared_books")
+    def iter_compared_books(self, batch_size: int = 2000) -> Iterator[dict]:
+        # The whole table in get_compared_books order through a server-side cursor, so
+        # an export holds one batch in memory however large the catalogue is
+        stores = self.list_stores()
+        try:
+            with self.conn.cursor(name="export_compared_books") as cur:
+                cur.itersize = batch_size
+                cur.execute(COMPARED_BOOKS_SQL.format(after="", limit=""))
+                for r in cur:
+                    yield compared_row(r[0], r[1], r[2], r[3], stores)
+        finally:
+            self.conn.rollback()
+
+
+class PostgresPool:
+    # Pooled mode for the API: every request borrows its own connection through session().
+    def __init__(self, minconn: int = 1, maxconn: int = 10, checkout_timeout: float = 10.0,
+                 health_check_after: float = 30.0):
+        self.maxconn = maxconn
+        self.checkout_timeout = checkout_timeout
+        self.health_check_after = health_check_after
+        self.pool = psycopg2.pool.ThreadedConnectionPool(minconn, maxconn, _dsn(), connection_factory=TimedConnection)
+        # ThreadedConnectionPool raises when exhausted; this makes callers wait instead
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._last_used: Dict[int, float] = {}
+
+    @classmethod
+    def from_env(cls) -> "PostgresPool":
+        return cls(
+            minconn=int(os.getenv("DB_POOL_MIN", "1")),
+            maxconn=int(os.getenv("DB_POOL_MAX", "10")),
+        )
+
+    def close(self):
+        self.pool.closeall()
+
+    def _healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        idle = time.monotonic() - self._last_used.get(id(conn), 0.0)
+        if idle < self.health_check_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _checkout(self):
+        conn = self.pool.getconn()
+        if not self._healthy(conn):
+            # Broken (server restart, idle timeout...): drop it and open a fresh one
+            self._last_used.pop(id(conn), None)
+            self.pool.putconn(conn, close=True)
+            conn = self.pool.getconn()
+        return conn
+
+    @contextmanager
+    def session(self) -> Iterator[PostgresStore]:
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            raise psycopg2.pool.PoolError("timed out waiting for a database connection")
+        try:
+            conn = self._checkout()
+            broken = False
+            try:
+                yield PostgresStore(conn=conn)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                broken = True
+                raise
+            finally:
+                if not broken and not conn.closed:
+                    try:
+                        # End whatever transaction the request left open, failed or not
+                        conn.rollback()
+                    except psycopg2.Error:
+                        broken = True
+                broken = broken or bool(conn.closed)
+                if broken:
+                    self._last_used.pop(id(conn), None)
+                else:
+                    self._last_used[id(conn)] = time.monotonic()
+                self.pool.putconn(conn, close=broken)
+        finally:
+            self._slots.release()
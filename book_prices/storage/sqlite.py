@@ -0,0 +1,899 @@
+import json
+import os
+import sqlite3
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ..core.parsing import isbn13_to_isbn10
+from .common import (
+    isbn_prefix,
+    OFFER_PARTITION_RE,
+    SEARCH_SIMILARITY,
+    add_months,
+    compared_row,
+    month_start,
+    offer_changed,
+    offer_partition_name,
+    db_op,
+    timed_statement,
+    title_norm,
+)
+from .history import build_series, pack_points, to_cents, unpack_points
+from .offer_cache import LastOfferCache
+
+DEFAULT_PATH = "book_prices.sqlite3"
+
+# Statements run per offer are module constants so sqlite3's statement cache keeps them
+# prepared across calls
+UPSERT_BOOK_SQL = """
+    INSERT INTO books(isbn13, title, title_norm) VALUES (?, ?, ?)
+    ON CONFLICT(isbn13) DO UPDATE SET
+      title = COALESCE(excluded.title, books.title),
+      title_norm = COALESCE(excluded.title_norm, books.title_norm)
+    RETURNING id
+"""
+
+# Same rules as postgres.UPSERT_STORE_PRODUCTS_SQL: an ISBN link wins over a title match,
+# a changed title makes the product eligible for title matching again and drops its title link
+UPSERT_STORE_PRODUCT_SQL = """
+    INSERT INTO store_products(store, store_product_id, url, book_id, title, title_norm, match_method)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(store, store_product_id) DO UPDATE SET
+      url = excluded.url,
+      book_id = CASE
+        WHEN excluded.book_id IS NOT NULL THEN excluded.book_id
+        WHEN store_products.match_method = 'title' AND excluded.book_id IS NULL
+          AND excluded.title_norm IS NOT NULL AND excluded.title_norm IS NOT store_products.title_norm THEN NULL
+        ELSE store_products.book_id END,
+      match_method = CASE
+        WHEN excluded.match_method IS NOT NULL THEN excluded.match_method
+        WHEN store_products.match_method = 'title' AND excluded.book_id IS NULL
+          AND excluded.title_norm IS NOT NULL AND excluded.title_norm IS NOT store_products.title_norm THEN NULL
+        ELSE store_products.match_method END,
+      match_score = CASE
+        WHEN excluded.book_id IS NOT NULL THEN NULL
+        WHEN store_products.match_method = 'title' AND excluded.book_id IS NULL
+          AND excluded.title_norm IS NOT NULL AND excluded.title_norm IS NOT store_products.title_norm THEN NULL
+        ELSE store_products.match_score END,
+      title = COALESCE(excluded.title, store_products.title),
+      title_norm = COALESCE(excluded.title_norm, store_products.title_norm),
+      match_checked_at = CASE
+        WHEN excluded.title_norm IS NOT store_products.title_norm AND excluded.title_norm IS NOT NULL
+        THEN NULL ELSE store_products.match_checked_at END
+    RETURNING id
+"""
+
+# Columns added to store_products after the table, for databases created before them
+STORE_PRODUCT_MATCH_COLUMNS = (
+    ("title", "TEXT"),
+    ("title_norm", "TEXT"),
+    ("match_method", "TEXT"),
+    ("match_score", "REAL"),
+    ("match_checked_at", "TEXT"),
+)
+
+INSERT_OFFER_SQL = """
+    INSERT INTO offers(store_product_id, captured_at, price_gel, in_stock) VALUES (?, ?, ?, ?)
+"""
+
+UPSERT_LATEST_SQL = """
+    INSERT INTO latest_offers(store_product_id, offer_id, captured_at, price_gel, in_stock)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(store_product_id) DO UPDATE SET
+      offer_id = excluded.offer_id,
+      captured_at = excluded.captured_at,
+      price_gel = excluded.price_gel,
+      in_stock = excluded.in_stock
+"""
+
+# Same rows as postgres.REFRESH_COMPARED_BOOKS_SQL
+REFRESH_COMPARED_BOOKS_SQL = """
+    DELETE FROM compared_books;
+    INSERT INTO compared_books(book_id, isbn13, title, sort_title, store_count, prices)
+    SELECT b.id, b.isbn13, b.title, COALESCE(b.title, ''), COUNT(*), json_group_object(ps.store, ps.price_gel)
+    FROM (
+      SELECT sp.book_id, sp.store, MAX(lo.price_gel) AS price_gel
+      FROM store_products sp
+      JOIN latest_offers lo ON lo.store_product_id = sp.id
+      WHERE sp.book_id IS NOT NULL
+      GROUP BY sp.book_id, sp.store
+    ) ps
+    JOIN books b ON b.id = ps.book_id
+    GROUP BY b.id;
+    DELETE FROM compared_stores;
+    INSERT INTO compared_stores(store) SELECT DISTINCT store FROM store_products;
+"""
+
+# Same shape and order as postgres.COMPARED_BOOKS_SQL
+COMPARED_BOOKS_SQL = """
+    SELECT isbn13, title, store_count, prices
+    FROM compared_books
+    {after}
+    ORDER BY -store_count, sort_title, isbn13
+    {limit}
+"""
+
+# (store_products.id, fetched at, changed at or NULL, changed 0/1)
+RECORD_FETCH_SQL = """
+    INSERT INTO crawl_state
+      (store_product_id, last_fetched_at, last_changed_at, fetch_count, change_count, unchanged_streak)
+    VALUES (?, ?, ?, 1, ?, 0)
+    ON CONFLICT(store_product_id) DO UPDATE SET
+      last_fetched_at = excluded.last_fetched_at,
+      last_changed_at = COALESCE(excluded.last_changed_at, crawl_state.last_changed_at),
+      fetch_count = crawl_state.fetch_count + 1,
+      change_count = crawl_state.change_count + excluded.change_count,
+      unchanged_streak = CASE WHEN excluded.change_count > 0 THEN 0 ELSE crawl_state.unchanged_streak + 1 END
+"""
+
+# Candidates pulled from the FTS index before fuzzy re-ranking in search_books
+SEARCH_CANDIDATES = int(os.getenv("SQLITE_SEARCH_CANDIDATES", "500"))
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _ts(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+def _bool(value) -> Optional[bool]:
+    return None if value is None else bool(value)
+
+
+def _trigrams(s: str) -> set:
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+def _fts_phrase(s: str) -> str:
+    return '"' + s.replace('"', '""') + '"'
+
+
+class TimedConnection(sqlite3.Connection):
+    # Times statements into bp_db_statement_seconds by store method; the store only runs
+    # statements through these connection shortcuts
+    def execute(self, sql, parameters=()):
+        with timed_statement("sqlite"):
+            return super().execute(sql, parameters)
+
+    def executemany(self, sql, parameters):
+        with timed_statement("sqlite"):
+            return super().executemany(sql, parameters)
+
+    def executescript(self, script):
+        with timed_statement("sqlite"):
+            return super().executescript(script)
+
+
+def connect(path: str) -> sqlite3.Connection:
+    # Autocommit mode; writes group themselves with _tx()
+    # check_same_thread=False: the crawl hands the store to its writer thread; a store is
+    # still only used by one thread at a time
+    conn = sqlite3.connect(
+        path, isolation_level=None, cached_statements=256, check_same_thread=False, factory=TimedConnection
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.execute("PRAGMA busy_timeout=5000")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+class SqliteStore:
+    # Same interface as PostgresStore on a local SQLite file (WAL, so the API keeps reading
+    # while a crawl writes). Select it with DB_BACKEND=sqlite; see book_prices.storage.
+    def __init__(self, path: str = DEFAULT_PATH, conn: Optional[sqlite3.Connection] = None):
+        self._owns_conn = conn is None
+        self.path = path
+        self.conn = conn if conn is not None else connect(path)
+        self.last_offers: Optional[LastOfferCache] = None
+
+    def close(self):
+        if self._owns_conn:
+            self.conn.close()
+
+    @contextmanager
+    def _tx(self):
+        if self.conn.in_transaction:
+            # Nested in a caller's transaction
+            yield self.conn
+            return
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.conn
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    @db_op("init_schema")
+    def init_schema(self):
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS books (
+              id INTEGER PRIMARY KEY,
+              isbn13 TEXT NOT NULL UNIQUE,
+              title TEXT,
+              title_norm TEXT,
+              created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+            );
+
+            CREATE TABLE IF NOT EXISTS store_products (
+              id INTEGER PRIMARY KEY,
+              store TEXT NOT NULL,
+              store_product_id TEXT NOT NULL,
+              url TEXT NOT NULL,
+              book_id INTEGER REFERENCES books(id),
+              created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+              UNIQUE(store, store_product_id)
+            );
+
+            CREATE TABLE IF NOT EXISTS offers (
+              id INTEGER PRIMARY KEY,
+              store_product_id INTEGER NOT NULL REFERENCES store_products(id),
+              captured_at TEXT NOT NULL,
+              price_gel REAL,
+              in_stock INTEGER
+            );
+
+            CREATE TABLE IF NOT EXISTS latest_offers (
+              store_product_id INTEGER PRIMARY KEY REFERENCES store_products(id),
+              offer_id INTEGER NOT NULL,
+              captured_at TEXT NOT NULL,
+              price_gel REAL,
+              in_stock INTEGER
+            );
+
+            -- Packed (epoch, price_cents, stock) points, see storage.history.pack_points
+            CREATE TABLE IF NOT EXISTS offer_history (
+              store_product_id INTEGER NOT NULL REFERENCES store_products(id),
+              year INTEGER NOT NULL,
+              points BLOB NOT NULL,
+              PRIMARY KEY (store_product_id, year)
+            ) WITHOUT ROWID;
+
+            CREATE TABLE IF NOT EXISTS crawl_state (
+              store_product_id INTEGER PRIMARY KEY REFERENCES store_products(id),
+              last_fetched_at TEXT NOT NULL,
+              last_changed_at TEXT,
+              fetch_count INTEGER NOT NULL DEFAULT 0,
+              change_count INTEGER NOT NULL DEFAULT 0,
+              unchanged_streak INTEGER NOT NULL DEFAULT 0
+            );
+
+            CREATE TABLE IF NOT EXISTS meta (
+              key TEXT PRIMARY KEY,
+              value INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO meta(key, value) VALUES ('data_version', 0);
+
+            -- /api/books as of the last data version bump, see refresh_compared_books()
+            CREATE TABLE IF NOT EXISTS compared_books (
+              book_id INTEGER PRIMARY KEY,
+              isbn13 TEXT NOT NULL,
+              title TEXT,
+              sort_title TEXT NOT NULL,
+              store_count INTEGER NOT NULL,
+              prices TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_compared_books_order ON compared_books(-store_count, sort_title, isbn13);
+            CREATE TABLE IF NOT EXISTS compared_stores (
+              store TEXT PRIMARY KEY
+            ) WITHOUT ROWID;
+
+            CREATE INDEX IF NOT EXISTS idx_books_title_norm ON books(title_norm);
+            CREATE INDEX IF NOT EXISTS idx_store_products_book_id ON store_products(book_id);
+            CREATE INDEX IF NOT EXISTS idx_offers_storeprod_time ON offers(store_product_id, captured_at DESC);
+            CREATE INDEX IF NOT EXISTS idx_offers_captured_at ON offers(captured_at);
+
+            -- Title search: trigram FTS5 index kept in sync with books by triggers
+            CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+              title_norm, content='books', content_rowid='id', tokenize='trigram'
+            );
+            CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+              INSERT INTO books_fts(rowid, title_norm) VALUES (new.id, new.title_norm);
+            END;
+            CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+              INSERT INTO books_fts(books_fts, rowid, title_norm) VALUES ('delete', old.id, old.title_norm);
+            END;
+            CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE OF title_norm ON books BEGIN
+              INSERT INTO books_fts(books_fts, rowid, title_norm) VALUES ('delete', old.id, old.title_norm);
+              INSERT INTO books_fts(rowid, title_norm) VALUES (new.id, new.title_norm);
+            END;
+            """
+        )
+
+        have = {r[1] for r in self.conn.execute("PRAGMA table_info(store_products)")}
+        for name, decl in STORE_PRODUCT_MATCH_COLUMNS:
+            if name not in have:
+                self.conn.execute(f"ALTER TABLE store_products ADD COLUMN {name} {decl}")
+        self.conn.executescript(
+            """
+            CREATE INDEX IF NOT EXISTS idx_store_products_unmatched ON store_products(id)
+              WHERE book_id IS NULL AND title_norm IS NOT NULL;
+            UPDATE store_products SET match_method = 'isbn' WHERE book_id IS NOT NULL AND match_method IS NULL;
+            """
+        )
+
+        row = self.conn.execute(
+            "SELECT NOT EXISTS (SELECT 1 FROM latest_offers) AND EXISTS (SELECT 1 FROM offers)"
+        ).fetchone()
+        if row[0]:
+            self.backfill_latest_offers()
+        row = self.conn.execute(
+            "SELECT NOT EXISTS (SELECT 1 FROM offer_history) AND EXISTS (SELECT 1 FROM offers)"
+        ).fetchone()
+        if row[0]:
+            self.backfill_offer_history()
+        row = self.conn.execute(
+            "SELECT NOT EXISTS (SELECT 1 FROM compared_stores) AND EXISTS (SELECT 1 FROM store_products)"
+        ).fetchone()
+        if row[0]:
+            self.refresh_compared_books()
+
+    # -- writes --------------------------------------------------------------------
+
+    @db_op("preload_last_offers")
+    def preload_last_offers(self, store: str, max_entries: int = 500_000) -> bool:
+        if self.last_offers is None:
+            self.last_offers = LastOfferCache(max_entries=max_entries)
+        cur = self.conn.execute(
+            """
+            SELECT lo.store_product_id, lo.price_gel, lo.in_stock
+            FROM latest_offers lo
+            JOIN store_products sp ON sp.id = lo.store_product_id
+            WHERE sp.store = ?
+            """,
+            (store,),
+        )
+        return self.last_offers.load(store, ((r[0], r[1], _bool(r[2])) for r in cur))
+
+    def _lookup_last_offer(self, store: str, sp_id: int):
+        if self.last_offers is not None:
+            known, last = self.last_offers.lookup(store, sp_id)
+            if known:
+                return last
+        row = self.conn.execute(
+            "SELECT price_gel, in_stock FROM latest_offers WHERE store_product_id = ?", (sp_id,)
+        ).fetchone()
+        return (row[0], _bool(row[1])) if row is not None else None
+
+    @db_op("upsert_offer")
+    def upsert_offer(self, offer) -> None:
+        self._write_batch([offer])
+
+    @db_op("upsert_offers")
+    def upsert_offers(self, offers: Iterable, batch_size: int = 500) -> int:
+        # One transaction per batch; returns the number of offer rows inserted
+        inserted = 0
+        batch = []
+        for offer in offers:
+            batch.append(offer)
+            if len(batch) >= batch_size:
+                inserted += self._write_batch(batch)
+                batch = []
+        if batch:
+            inserted += self._write_batch(batch)
+        return inserted
+
+    def _write_batch(self, batch: list) -> int:
+        now = _now()
+        epoch = int(datetime.fromisoformat(now).timestamp())
+        written = []
+        fetched: Dict[int, bool] = {}
+        history: Dict[int, list] = defaultdict(list)
+        batch_last: Dict[int, Tuple] = {}
+
+        with self._tx() as conn:
+            for o in batch:
+                book_id = None
+                if o.isbn:
+                    book_id = conn.execute(UPSERT_BOOK_SQL, (o.isbn, o.title, title_norm(o.title))).fetchone()[0]
+                sp_id = conn.execute(
+                    UPSERT_STORE_PRODUCT_SQL,
+                    (o.store, str(o.store_product_id), o.url, book_id, o.title, title_norm(o.title),
+                     "isbn" if book_id else None),
+                ).fetchone()[0]
+
+                # Earlier rows of this batch aren't in the last-offer cache until it commits
+                last = batch_last[sp_id] if sp_id in batch_last else self._lookup_last_offer(o.store, sp_id)
+                changed = last is None or offer_changed(last[0], last[1], o)
+                fetched[sp_id] = fetched.get(sp_id, False) or changed
+                if not changed:
+                    continue
+
+                offer_id = conn.execute(INSERT_OFFER_SQL, (sp_id, now, o.price_gel, o.in_stock)).lastrowid
+                conn.execute(UPSERT_LATEST_SQL, (sp_id, offer_id, now, o.price_gel, o.in_stock))
+                history[sp_id].append((epoch, to_cents(o.price_gel), o.in_stock))
+                # Later duplicates in the batch compare against this one
+                written.append((o.store, sp_id, o))
+                batch_last[sp_id] = (o.price_gel, o.in_stock)
+
+            self._append_history(conn, history)
+            conn.executemany(
+                RECORD_FETCH_SQL,
+                [(sp_id, now, now if changed else None, int(changed)) for sp_id, changed in fetched.items()],
+            )
+
+        # Only committed offers go into the cache (a rolled back batch raised above)
+        if self.last_offers is not None:
+            for store, sp_id, o in written:
+                self.last_offers.put(store, sp_id, o.price_gel, o.in_stock)
+        return len(written)
+
+    def _append_history(self, conn, points_by_sp: Dict[int, list]) -> None:
+        by_key: Dict[Tuple[int, int], list] = defaultdict(list)
+        for sp_id, points in points_by_sp.items():
+            for p in points:
+                by_key[(sp_id, datetime.fromtimestamp(p[0], timezone.utc).year)].append(p)
+        for (sp_id, year), points in by_key.items():
+            row = conn.execute(
+                "SELECT points FROM offer_history WHERE store_product_id = ? AND year = ?", (sp_id, year)
+            ).fetchone()
+            blob = (bytes(row[0]) if row else b"") + pack_points(sorted(points, key=lambda p: p[0]))
+            conn.execute(
+                "INSERT OR REPLACE INTO offer_history(store_product_id, year, points) VALUES (?, ?, ?)",
+                (sp_id, year, blob),
+            )
+
+    @db_op("append_history")
+    def append_history(self, points: Iterable[Tuple[int, int, Optional[float], Optional[bool]]]) -> None:
+        by_sp: Dict[int, list] = defaultdict(list)
+        for sp_id, epoch, price_gel, in_stock in points:
+            by_sp[int(sp_id)].append((int(epoch), to_cents(price_gel), in_stock))
+        with self._tx() as conn:
+            self._append_history(conn, by_sp)
+
+    @db_op("mark_fetched")
+    def mark_fetched(self, store: str, store_product_ids: List[str]) -> None:
+        if not store_product_ids:
+            return
+        ids = [str(x) for x in store_product_ids]
+        with self._tx() as conn:
+            conn.execute(
+                f"""
+                UPDATE crawl_state SET
+                  last_fetched_at = ?,
+                  fetch_count = fetch_count + 1,
+                  unchanged_streak = unchanged_streak + 1
+                WHERE store_product_id IN (
+                  SELECT id FROM store_products
+                  WHERE store = ? AND store_product_id IN ({",".join("?" * len(ids))})
+                )
+                """,
+                (_now(), store, *ids),
+            )
+
+    @db_op("load_crawl_state")
+    def load_crawl_state(self, store: str) -> List[Dict]:
+        rows = self.conn.execute(
+            """
+            SELECT sp.store_product_id, sp.url,
+                   cs.last_fetched_at, cs.last_changed_at,
+                   COALESCE(cs.fetch_count, 0) AS fetch_count,
+                   COALESCE(cs.change_count, 0) AS change_count,
+                   COALESCE(cs.unchanged_streak, 0) AS unchanged_streak,
+                   lo.in_stock, lo.price_gel,
+                   COALESCE(sp.match_method = 'isbn', 0) AS isbn_known
+            FROM store_products sp
+            LEFT JOIN crawl_state cs ON cs.store_product_id = sp.id
+            LEFT JOIN latest_offers lo ON lo.store_product_id = sp.id
+            WHERE sp.store = ?
+            """,
+            (store,),
+        ).fetchall()
+        return [
+            {
+                **dict(r),
+                "last_fetched_at": _ts(r["last_fetched_at"]),
+                "last_changed_at": _ts(r["last_changed_at"]),
+                "in_stock": _bool(r["in_stock"]),
+                "isbn_known": bool(r["isbn_known"]),
+            }
+            for r in rows
+        ]
+
+    @db_op("load_match_books")
+    def load_match_books(self, min_id: int = 0) -> List[Tuple[int, str, List[str]]]:
+        rows = self.conn.execute(
+            """
+            SELECT b.id, b.title_norm, group_concat(DISTINCT sp.store)
+            FROM books b
+            LEFT JOIN store_products sp ON sp.book_id = b.id
+            WHERE b.title_norm IS NOT NULL AND b.id > ?
+            GROUP BY b.id
+            """,
+            (min_id,),
+        ).fetchall()
+        return [(int(r[0]), r[1], r[2].split(",") if r[2] else []) for r in rows]
+
+    @db_op("load_unmatched_products")
+    def load_unmatched_products(self, checked: bool = False) -> List[Tuple[int, str, str]]:
+        rows = self.conn.execute(
+            f"""
+            SELECT id, store, title_norm
+            FROM store_products
+            WHERE book_id IS NULL AND title_norm IS NOT NULL
+              AND match_checked_at IS {"NOT NULL" if checked else "NULL"}
+            ORDER BY id
+            """
+        ).fetchall()
+        return [(int(r[0]), r[1], r[2]) for r in rows]
+
+    @db_op("save_matches")
+    def save_matches(self, matches: List[Tuple[int, int, float]], checked_ids: List[int]) -> int:
+        with self._tx() as conn:
+            cur = conn.executemany(
+                """
+                UPDATE store_products SET book_id = ?, match_method = 'title', match_score = ?
+                WHERE id = ? AND book_id IS NULL
+                """,
+                [(book_id, score, sp_id) for sp_id, book_id, score in matches],
+            )
+            linked = cur.rowcount if matches else 0
+            now = _now()
+            conn.executemany(
+                "UPDATE store_products SET match_checked_at = ? WHERE id = ?",
+                [(now, sp_id) for sp_id in checked_ids],
+            )
+        return linked
+
+    @db_op("get_meta")
+    def get_meta(self, key: str, default: int = 0) -> int:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return int(row[0]) if row else default
+
+    @db_op("set_meta")
+    def set_meta(self, key: str, value: int) -> None:
+        with self._tx() as conn:
+            conn.execute(
+                "INSERT INTO meta(key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value),
+            )
+
+    @db_op("get_data_version")
+    def get_data_version(self) -> int:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'data_version'").fetchone()
+        return int(row[0]) if row else 0
+
+    @db_op("bump_data_version")
+    def bump_data_version(self) -> int:
+        with self._tx() as conn:
+            row = conn.execute(
+                """
+                INSERT INTO meta(key, value) VALUES ('data_version', 1)
+                ON CONFLICT(key) DO UPDATE SET value = meta.value + 1
+                RETURNING value
+                """
+            ).fetchone()
+        return int(row[0])
+
+    @db_op("refresh_compared_books")
+    def refresh_compared_books(self) -> int:
+        with self._tx() as conn:
+            for statement in REFRESH_COMPARED_BOOKS_SQL.split(";"):
+                if statement.strip():
+                    conn.execute(statement)
+            return conn.execute("SELECT COUNT(*) FROM compared_books").fetchone()[0]
+
+    @db_op("backfill_latest_offers")
+    def backfill_latest_offers(self) -> int:
+        with self._tx() as conn:
+            cur = conn.execute(
+                """
+                INSERT OR REPLACE INTO latest_offers(store_product_id, offer_id, captured_at, price_gel, in_stock)
+                SELECT store_product_id, id, captured_at, price_gel, in_stock
+                FROM (
+                  SELECT *, row_number() OVER (
+                    PARTITION BY store_product_id ORDER BY captured_at DESC, id DESC
+                  ) AS rn
+                  FROM offers
+                )
+                WHERE rn = 1
+                """
+            )
+            return cur.rowcount
+
+    @db_op("backfill_offer_history")
+    def backfill_offer_history(self) -> int:
+        # Like PostgresStore: only product-years that have no history yet
+        have = {
+            (r[0], r[1]) for r in self.conn.execute("SELECT store_product_id, year FROM offer_history")
+        }
+        by_key: Dict[Tuple[int, int], list] = defaultdict(list)
+        for sp_id, captured_at, price_gel, in_stock in self.conn.execute(
+            "SELECT store_product_id, captured_at, price_gel, in_stock FROM offers ORDER BY captured_at, id"
+        ):
+            ts = datetime.fromisoformat(captured_at)
+            key = (sp_id, ts.astimezone(timezone.utc).year)
+            if key not in have:
+                by_key[key].append((int(ts.timestamp()), to_cents(price_gel), _bool(in_stock)))
+        with self._tx() as conn:
+            conn.executemany(
+                "INSERT INTO offer_history(store_product_id, year, points) VALUES (?, ?, ?)",
+                [(sp_id, year, pack_points(points)) for (sp_id, year), points in by_key.items()],
+            )
+        return len(by_key)
+
+    # -- retention: months stand in for Postgres partitions --------------------------
+
+    @db_op("ensure_offer_partitions")
+    def ensure_offer_partitions(self, months_ahead: int = 0) -> List[str]:
+        return []
+
+    @db_op("list_offer_partitions")
+    def list_offer_partitions(self) -> List[Tuple[str, datetime]]:
+        rows = self.conn.execute(
+            "SELECT DISTINCT substr(captured_at, 1, 7) FROM offers ORDER BY 1"
+        ).fetchall()
+        months = [datetime(int(r[0][:4]), int(r[0][5:7]), 1, tzinfo=timezone.utc) for r in rows]
+        return [(offer_partition_name(m), m) for m in months]
+
+    def _month_range(self, name: str) -> Tuple[str, str]:
+        m = OFFER_PARTITION_RE.match(name)
+        if not m:
+            raise ValueError(f"not an offers partition: {name}")
+        start = month_start(datetime(int(m.group(1)), int(m.group(2)), 1))
+        return start.isoformat(), add_months(start, 1).isoformat()
+
+    @db_op("compact_offer_partition")
+    def compact_offer_partition(self, name: str) -> int:
+        start, end = self._month_range(name)
+        with self._tx() as conn:
+            cur = conn.execute(
+                """
+                DELETE FROM offers WHERE id IN (
+                  SELECT id FROM (
+                    SELECT id, row_number() OVER (
+                      PARTITION BY store_product_id, substr(captured_at, 1, 10)
+                      ORDER BY captured_at DESC, id DESC
+                    ) AS rn
+                    FROM offers
+                    WHERE captured_at >= ? AND captured_at < ?
+                  )
+                  WHERE rn > 1
+                )
+                """,
+                (start, end),
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO meta(key, value) VALUES (?, strftime('%s', 'now'))",
+                (f"compacted:{name}",),
+            )
+            return cur.rowcount
+
+    @db_op("compacted_offer_partitions")
+    def compacted_offer_partitions(self) -> set:
+        rows = self.conn.execute("SELECT key FROM meta WHERE key LIKE 'compacted:%'").fetchall()
+        return {r[0].split(":", 1)[1] for r in rows}
+
+    @db_op("drop_offer_partition")
+    def drop_offer_partition(self, name: str) -> None:
+        start, end = self._month_range(name)
+        with self._tx() as conn:
+            conn.execute("DELETE FROM offers WHERE captured_at >= ? AND captured_at < ?", (start, end))
+            conn.execute("DELETE FROM meta WHERE key = ?", (f"compacted:{name}",))
+
+    # -- reads ---------------------------------------------------------------------
+
+    @db_op("get_book_by_isbn")
+    def get_book_by_isbn(self, isbn13: str):
+        book = self.conn.execute("SELECT * FROM books WHERE isbn13 = ?", (isbn13,)).fetchone()
+        if not book:
+            return None
+
+        rows = self.conn.execute(
+            """
+            SELECT sp.store, sp.url, o.price_gel, o.in_stock, o.captured_at
+            FROM store_products sp
+            JOIN latest_offers o ON o.store_product_id = sp.id
+            WHERE sp.book_id = ?
+            ORDER BY (o.in_stock IS NULL) ASC, o.in_stock DESC, o.price_gel ASC
+            """,
+            (book["id"],),
+        ).fetchall()
+        offers = [
+            {**dict(r), "in_stock": _bool(r["in_stock"]), "captured_at": _ts(r["captured_at"])}
+            for r in rows
+        ]
+        return {**dict(book), "created_at": _ts(book["created_at"])}, offers
+
+    @db_op("get_books_by_isbns")
+    def get_books_by_isbns(self, isbns: List[str]) -> Dict[str, Tuple[dict, List[dict]]]:
+        keys = {}
+        for isbn in isbns:
+            keys[isbn] = isbn
+            isbn10 = isbn13_to_isbn10(isbn)
+            if isbn10 is not None:
+                keys.setdefault(isbn10, isbn)
+        if not keys:
+            return {}
+
+        rows = self.conn.execute(
+            f"""
+            SELECT b.id, b.isbn13, b.title, b.title_norm, b.created_at AS book_created_at,
+                   sp.store, sp.url, o.price_gel, o.in_stock, o.captured_at
+            FROM books b
+            LEFT JOIN store_products sp ON sp.book_id = b.id
+            LEFT JOIN latest_offers o ON o.store_product_id = sp.id
+            WHERE b.isbn13 IN ({",".join("?" * len(keys))})
+            ORDER BY b.id, (o.in_stock IS NULL) ASC, o.in_stock DESC, o.price_gel ASC
+            """,
+            list(keys),
+        ).fetchall()
+        found: Dict[str, Tuple[dict, List[dict]]] = {}
+        for r in rows:
+            requested = keys[r["isbn13"]]
+            if requested not in found:
+                book = {
+                    "id": r["id"], "isbn13": r["isbn13"], "title": r["title"],
+                    "title_norm": r["title_norm"], "created_at": _ts(r["book_created_at"]),
+                }
+                found[requested] = (book, [])
+            if r["captured_at"] is not None:
+                found[requested][1].append({
+                    "store": r["store"], "url": r["url"], "price_gel": r["price_gel"],
+                    "in_stock": _bool(r["in_stock"]), "captured_at": _ts(r["captured_at"]),
+                })
+        return found
+
+    @db_op("search_books")
+    def search_books(self, q: str, limit: int = 20, offset: int = 0):
+        prefix = isbn_prefix(q)
+        if prefix is not None:
+            # Range scan on the isbn13 unique index
+            rows = self.conn.execute(
+                """
+                SELECT id, isbn13, title, 1.0 AS score
+                FROM books
+                WHERE isbn13 >= ? AND isbn13 < ?
+                ORDER BY isbn13
+                LIMIT ? OFFSET ?
+                """,
+                (prefix, prefix + "\uffff", limit, offset),
+            ).fetchall()
+            # No such ISBN: the digits may be (part of) a title
+            if rows:
+                return [dict(r) for r in rows]
+
+        qn = title_norm(q) or ""
+        if len(qn) < 3:
+            # Trigram index can't answer 1-2 character queries
+            rows = self.conn.execute(
+                """
+                SELECT id, isbn13, title, NULL AS score
+                FROM books
+                WHERE title_norm LIKE ?
+                ORDER BY id DESC
+                LIMIT ? OFFSET ?
+                """,
+                (f"%{qn}%", limit, offset),
+            ).fetchall()
+            return [dict(r) for r in rows]
+
+        # Candidates share at least one trigram with the query (best bm25 first); they are
+        # then ranked like the pg_trgm path: substring hits first, then by the share of the
+        # query's trigrams found in the title, cut at SEARCH_SIMILARITY.
+        q_grams = _trigrams(qn)
+        match = " OR ".join(_fts_phrase(g) for g in sorted(q_grams))
+        rows = self.conn.execute(
+            """
+            SELECT b.id, b.isbn13, b.title, b.title_norm
+            FROM books_fts f
+            JOIN books b ON b.id = f.rowid
+            WHERE books_fts MATCH ?
+            ORDER BY f.rank
+            LIMIT ?
+            """,
+            (match, max(SEARCH_CANDIDATES, offset + limit)),
+        ).fetchall()
+
+        ranked = []
+        for r in rows:
+            tn = r["title_norm"] or ""
+            substring = qn in tn
+            score = len(q_grams & _trigrams(tn)) / len(q_grams)
+            if substring or score >= SEARCH_SIMILARITY:
+                ranked.append((substring, score, r))
+        ranked.sort(key=lambda x: (x[0], x[1], x[2]["id"]), reverse=True)
+
+        return [
+            {"id": r["id"], "isbn13": r["isbn13"], "title": r["title"], "score": round(1.0 if sub else score, 3)}
+            for sub, score, r in ranked[offset:offset + limit]
+        ]
+
+    @db_op("list_stores")
+    def list_stores(self) -> List[str]:
+        return [r[0] for r in self.conn.execute("SELECT store FROM compared_stores ORDER BY store")]
+
+    @db_op("get_compared_books")
+    def get_compared_books(self, limit: int = 100, after: Optional[Tuple[int, str, str]] = None):
+        stores = self.list_stores()
+        rows = self.conn.execute(
+            COMPARED_BOOKS_SQL.format(
+                after="WHERE (-store_count, sort_title, isbn13) > (?, ?, ?)" if after else "", limit="LIMIT ?"
+            ),
+            (*(after or ()), limit),
+        ).fetchall()
+        return [compared_row(r[0], r[1], r[2], json.loads(r[3]), stores) for r in rows]
+
+    @db_op("iter_compared_books")
+    def iter_compared_books(self, batch_size: int = 2000) -> Iterator[dict]:
+        # Its own connection: an export is consumed on whichever thread the server picks
+        # for each chunk, while self.conn belongs to the thread that opened the session
+        conn = connect(self.path)
+        try:
+            stores = [r[0] for r in conn.execute("SELECT store FROM compared_stores ORDER BY store")]
+            cur = conn.execute(COMPARED_BOOKS_SQL.format(after="", limit=""))
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                for r in rows:
+                    yield compared_row(r[0], r[1], r[2], json.loads(r[3]), stores)
+        finally:
+            conn.close()
+
+    @db_op("get_price_history")
+    def get_price_history(self, isbn13: str, since: Optional[datetime] = None, resolution: str = "day"):
+        book = self.conn.execute("SELECT id, isbn13, title FROM books WHERE isbn13 = ?", (isbn13,)).fetchone()
+        if not book:
+            return None
+        rows = self.conn.execute(
+            """
+            SELECT sp.id, sp.store, sp.url, oh.points
+            FROM store_products sp
+            JOIN offer_history oh ON oh.store_product_id = sp.id
+            WHERE sp.book_id = ?
+            ORDER BY sp.store, sp.id, oh.year
+            """,
+            (book["id"],),
+        ).fetchall()
+        series = build_series(
+            ((r["id"], r["store"], r["url"], unpack_points(bytes(r["points"]))) for r in rows),
+            since,
+            resolution,
+        )
+        return dict(book), series
+
+
+class SqlitePool:
+    # API counterpart of PostgresPool: one connection per thread, handed out by session()
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._conns: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "SqlitePool":
+        return cls(os.getenv("SQLITE_PATH", DEFAULT_PATH))
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect(self.path)
+            with self._lock:
+                self._conns.append(conn)
+        return conn
+
+    @contextmanager
+    def session(self) -> Iterator[SqliteStore]:
+        conn = self._conn()
+        try:
+            yield SqliteStore(self.path, conn=conn)
+        finally:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+
+    def close(self):
+        with self._lock:
+            for conn in self._conns:
+                conn.close()
+            self._conns.clear()
@@ -9,4 +9,10 @@ cd $PROJECT_DIR
 source venv/bin/activate
 
 # Run the scraper
-python -m book_prices.jobs.run_scrape
\ No newline at end of file
+python -m book_prices.jobs.run_scrape
+
+# Offers partitions: create the next months, compact and drop old ones
+python -m book_prices.jobs.maintain_offers
+
+# Link products without an ISBN to books by title
+python -m book_prices.jobs.match_titles
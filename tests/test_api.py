@@ -0,0 +1,81 @@
+import pytest
+
+pytest.importorskip("fastapi")
+
+from types import SimpleNamespace
+
+from fastapi import HTTPException
+
+from book_prices.api import app as app_module
+from book_prices.api.app import CompareBatchRequest, compare_batch, create_app, decode_cursor, encode_cursor
+from book_prices.core.metrics import REGISTRY
+from book_prices.core.models import Offer
+from book_prices.storage.common import compared_key
+from book_prices.storage.sqlite import SqlitePool, SqliteStore
+
+
+def test_cursor_round_trip():
+    row = {"title": "ანა კარენინა", "isbn": "9780140447934", "biblusi": 12.5, "store_count": 3}
+    key = compared_key(row)
+    assert key == (-3, "ანა კარენინა", "9780140447934")
+    assert decode_cursor(encode_cursor(key)) == key
+
+
+def test_untitled_books_sort_as_empty_title():
+    assert compared_key({"title": None, "isbn": "9780140447934", "store_count": 1}) == (-1, "", "9780140447934")
+
+
+@pytest.mark.parametrize("cursor", ["", "not base64!", "WzFd", "eyJhIjogMX0="])
+def test_bad_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as e:
+        decode_cursor(cursor)
+    assert e.value.status_code == 400
+
+
+def test_cache_metrics_are_registered_once():
+    apps = [create_app(pool=object()) for _ in range(3)]
+    apps[0].state.response_cache.hits = 2
+    apps[2].state.response_cache.hits = 3
+    text = REGISTRY.render()
+    assert text.count("# TYPE bp_api_cache_hits_total counter") == 1
+    assert "bp_api_cache_hits_total 5" in text
+
+
+@pytest.fixture
+def batch_request(tmp_path):
+    path = str(tmp_path / "books.sqlite3")
+    db = SqliteStore(path)
+    db.init_schema()
+    db.upsert_offers([
+        Offer(store="biblusi", url="https://biblusi.example/p/1", title="Anna Karenina", price_gel=12.0,
+              isbn="9780140447934", in_stock=True, store_product_id="1"),
+        Offer(store="biblusi", url="https://biblusi.example/p/2", title="1984", price_gel=9.0,
+              isbn="9780451524935", in_stock=True, store_product_id="2"),
+    ])
+    db.close()
+    pool = SqlitePool(path)
+    yield SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(pool=pool)))
+    pool.close()
+
+
+def test_compare_batch_answers_in_request_order(batch_request):
+    isbns = ["9780451524935", "0-14-044793-8", "9780140447934", "9780451524935", "9780140447935", "9780374100148"]
+    items = compare_batch(CompareBatchRequest(isbns=isbns), batch_request)["items"]
+    assert [(i["isbn"], i["isbn13"], i.get("error")) for i in items] == [
+        ("9780451524935", "9780451524935", None),
+        ("0-14-044793-8", "9780140447934", None),   # ISBN-10 input
+        ("9780140447934", "9780140447934", None),
+        ("9780451524935", "9780451524935", None),   # duplicates are answered each time
+        ("9780140447935", None, "invalid_isbn"),
+        ("9780374100148", "9780374100148", "not_found"),
+    ]
+    assert [i["book"]["title"] for i in items[:4]] == ["1984", "Anna Karenina", "Anna Karenina", "1984"]
+    assert [o["price_gel"] for o in items[1]["offers"]] == [12.0]
+
+
+def test_compare_batch_size_limit(batch_request, monkeypatch):
+    monkeypatch.setattr(app_module, "COMPARE_BATCH_MAX", 2)
+    assert len(compare_batch(CompareBatchRequest(isbns=["9780140447934"] * 2), batch_request)["items"]) == 2
+    with pytest.raises(HTTPException) as e:
+        compare_batch(CompareBatchRequest(isbns=["9780140447934"] * 3), batch_request)
+    assert e.value.status_code == 422
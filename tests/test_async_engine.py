@@ -0,0 +1,156 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from benchmarks.fakesite import StandIn
+import aiohttp
+
+from book_prices.core.http import AdaptiveController, AsyncHttpClient, NotModified
+from book_prices.core.httpcache import HttpCache
+from book_prices.core.models import Offer, ProductRef
+from book_prices.core.ratelimit import HostRateLimiter, TokenBucket
+from book_prices.jobs.engine import StoreJob, run_async
+
+
+def refs(n: int) -> list[ProductRef]:
+    return [ProductRef(store="s", url=f"https://s.example/p/{i}", store_product_id=str(i)) for i in range(n)]
+
+
+def offer(ref: ProductRef) -> Offer:
+    return Offer(store="s", url=ref.url, title=None, price_gel=1.0, isbn=None, in_stock=True,
+                 store_product_id=ref.store_product_id)
+
+
+def job(iter_products, afetch_offer) -> StoreJob:
+    return StoreJob(store="s", iter_products=iter_products, fetch_page=None, parse_offer=None,
+                    afetch_offer=afetch_offer)
+
+
+def test_products_are_fetched_while_the_listing_is_still_running():
+    first_fetched = threading.Event()
+
+    def iter_products():
+        products = refs(3)
+        yield products[0]
+        # The rest of the listing only loads once the first product is being fetched
+        assert first_fetched.wait(10)
+        yield from products[1:]
+
+    async def afetch_offer(ref):
+        first_fetched.set()
+        return offer(ref)
+
+    written = []
+    [stats] = asyncio.run(run_async([job(iter_products, afetch_offer)], upsert_fn=written.append))
+    assert stats.products == 3 and stats.fetched == 3
+    assert sorted(o.store_product_id for o in written) == ["0", "1", "2"]
+
+
+def test_parse_errors_are_counted_per_url():
+    async def afetch_offer(ref):
+        if ref.store_product_id == "1":
+            raise ValueError("bad page")
+        return offer(ref)
+
+    written = []
+    [stats] = asyncio.run(run_async([job(lambda: iter(refs(4)), afetch_offer)], upsert_fn=written.append))
+    assert stats.errors == 1 and stats.fetched == 3
+    assert len(written) == 3
+
+
+def test_writer_failure_ends_the_crawl():
+    async def afetch_offer(ref):
+        return offer(ref)
+
+    def upsert(o):
+        raise RuntimeError("db down")
+
+    started = time.monotonic()
+    with pytest.raises(RuntimeError, match="db down"):
+        asyncio.run(run_async([job(lambda: iter(refs(1000)), afetch_offer)], upsert_fn=upsert, concurrency=4))
+    assert time.monotonic() - started < 10
+
+
+def test_not_modified_pages_go_to_unchanged_fn():
+    async def afetch_offer(ref):
+        if ref.store_product_id in ("1", "2"):
+            raise NotModified(ref.url)
+        return offer(ref)
+
+    written, unchanged = [], []
+    [stats] = asyncio.run(run_async([job(lambda: iter(refs(4)), afetch_offer)], upsert_fn=written.append,
+                                    unchanged_fn=unchanged.append))
+    assert (stats.fetched, stats.unchanged, stats.errors) == (4, 2, 0)
+    assert sorted(r.store_product_id for r in unchanged) == ["1", "2"]
+    assert sorted(o.store_product_id for o in written) == ["0", "3"]
+
+
+@pytest.mark.parametrize("failures, rounds, retried, errors", [(1, 1, 1, 0), (2, 1, 1, 1), (2, 2, 2, 0)])
+def test_failed_downloads_are_retried_after_the_listing(failures, rounds, retried, errors):
+    attempts = {}
+    waited = []
+
+    async def afetch_offer(ref):
+        attempts[ref.store_product_id] = attempts.get(ref.store_product_id, 0) + 1
+        if ref.store_product_id == "1" and attempts["1"] <= failures:
+            raise aiohttp.ClientConnectionError("reset")
+        return offer(ref)
+
+    def retry_at():
+        waited.append(True)
+        return time.monotonic() + 0.05
+
+    written = []
+    [stats] = asyncio.run(run_async([job(lambda: iter(refs(4)), afetch_offer)], upsert_fn=written.append,
+                                    retry_rounds=rounds, retry_at=retry_at))
+    assert (stats.retried, stats.errors) == (retried, errors)
+    assert len(written) == 4 - errors
+    assert waited
+
+
+def test_async_client_answers_not_modified_from_the_cache(tmp_path):
+    cache = HttpCache(str(tmp_path / "http.sqlite3"))
+
+    async def fetch(url):
+        async with AsyncHttpClient(cache=cache) as http:
+            return await http.fetch_bytes(url, conditional=True)
+
+    with StandIn("biblusi", pages=1) as site:
+        url = f"{site.base_url}/products/10001"
+        assert asyncio.run(fetch(url))
+        with pytest.raises(NotModified):
+            asyncio.run(fetch(url))
+    assert (cache.misses, cache.not_modified) == (1, 1)
+    cache.close()
+
+
+def test_token_bucket_reserve_spaces_out_callers():
+    bucket = TokenBucket(rate=10)
+    delays = [bucket.reserve() for _ in range(4)]
+    assert delays[0] == 0.0
+    assert delays[1:] == pytest.approx([0.1, 0.2, 0.3], abs=0.02)
+
+
+def test_async_client_uses_rate_limiter_and_controller():
+    controller = AdaptiveController(max_concurrency=4)
+    limiter = HostRateLimiter(default_rate=20)
+
+    async def fetch_all(urls):
+        async with AsyncHttpClient(rate_limiter=limiter, controller=controller) as http:
+            return await asyncio.gather(*(http.fetch_bytes(u) for u in urls))
+
+    with StandIn("biblusi", pages=1) as site:
+        urls = [f"{site.base_url}/products/{i}" for i in range(6)]
+        started = time.monotonic()
+        bodies = asyncio.run(fetch_all(urls))
+        elapsed = time.monotonic() - started
+
+    assert all(bodies)
+    st = controller.state("127.0.0.1")
+    assert st.samples == 6 and st.in_flight == 0
+    # Six requests at 20/s: the last one waits for its token
+    assert elapsed >= 0.2
@@ -0,0 +1,81 @@
+from dataclasses import replace
+
+from book_prices.adapters.biblusi import BiblusiAdapter, OUT_OF_STOCK_TEXT
+from book_prices.adapters.config import store_config
+from book_prices.core.models import Offer, ProductRef
+from book_prices.jobs.scheduler import CrawlScheduler
+
+BASE = "https://biblusi.example"
+
+
+class FakeHttp:
+    # Listing pages by URL; anything else is an empty listing
+    def __init__(self, pages):
+        self.pages = pages
+
+    def fetch_text(self, url):
+        return self.pages.get(url, "<html><body></body></html>")
+
+
+def card(pid, price="12.50 ₾", sold_out=False):
+    stock = f'<div class="product-card__stock">{OUT_OF_STOCK_TEXT}</div>' if sold_out else ""
+    return (
+        f'<div class="product-card"><a href="/products/{pid}"><div class="product-card__title">Book {pid}</div></a>'
+        f'<div class="product-card__price">{price}</div>{stock}<button class="product-card__cart"></button></div>'
+    )
+
+
+def bare_link(pid):
+    return f'<li class="tile"><a href="/products/{pid}">Book {pid}</a><span>12.50 ₾</span></li>'
+
+
+def page(*items):
+    return "<html><body>" + "".join(items) + "</body></html>"
+
+
+def url(category, n):
+    return f"{BASE}/products?category={category}&page={n}"
+
+
+def adapter(pages, categories=(1,)):
+    config = replace(store_config("biblusi"), base_url=BASE, categories=categories)
+    return BiblusiAdapter(FakeHttp(pages), config=config)
+
+
+def test_card_offers():
+    a = adapter({url(1, 1): page(card(1), card(2, sold_out=True))})
+    offers = list(a.list_offers())
+    assert [(o.store_product_id, o.price_gel, o.in_stock, o.title) for o in offers] == [
+        ("1", 12.5, None, "Book 1"), ("2", 12.5, False, "Book 2"),
+    ]
+
+
+def test_unreadable_cards_fall_back_to_links():
+    a = adapter({url(1, 1): page(card(1), card(2)), url(1, 2): page(bare_link(3), bare_link(4))})
+    items = list(a.list_offers())
+    assert [type(x) for x in items] == [Offer, Offer, ProductRef, ProductRef]
+    assert [x.store_product_id for x in items] == ["1", "2", "3", "4"]
+
+    scheduler = CrawlScheduler("biblusi", [])
+    planned = list(scheduler.iter_plan(items, on_unchanged=lambda ref: None))
+    assert len(planned) == 4
+    assert scheduler.stats["listing_no_card"] == 2
+
+
+def test_plain_listing_has_no_card_count():
+    a = adapter({url(1, 1): page(card(1), card(2))})
+    scheduler = CrawlScheduler("biblusi", [])
+    assert len(list(scheduler.iter_plan(a.iter_products()))) == 2
+    assert scheduler.stats["listing_no_card"] == 0
+
+
+def test_product_in_two_categories_is_listed_once():
+    a = adapter({
+        url(1, 1): page(card(1), card(2)),
+        url(2, 1): page(card(2), card(3)),
+        # Only products from category 1: still a full page, the listing goes on
+        url(2, 2): page(card(1)),
+        url(2, 3): page(card(4)),
+    }, categories=(1, 2))
+    assert [r.store_product_id for r in a.iter_products()] == ["1", "2", "3", "4"]
+    assert [o.store_product_id for o in a.list_offers()] == ["1", "2", "3", "4"]
@@ -0,0 +1,85 @@
+import threading
+
+import pytest
+
+from book_prices.core.models import Offer, ProductRef
+from book_prices.jobs.engine import BufferedWriter, Pipeline, StoreJob
+
+
+def refs(n: int, store: str = "s") -> list[ProductRef]:
+    return [ProductRef(store=store, url=f"https://{store}.example/p/{i}", store_product_id=str(i)) for i in range(n)]
+
+
+def offer(ref: ProductRef) -> Offer:
+    return Offer(store=ref.store, url=ref.url, title="t", price_gel=10.0, isbn=None, in_stock=True,
+                 store_product_id=ref.store_product_id)
+
+
+def job(products, fetch_page=lambda ref: b"<html></html>", parse_offer=lambda ref, html: offer(ref)) -> StoreJob:
+    return StoreJob(store="s", iter_products=lambda: iter(products), fetch_page=fetch_page, parse_offer=parse_offer)
+
+
+def run_with_timeout(pipeline: Pipeline, seconds: float = 20.0):
+    result = {}
+
+    def target():
+        try:
+            pipeline.run()
+        except BaseException as e:
+            result["error"] = e
+
+    t = threading.Thread(target=target, daemon=True)
+    t.start()
+    t.join(seconds)
+    assert not t.is_alive(), "pipeline hung"
+    return result.get("error")
+
+
+def test_writer_failure_aborts_instead_of_hanging():
+    def write_many(batch):
+        raise RuntimeError("db down")
+
+    writer = BufferedWriter(write_many, batch_size=2, flush_interval=0.05)
+    pipeline = Pipeline([job(refs(500))], writer, workers_per_store=2, parse_workers=2, queue_size=2)
+
+    error = run_with_timeout(pipeline)
+    assert isinstance(error, RuntimeError) and str(error) == "db down"
+
+
+def test_unexpected_fetch_error_counts_per_page():
+    def fetch_page(ref):
+        if ref.store_product_id in {"1", "3"}:
+            raise ValueError("adapter bug")
+        return b"<html></html>"
+
+    written = []
+    writer = BufferedWriter(lambda batch: written.extend(batch) or len(batch), batch_size=10, flush_interval=0.05)
+    pipeline = Pipeline([job(refs(20), fetch_page=fetch_page)], writer, workers_per_store=1, queue_size=2)
+
+    assert run_with_timeout(pipeline) is None
+    writer.close()
+    assert pipeline.stores["s"].errors == 2
+    assert len(written) == 18
+
+
+def test_parse_errors_do_not_stop_the_crawl():
+    def parse_offer(ref, html):
+        if ref.store_product_id == "0":
+            raise ValueError("bad page")
+        return offer(ref)
+
+    written = []
+    writer = BufferedWriter(lambda batch: written.extend(batch) or len(batch), batch_size=10, flush_interval=0.05)
+    pipeline = Pipeline([job(refs(5), parse_offer=parse_offer)], writer, workers_per_store=1, parse_workers=1)
+
+    assert run_with_timeout(pipeline) is None
+    writer.close()
+    assert pipeline.stores["s"].errors == 1
+    assert sorted(o.store_product_id for o in written) == ["1", "2", "3", "4"]
+
+
+def test_writer_error_is_reraised_on_close():
+    writer = BufferedWriter(lambda batch: 1 / 0, batch_size=1, flush_interval=0.05)
+    writer.add(offer(refs(1)[0]))
+    with pytest.raises(ZeroDivisionError):
+        writer.close()
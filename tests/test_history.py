@@ -0,0 +1,88 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from book_prices.storage.history import (
+    PACKED_POINT, build_series, daily_series, pack_points, raw_series, to_cents, unpack_points,
+)
+
+
+def at(day, hour=12):
+    return int(datetime(2024, 3, day, hour, tzinfo=timezone.utc).timestamp())
+
+
+def test_pack_round_trip():
+    points = [(at(1), 1250, True), (at(2), None, None), (at(3), 0, False)]
+    blob = pack_points(points)
+    assert len(blob) == 3 * PACKED_POINT.size
+    assert unpack_points(blob) == points
+    assert unpack_points(b"") == []
+
+
+@pytest.mark.parametrize("price, cents", [(12.5, 1250), ("9.99", 999), (0.1 + 0.2, 30), (None, None)])
+def test_to_cents(price, cents):
+    assert to_cents(price) == cents
+
+
+def test_days_are_bucketed_in_utc():
+    points = [
+        (at(2, 23), 1100, True),
+        (at(1, 0), 1000, True),
+        (at(1, 23), 1200, True),
+        (at(3, 0), 1100, False),
+    ]
+    assert daily_series(points) == [
+        {"date": "2024-03-01", "min": 10.0, "max": 12.0, "last": 12.0, "in_stock": True},
+        # Opens at the 12.00 the previous day closed with
+        {"date": "2024-03-02", "min": 11.0, "max": 12.0, "last": 11.0, "in_stock": True},
+        {"date": "2024-03-03", "min": 11.0, "max": 11.0, "last": 11.0, "in_stock": False},
+    ]
+
+
+def test_day_without_a_price_carries_the_last_one():
+    points = [(at(1), 1000, True), (at(2), None, False), (at(3), None, False)]
+    assert daily_series(points) == [
+        {"date": "2024-03-01", "min": 10.0, "max": 10.0, "last": 10.0, "in_stock": True},
+        {"date": "2024-03-02", "min": 10.0, "max": 10.0, "last": None, "in_stock": False},
+        {"date": "2024-03-03", "min": 10.0, "max": 10.0, "last": None, "in_stock": False},
+    ]
+    assert daily_series([(at(1), None, None)]) == [
+        {"date": "2024-03-01", "min": None, "max": None, "last": None, "in_stock": None},
+    ]
+
+
+def rows():
+    # Product 1's history is chunked in two rows, out of order
+    return [
+        (1, "biblusi", "https://biblusi.example/p/1", [(at(5), 900, True), (at(10), 800, True)]),
+        (2, "parnasi", "https://parnasi.example/p/2", [(at(6), 1500, False)]),
+        (1, "biblusi", "https://biblusi.example/p/1", [(at(1), 1000, True)]),
+    ]
+
+
+def test_raw_resolution():
+    series = build_series(rows(), resolution="raw")
+    assert [(s["store"], s["url"]) for s in series] == [
+        ("biblusi", "https://biblusi.example/p/1"), ("parnasi", "https://parnasi.example/p/2"),
+    ]
+    assert series[0]["points"] == raw_series([(at(1), 1000, True), (at(5), 900, True), (at(10), 800, True)])
+    assert series[0]["points"][0] == {"at": "2024-03-01T12:00:00+00:00", "price": 10.0, "in_stock": True}
+
+
+def test_day_resolution():
+    series = build_series(rows())
+    assert [d["date"] for d in series[0]["points"]] == ["2024-03-01", "2024-03-05", "2024-03-10"]
+    assert series[1]["points"] == [{"date": "2024-03-06", "min": 15.0, "max": 15.0, "last": 15.0, "in_stock": False}]
+
+
+def test_since_starts_at_the_last_price_before_it():
+    since = datetime(2024, 3, 7, tzinfo=timezone.utc)
+    series = build_series(rows(), since=since, resolution="raw")
+    # The 9.00 from March 5th is moved to the cut-off
+    assert series[0]["points"] == raw_series([(int(since.timestamp()), 900, True), (at(10), 800, True)])
+    assert series[1]["points"] == raw_series([(int(since.timestamp()), 1500, False)])
+
+    series = build_series(rows(), since=datetime(2024, 3, 11, tzinfo=timezone.utc))
+    assert series[0]["points"] == [{"date": "2024-03-11", "min": 8.0, "max": 8.0, "last": 8.0, "in_stock": True}]
+    # Nothing before the window: only what falls in it
+    assert build_series(rows(), since=datetime(2024, 2, 1, tzinfo=timezone.utc))[0]["points"][0]["date"] == "2024-03-01"
@@ -0,0 +1,142 @@
+import pytest
+
+from book_prices.core import http as http_module
+from book_prices.core.http import AdaptiveController, CircuitOpen, HttpClient
+
+HOST = "store.example"
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(http_module.time, "monotonic", c)
+    return c
+
+
+def request(controller, latency=0.1, ok=True, throttled=False):
+    controller.acquire(HOST)
+    controller.release(HOST, latency, ok=ok, throttled=throttled)
+
+
+def test_limit_grows_by_about_one_per_limits_worth_of_fast_successes(clock):
+    c = AdaptiveController(max_concurrency=4)
+    st = c.state(HOST)
+    assert st.limit == 1
+    limits = []
+    for _ in range(3):
+        request(c)
+        limits.append(st.limit)
+    assert limits == pytest.approx([2.0, 2.5, 2.9])
+    for _ in range(20):
+        request(c)
+    assert st.limit == 4
+
+
+def test_throttles_halve_the_limit_once_per_cooldown(clock):
+    c = AdaptiveController(max_concurrency=8, initial=8, cooldown=2.0)
+    st = c.state(HOST)
+    request(c, ok=False, throttled=True)
+    request(c, ok=False, throttled=True)
+    assert st.limit == 4
+    clock.now += 2.0
+    request(c, ok=False, throttled=True)
+    assert st.limit == 2
+    assert st.trips == 0
+
+
+def test_slow_responses_halve_the_limit(clock):
+    c = AdaptiveController(max_concurrency=8, initial=8, latency_target=5.0)
+    request(c, latency=6.0)
+    assert c.state(HOST).limit == 4
+    assert c.state(HOST).consecutive_failures == 0
+
+
+def test_try_acquire_respects_the_limit(clock):
+    c = AdaptiveController(max_concurrency=4, initial=2)
+    assert c.try_acquire(HOST) and c.try_acquire(HOST)
+    assert not c.try_acquire(HOST)
+    c.cancel(HOST)
+    assert c.try_acquire(HOST)
+    assert c.state(HOST).samples == 0
+
+
+def test_breaker_opens_after_consecutive_failures_and_probes_once(clock):
+    c = AdaptiveController(max_concurrency=4, initial=4, failures_to_open=3, open_for=60.0)
+    st = c.state(HOST)
+    for _ in range(3):
+        request(c, latency=None, ok=False)
+    assert st.trips == 1
+    assert c.retry_at() == 1060.0
+    with pytest.raises(CircuitOpen) as e:
+        c.acquire(HOST)
+    assert e.value.retry_in == pytest.approx(60.0)
+
+    clock.now += 60.0
+    c.acquire(HOST)  # the probe
+    with pytest.raises(CircuitOpen):
+        c.try_acquire(HOST)
+    c.release(HOST, 0.1, ok=True)
+    assert st.opened_at is None and st.limit == 1 and st.error_rate == 0.0
+    assert c.retry_at() == 0.0
+    c.acquire(HOST)
+
+
+def test_failed_probe_reopens_without_a_new_trip(clock):
+    c = AdaptiveController(failures_to_open=2, open_for=10.0)
+    st = c.state(HOST)
+    request(c, latency=None, ok=False)
+    request(c, latency=None, ok=False)
+    clock.now += 10.0
+    c.acquire(HOST)
+    c.release(HOST, None, ok=False)
+    assert st.trips == 1 and st.opened_at == clock.now
+    with pytest.raises(CircuitOpen):
+        c.acquire(HOST)
+
+
+def test_cancelled_probe_lets_the_next_request_probe(clock):
+    c = AdaptiveController(failures_to_open=1, open_for=10.0)
+    request(c, latency=None, ok=False)
+    clock.now += 10.0
+    c.acquire(HOST)
+    c.cancel(HOST)
+    c.acquire(HOST)
+    assert c.state(HOST).in_flight == 1
+
+
+def test_high_error_rate_opens_the_breaker(clock):
+    c = AdaptiveController(max_concurrency=4, failures_to_open=3, error_threshold=0.5, alpha=0.5)
+    for ok in [False, False, True, False, False, True, False, False]:
+        if c.state(HOST).opened_at is not None:
+            break
+        request(c, ok=ok)
+    assert c.state(HOST).trips == 1
+
+
+def test_timeout_follows_latency(clock):
+    c = AdaptiveController(min_timeout=10.0, max_timeout=25.0)
+    assert c.timeout(HOST) == 25.0
+    request(c, latency=0.5)
+    assert c.timeout(HOST) == 10.0
+    c.state(HOST).latency = 2.0
+    assert c.timeout(HOST) == 16.0
+
+
+def test_slot_is_returned_when_the_rate_limiter_raises():
+    class Limiter:
+        def acquire(self, url):
+            raise KeyboardInterrupt
+
+    c = AdaptiveController()
+    client = HttpClient(rate_limiter=Limiter(), controller=c)
+    with pytest.raises(KeyboardInterrupt):
+        client.fetch_bytes(f"https://{HOST}/p/1")
+    assert c.state(HOST).in_flight == 0
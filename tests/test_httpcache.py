@@ -0,0 +1,71 @@
+from book_prices.core.httpcache import HttpCache, content_hash
+from book_prices.core.models import Offer
+from book_prices.jobs.engine import BufferedWriter
+
+URL = "https://shop.example/p/1"
+
+
+def test_store_saves_validators_and_detects_identical_body(tmp_path):
+    cache = HttpCache(str(tmp_path / "c.sqlite3"))
+    assert cache.store(URL, '"v1"', "Mon, 01 Jan 2024 00:00:00 GMT", b"body") is False
+
+    entry = cache.get(URL)
+    assert entry.etag == '"v1"'
+    assert entry.last_modified == "Mon, 01 Jan 2024 00:00:00 GMT"
+    assert entry.content_hash == content_hash(b"body")
+
+    assert cache.store(URL, '"v2"', None, b"body", previous=entry) is True
+    assert cache.store(URL, '"v3"', None, b"other", previous=cache.get(URL)) is False
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+    cache.close()
+
+
+def test_deferred_validators_wait_for_commit(tmp_path):
+    cache = HttpCache(str(tmp_path / "c.sqlite3"), deferred=True)
+    cache.store(URL, '"v1"', None, b"body")
+    assert cache.get(URL) is None
+
+    assert cache.commit([URL, "https://shop.example/never-fetched"]) == 1
+    assert cache.get(URL).etag == '"v1"'
+    cache.close()
+
+
+def test_uncommitted_validators_are_dropped(tmp_path):
+    path = str(tmp_path / "c.sqlite3")
+    cache = HttpCache(path, deferred=True)
+    cache.store(URL, '"v1"', None, b"body")
+    cache.close()
+
+    # The page never reached the DB, so the next run must fetch it in full
+    assert HttpCache(path).get(URL) is None
+
+
+def test_eviction_keeps_most_recent(tmp_path):
+    cache = HttpCache(str(tmp_path / "c.sqlite3"), max_entries=2)
+    for i in range(4):
+        cache.store(f"{URL}/{i}", None, None, b"x")
+    cache.evict()
+    assert cache.get(f"{URL}/0") is None and cache.get(f"{URL}/3") is not None
+    cache.close()
+
+
+def offer(url: str) -> Offer:
+    return Offer(store="s", url=url, title=None, price_gel=1.0, isbn=None, in_stock=None)
+
+
+def test_writer_reports_urls_only_after_a_successful_write():
+    written = []
+    ok = BufferedWriter(lambda batch: len(batch), batch_size=10, flush_interval=0.05, on_written=written.extend)
+    ok.add(offer("a"))
+    ok.add(offer("b"))
+    ok.close()
+    assert written == ["a", "b"]
+
+    failed = []
+    broken = BufferedWriter(lambda batch: 1 / 0, batch_size=10, flush_interval=0.05, on_written=failed.extend)
+    broken.add(offer("c"))
+    try:
+        broken.close()
+    except ZeroDivisionError:
+        pass
+    assert failed == []
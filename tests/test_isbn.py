@@ -0,0 +1,55 @@
+import pytest
+
+from book_prices.core.parsing import isbn10_to_isbn13, isbn13_to_isbn10, normalize_isbn13, valid_isbn
+from book_prices.storage.common import isbn_prefix
+
+
+@pytest.mark.parametrize("isbn10, isbn13", [
+    ("0140447938", "9780140447934"),
+    ("080442957X", "9780804429573"),
+    ("9941233446", "9789941233449"),
+])
+def test_isbn10_isbn13_round_trip(isbn10, isbn13):
+    assert isbn10_to_isbn13(isbn10) == isbn13
+    assert isbn13_to_isbn10(isbn13) == isbn10
+
+
+def test_979_has_no_isbn10():
+    assert isbn13_to_isbn10("9791032305690") is None
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("978-0-14-044793-4", "9780140447934"),
+    ("0-14-044793-8", "9780140447934"),
+    ("080442957x", "9780804429573"),
+    ("9780140447935", None),   # bad check digit
+    ("0140447939", None),
+    ("12345", None),
+])
+def test_normalize_isbn13(raw, expected):
+    assert normalize_isbn13(raw) == expected
+
+
+def test_valid_isbn_keeps_the_form_it_was_given():
+    assert valid_isbn("0-14-044793-8") == "0140447938"
+
+
+@pytest.mark.parametrize("q, expected", [
+    # Numeric titles are searched as titles
+    ("1984", None),
+    ("451", None),
+    ("2666", None),
+    ("12345678", None),
+    ("the 39 steps", None),
+    # ISBN prefixes and whole ISBNs
+    ("978", "978"),
+    ("979-10", "97910"),
+    ("978 99412", "97899412"),
+    ("9780140447934", "9780140447934"),
+    ("0-14-044793-8", "9780140447934"),   # ISBN-10 becomes its ISBN-13
+    ("080442957x", "9780804429573"),
+    ("1234567890", "1234567890"),         # 10 digits, not a valid ISBN-10: kept as typed
+    ("97801404479345", None),             # too long
+])
+def test_isbn_prefix_routing(q, expected):
+    assert isbn_prefix(q) == expected
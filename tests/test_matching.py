@@ -0,0 +1,80 @@
+import random
+
+import pytest
+
+from book_prices.core.matching import BookTitle, TitleIndex, jaccard, numbers, prefix_length, trigrams
+
+
+def test_trigrams_are_padded():
+    assert trigrams("ab") == {" ab", "ab "}
+    assert jaccard(trigrams("ანა კარენინა"), trigrams("ანა კარენინა")) == 1.0
+    assert jaccard(frozenset(), trigrams("ab")) == 0.0
+
+
+def test_numbers_ignore_leading_zeros():
+    assert numbers("ჰარი პოტერი 02") == numbers("ჰარი პოტერი 2") == {"2"}
+    assert numbers("ტომი 0") == {"0"}
+
+
+@pytest.mark.parametrize("size, threshold, expected", [(10, 0.8, 3), (10, 1.0, 1), (7, 0.5, 4), (1, 0.8, 1)])
+def test_prefix_length(size, threshold, expected):
+    assert prefix_length(size, threshold) == expected
+
+
+def test_candidates_find_every_book_over_the_threshold():
+    # Prefix and length filtering must never drop a book brute force would link
+    rng = random.Random(7)
+    words = ["ანა", "კარენინა", "ომი", "და", "მშვიდობა", "იდიოტი", "ძმები", "კარამაზოვები", "ტომი"]
+    titles = sorted({" ".join(rng.choices(words, k=rng.randint(1, 4))) for _ in range(300)})
+    index = TitleIndex([BookTitle(i, t) for i, t in enumerate(titles)], threshold=0.6)
+    for t in titles[:60]:
+        grams = trigrams(t)
+        found = set(index.candidates(grams))
+        for idx, other in enumerate(index.grams):
+            if jaccard(grams, other) >= 0.6:
+                assert idx in found, (t, titles[idx])
+
+
+def book(book_id, title, stores=()):
+    return BookTitle(book_id, title, frozenset(stores))
+
+
+def test_threshold_boundary():
+    title = "ომი და მშვიდობა"
+    near = "ომი და მშვიდობ"
+    score = jaccard(trigrams(title), trigrams(near))
+    assert TitleIndex([book(1, title)], threshold=score).match(near).status == "matched"
+    result = TitleIndex([book(1, title)], threshold=score + 0.01).match(near)
+    assert result.book_id is None and result.status in ("below_threshold", "no_candidates")
+
+
+def test_exact_title_matches():
+    index = TitleIndex([book(1, "ომი და მშვიდობა"), book(2, "იდიოტი")])
+    result = index.match("ომი და მშვიდობა")
+    assert (result.book_id, result.score, result.status) == (1, 1.0, "matched")
+
+
+def test_runner_up_within_margin_is_ambiguous():
+    index = TitleIndex([book(1, "ძმები კარამაზოვები"), book(2, "ძმები კარამაზოვები")])
+    assert index.match("ძმები კარამაზოვები").status == "ambiguous"
+    index = TitleIndex([book(1, "ძმები კარამაზოვები"), book(2, "ძმები კარამაზოვ")], threshold=0.5, margin=0.05)
+    assert index.match("ძმები კარამაზოვები").book_id == 1
+
+
+def test_volume_numbers_must_agree():
+    index = TitleIndex([book(1, "ჰარი პოტერი 2")], threshold=0.6)
+    assert index.match("ჰარი პოტერი 3").status == "number_mismatch"
+    assert index.match("ჰარი პოტერი 02").book_id == 1
+
+
+def test_store_already_selling_the_book_is_skipped():
+    index = TitleIndex([book(1, "იდიოტი", stores=["biblusi"])])
+    assert index.match("იდიოტი", store="biblusi").status == "below_threshold"
+    assert index.match("იდიოტი", store="parnasi").book_id == 1
+
+
+def test_empty_title_has_no_candidates():
+    index = TitleIndex([book(1, "იდიოტი"), book(2, "")])
+    assert len(index) == 1
+    assert index.match(None).status == "no_candidates"
+    assert index.match("კარამაზოვები").status == "no_candidates"
@@ -0,0 +1,32 @@
+from pathlib import Path
+
+import pytest
+
+from book_prices.adapters.parnasi import ParnasiAdapter
+from book_prices.core.models import ProductRef
+
+FIXTURES = Path(__file__).resolve().parent.parent / "benchmarks" / "fixtures"
+
+
+def parse(html: bytes):
+    ref = ProductRef(store="parnasi", url="https://parnasi.example/product/omi/", store_product_id="omi")
+    return ParnasiAdapter(None).parse_offer(ref, html)
+
+
+@pytest.mark.parametrize("name", ["parnasi_product_omi-da-mshvidoba.html", "parnasi_product_jinsebis-taoba.html"])
+def test_fixture_pages(name):
+    offer = parse((FIXTURES / name).read_bytes())
+    assert offer.title and offer.price_gel and offer.isbn
+
+
+def test_isbn_and_stock_outside_the_product_container():
+    # Themes put the attributes table in a tab after div.product
+    offer = parse(
+        """<html><head><meta charset="utf-8"></head><body><header><a class="cart">0.00 ₾</a></header>
+        <div class="product"><h1>ომი და მშვიდობა</h1>
+          <div class="summary"><p class="price"><span>25.00 ₾</span></p></div></div>
+        <div class="woocommerce-tabs"><p class="stock">მარაგში</p>
+          <table><tr><th>ISBN</th><td>978-0-14-044793-4</td></tr></table></div>
+        </body></html>""".encode("utf-8")
+    )
+    assert (offer.title, offer.price_gel, offer.isbn, offer.in_stock) == ("ომი და მშვიდობა", 25.0, "9780140447934", True)
@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from book_prices.core.models import Offer, ProductRef
+from book_prices.jobs.scheduler import CrawlScheduler, CrawlState, listing_changed
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def state(pid="1", price=10.0, in_stock=True, isbn_known=True, fetched_ago=timedelta(hours=1)) -> CrawlState:
+    return CrawlState(
+        store_product_id=pid, url=f"https://shop.example/p/{pid}",
+        last_fetched_at=NOW - fetched_ago, last_changed_at=None,
+        fetch_count=1, change_count=0, unchanged_streak=0,
+        in_stock=in_stock, price_gel=price, isbn_known=isbn_known,
+    )
+
+
+def card(pid="1", price=10.0, in_stock=None) -> Offer:
+    return Offer(store="s", url=f"https://shop.example/p/{pid}", title=None, price_gel=price, isbn=None,
+                 in_stock=in_stock, store_product_id=pid)
+
+
+@pytest.mark.parametrize("stored_stock, card_price, card_stock, changed", [
+    (True, 10.0, None, False),     # card says nothing about stock
+    (True, 10.0, True, False),
+    (True, 10.004, None, False),   # same amount in cents
+    (True, 10.5, None, True),
+    (True, None, None, True),      # no price on the card
+    (True, 10.0, False, True),
+    (False, 10.0, True, True),
+    (False, 10.0, False, False),
+    # Cards that only mark sold-out books can't confirm a sold-out product still is
+    (False, 10.0, None, True),
+    (None, 10.0, None, False),
+])
+def test_listing_changed(stored_stock, card_price, card_stock, changed):
+    assert listing_changed(state(in_stock=stored_stock), card(price=card_price, in_stock=card_stock)) is changed
+
+
+def test_listing_changed_without_stored_price():
+    assert listing_changed(state(price=None), card()) is True
+
+
+def test_plan_settles_unchanged_cards_and_fetches_the_rest():
+    states = [
+        state("1"),                           # unchanged card
+        state("2", in_stock=False),           # back in stock: card no longer marks it
+        state("3", isbn_known=False),         # no ISBN yet: the card decides nothing, not due
+    ]
+    scheduler = CrawlScheduler("s", states, now=NOW)
+    settled = []
+    plan = list(scheduler.iter_plan([card("1"), card("2"), card("3"), card("4")], on_unchanged=settled.append))
+
+    assert [r.store_product_id for r in settled] == ["1"]
+    assert {r.store_product_id for r in plan} == {"2", "4"}
+    assert scheduler.stats["new"] == 1
+    assert scheduler.stats["listing_unchanged"] == 1 and scheduler.stats["listing_changed"] == 1
+
+
+def test_plan_respects_budget_and_due_dates():
+    states = [state("1", fetched_ago=timedelta(days=30)), state("2")]
+    scheduler = CrawlScheduler("s", states, max_products=2, now=NOW)
+    refs = [ProductRef(store="s", url=f"https://shop.example/p/{i}", store_product_id=str(i)) for i in (2, 5, 6)]
+
+    plan = [r.store_product_id for r in scheduler.iter_plan(refs)]
+    # "2" was fetched an hour ago and isn't due; the budget stops after two products
+    assert plan == ["5", "6"]
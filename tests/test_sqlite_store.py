@@ -0,0 +1,213 @@
+import pytest
+
+from book_prices.core.metrics import DB_SECONDS
+from book_prices.core.models import Offer
+from book_prices.storage.common import compared_key
+from book_prices.storage.sqlite import COMPARED_BOOKS_SQL, SqliteStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    db = SqliteStore(str(tmp_path / "books.sqlite3"))
+    db.init_schema()
+    yield db
+    db.close()
+
+
+def offer(pid="1", price=10.0, in_stock=True, isbn="9780140447934", title="Anna Karenina", store="biblusi") -> Offer:
+    return Offer(store=store, url=f"https://{store}.example/p/{pid}", title=title, price_gel=price, isbn=isbn,
+                 in_stock=in_stock, store_product_id=pid)
+
+
+def titles(rows):
+    return [r["title"] for r in rows]
+
+
+def test_numeric_titles_are_searchable(store):
+    store.upsert_offers([
+        offer("1", isbn="9780451524935", title="1984"),
+        offer("2", isbn="9780140447934", title="Anna Karenina"),
+        offer("3", isbn="9780374100148", title="2666"),
+    ])
+    assert titles(store.search_books("1984")) == ["1984"]
+    assert titles(store.search_books("2666")) == ["2666"]
+
+
+def test_isbn_queries(store):
+    store.upsert_offers([
+        offer("1", isbn="9780451524935", title="1984"),
+        offer("2", isbn="9780140447934", title="Anna Karenina"),
+    ])
+    assert titles(store.search_books("978-0-14")) == ["Anna Karenina"]
+    assert titles(store.search_books("0-14-044793-8")) == ["Anna Karenina"]
+    assert titles(store.search_books("978")) == ["Anna Karenina", "1984"]
+
+
+def test_duplicates_in_one_batch_compare_against_each_other(store):
+    store.preload_last_offers("biblusi")
+    assert store.upsert_offers([offer(price=10.0), offer(price=10.0), offer(price=11.0)]) == 2
+    assert store.upsert_offers([offer(price=11.0)]) == 0
+
+
+def test_rolled_back_batch_leaves_last_offer_cache_alone(store, monkeypatch):
+    store.preload_last_offers("biblusi")
+    assert store.upsert_offers([offer(price=10.0)]) == 1
+
+    def fail(*args):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(store, "_append_history", fail)
+    with pytest.raises(RuntimeError):
+        store.upsert_offers([offer(price=12.0)])
+    monkeypatch.undo()
+
+    # 12.0 never committed, so writing it again is a change
+    assert store.upsert_offers([offer(price=12.0)]) == 1
+
+
+def compared_catalogue(store):
+    # Three books in three stores, two in two, three in one
+    books = [
+        ("9780140447934", "Anna Karenina", ["biblusi", "parnasi", "books"]),
+        ("9780451524935", "1984", ["biblusi", "parnasi", "books"]),
+        ("9780374100148", "2666", ["biblusi", "parnasi", "books"]),
+        ("9780141439518", "Pride and Prejudice", ["biblusi", "parnasi"]),
+        ("9780143105428", "Middlemarch", ["parnasi", "books"]),
+        ("9780060883287", "One Hundred Years of Solitude", ["biblusi"]),
+        ("9780679720201", "The Stranger", ["books"]),
+        ("9780140449136", "Crime and Punishment", ["parnasi"]),
+    ]
+    store.upsert_offers([
+        offer(isbn, isbn=isbn, title=title, store=s, price=10.0 + i)
+        for isbn, title, stores in books
+        for i, s in enumerate(stores)
+    ])
+    store.refresh_compared_books()
+    return books
+
+
+def test_compared_books_need_a_refresh(store):
+    store.upsert_offers([offer("1")])
+    assert store.get_compared_books() == []
+    assert store.list_stores() == []
+    assert store.refresh_compared_books() == 1
+    assert store.list_stores() == ["biblusi"]
+    assert store.get_compared_books() == [
+        {"title": "Anna Karenina", "isbn": "9780140447934", "biblusi": 10.0, "store_count": 1}
+    ]
+
+
+def test_compared_books_keyset_pages(store):
+    compared_catalogue(store)
+    full = store.get_compared_books(limit=100)
+    assert [r["store_count"] for r in full] == [3, 3, 3, 2, 2, 1, 1, 1]
+    assert titles(full[:3]) == ["1984", "2666", "Anna Karenina"]
+    assert full[3] == {"title": "Middlemarch", "isbn": "9780143105428", "biblusi": None, "books": 11.0,
+                       "parnasi": 10.0, "store_count": 2}
+
+    pages, after = [], None
+    while True:
+        page = store.get_compared_books(limit=3, after=after)
+        if not page:
+            break
+        pages.append(page)
+        after = compared_key(page[-1])
+    assert [len(p) for p in pages] == [3, 3, 2]
+    assert [r for p in pages for r in p] == full
+    assert list(store.iter_compared_books(batch_size=2)) == full
+
+
+def test_compared_books_page_is_an_index_seek(store):
+    compared_catalogue(store)
+    sql = COMPARED_BOOKS_SQL.format(after="WHERE (-store_count, sort_title, isbn13) > (?, ?, ?)", limit="LIMIT ?")
+    plan = " ".join(r[-1] for r in store.conn.execute("EXPLAIN QUERY PLAN " + sql, (-2, "", "", 3)))
+    assert "idx_compared_books_order" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def run_title_matching(store):
+    # What jobs.match_titles does for products it hasn't seen yet
+    from book_prices.core.matching import BookTitle, TitleIndex
+    index = TitleIndex([BookTitle(b, t, frozenset(s)) for b, t, s in store.load_match_books()])
+    todo = store.load_unmatched_products()
+    matches = [(sp_id, r.book_id, r.score) for sp_id, s, t in todo for r in [index.match(t, s)] if r.book_id]
+    return store.save_matches(matches, [p[0] for p in todo])
+
+
+def product_book(store, pid, shop="parnasi"):
+    row = store.conn.execute(
+        "SELECT b.isbn13, sp.match_method FROM store_products sp LEFT JOIN books b ON b.id = sp.book_id"
+        " WHERE sp.store = ? AND sp.store_product_id = ?", (shop, pid),
+    ).fetchone()
+    return tuple(row)
+
+
+def test_retitled_product_is_matched_again(store):
+    store.upsert_offers([
+        offer("1", isbn="9780140447934", title="Anna Karenina"),
+        offer("2", isbn="9780140449136", title="Crime and Punishment"),
+        offer("7", isbn=None, title="Anna Karenina", store="parnasi"),
+    ])
+    assert run_title_matching(store) == 1
+    assert product_book(store, "7") == ("9780140447934", "title")
+
+    # The store reuses product id 7 for another book
+    store.upsert_offers([offer("7", isbn=None, title="Crime and Punishment", store="parnasi", price=11.0)])
+    assert product_book(store, "7") == (None, None)
+    assert run_title_matching(store) == 1
+    assert product_book(store, "7") == ("9780140449136", "title")
+
+
+def test_unchanged_title_keeps_its_links(store):
+    store.upsert_offers([
+        offer("1", isbn="9780140447934", title="Anna Karenina"),
+        offer("7", isbn=None, title="Anna Karenina", store="parnasi"),
+        offer("8", isbn="9780140447934", title="Anna Karenina", store="books"),
+    ])
+    assert run_title_matching(store) == 1
+    store.upsert_offers([
+        offer("7", isbn=None, title="Anna Karenina", store="parnasi", price=12.0),
+        offer("8", isbn=None, title="Anna Karenina (new cover)", store="books", price=12.0),
+    ])
+    assert product_book(store, "7") == ("9780140447934", "title")
+    # An ISBN link isn't dropped by a title change
+    assert product_book(store, "8", shop="books") == ("9780140447934", "isbn")
+
+
+def statement_ops():
+    return {dict(key)["op"] for key, _ in DB_SECONDS.export() if dict(key)["backend"] == "sqlite"}
+
+
+def test_statements_are_labelled_by_store_method(store):
+    DB_SECONDS.reset()
+    store.upsert_offers([offer("1"), offer("2", isbn="9780451524935", title="1984")])
+    store.refresh_compared_books()
+    list(store.iter_compared_books(batch_size=1))
+    assert statement_ops() == {"upsert_offers", "refresh_compared_books", "iter_compared_books"}
+
+
+def test_books_by_isbns(store):
+    store.upsert_offers([
+        offer("1", price=12.0),
+        offer("2", price=9.0, store="parnasi"),
+        offer("3", price=7.0, in_stock=False, store="books"),
+        # Stored under its ISBN-10, as some stores print it
+        offer("4", isbn="080442957X", title="Walden"),
+    ])
+    found = store.get_books_by_isbns(["9780140447934", "9780804429573", "9780451524935"])
+    assert sorted(found) == ["9780140447934", "9780804429573"]
+
+    book, offers = found["9780140447934"]
+    assert book["title"] == "Anna Karenina"
+    # In stock first, then cheapest
+    assert [(o["store"], o["price_gel"], o["in_stock"]) for o in offers] == [
+        ("parnasi", 9.0, True), ("biblusi", 12.0, True), ("books", 7.0, False),
+    ]
+    book, offers = found["9780804429573"]
+    assert (book["isbn13"], [o["store"] for o in offers]) == ("080442957X", ["biblusi"])
+
+
+def test_books_by_isbns_without_isbns(store):
+    store.upsert_offers([offer("1")])
+    assert store.get_books_by_isbns([]) == {}
+    assert store.get_books_by_isbns(["9780451524935"]) == {}
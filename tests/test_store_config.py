@@ -0,0 +1,140 @@
+import json
+from pathlib import Path
+
+import pytest
+import requests
+
+from book_prices.adapters.config import StoreConfig, config_from_dict, load_stores, store_config
+from book_prices.adapters.generic import GenericAdapter
+from book_prices.adapters.registry import adapter_class, build_adapter
+from book_prices.core.models import ProductRef
+
+EXAMPLE = Path(__file__).resolve().parent.parent / "book_prices" / "adapters" / "stores.example.json"
+
+
+def write_config(tmp_path, stores):
+    path = tmp_path / "stores.json"
+    path.write_text(json.dumps(stores), encoding="utf-8")
+    return str(path)
+
+
+def test_override_merges_into_the_builtin_store(tmp_path):
+    path = write_config(tmp_path, [{"store": "biblusi", "rate": 1.5, "categories": [7, 8]}])
+    [biblusi] = load_stores(path, only="biblusi")
+    builtin = store_config("biblusi")
+    assert (biblusi.rate, biblusi.categories) == (1.5, (7, 8))
+    assert (biblusi.adapter, biblusi.base_url, biblusi.listing_url) == (builtin.adapter, builtin.base_url, builtin.listing_url)
+
+
+def test_unknown_keys_are_rejected():
+    with pytest.raises(ValueError, match="selector"):
+        config_from_dict({"store": "books", "adapter": "generic", "base_url": "https://b.example", "selector": {}})
+
+
+def test_stores_filter_and_disabled_stores(tmp_path):
+    path = write_config(tmp_path, [
+        {"store": "books", "adapter": "generic", "base_url": "https://b.example", "enabled": False},
+        {"store": "more", "adapter": "generic", "base_url": "https://m.example"},
+    ])
+    assert [c.store for c in load_stores(path, only="")] == ["biblusi", "parnasi", "more"]
+    assert [c.store for c in load_stores(path, only=" more, parnasi ,")] == ["parnasi", "more"]
+    assert load_stores(path, only="books") == []
+
+
+def test_env_is_read_when_no_arguments(tmp_path, monkeypatch):
+    monkeypatch.setenv("STORES_CONFIG", write_config(tmp_path, [{"store": "parnasi", "workers": 1}]))
+    monkeypatch.setenv("STORES", "parnasi")
+    [parnasi] = load_stores()
+    assert parnasi.workers == 1
+
+
+def test_example_config_loads(monkeypatch):
+    monkeypatch.delenv("STORES", raising=False)
+    stores = {c.store: c for c in load_stores(str(EXAMPLE), only="")}
+    # "books" ships disabled; parnasi gets its rate override
+    assert "books" not in stores and stores["parnasi"].rate == 2
+
+
+def test_adapter_names():
+    assert adapter_class("generic") is GenericAdapter
+    assert adapter_class("book_prices.adapters.generic:GenericAdapter") is GenericAdapter
+    with pytest.raises(KeyError):
+        adapter_class("nope")
+    with pytest.raises(TypeError):
+        adapter_class("book_prices.adapters.config:StoreConfig")
+
+
+def example_books() -> StoreConfig:
+    [books] = [d for d in json.loads(EXAMPLE.read_text(encoding="utf-8")) if d["store"] == "books"]
+    return config_from_dict(books)
+
+
+def response(status):
+    r = requests.Response()
+    r.status_code = status
+    return r
+
+
+class FakeHttp:
+    def __init__(self, pages):
+        self.pages = pages
+
+    def fetch_text(self, url):
+        if url not in self.pages:
+            raise requests.HTTPError(response=response(404))
+        return self.pages[url]
+
+
+def listing(*cards):
+    return "<html><body><ul>" + "".join(cards) + "</ul></body></html>"
+
+
+def card(slug, price, stock="instock", href=None):
+    return (
+        f'<li class="product {stock}"><a class="product-link" href="{href or f"/product/{slug}/"}">'
+        f'<h2 class="product-title">{slug.title()}</h2></a>'
+        f'<span class="price"><del><span class="amount">99.00 ₾</span></del>'
+        f'<ins><span class="amount">{price} ₾</span></ins></span></li>'
+    )
+
+
+def test_generic_listing_with_the_example_selectors():
+    config = example_books()
+    pages = {
+        "https://books.example/catalog/12?page=1": listing(
+            card("dune", "25.00"), card("emma", "12,50", stock="outofstock"),
+            card("elsewhere", "1.00", href="https://other.example/product/x/"),
+            card("not-a-product", "1.00", href="/blog/post/"),
+        ),
+        "https://books.example/catalog/12?page=2": listing(card("dune", "25.00")),
+        "https://books.example/catalog/40?page=1": listing(card("ulysses", "30.00")),
+    }
+    adapter = build_adapter(config, FakeHttp(pages))
+    offers = list(adapter.list_offers(max_pages=3))
+    assert [(o.store_product_id, o.title, o.price_gel, o.in_stock) for o in offers] == [
+        ("dune", "Dune", 25.0, True), ("emma", "Emma", 12.5, False), ("ulysses", "Ulysses", 30.0, True),
+    ]
+    assert [r.store_product_id for r in adapter.iter_products(max_pages=3)] == ["dune", "emma", "ulysses"]
+
+
+def test_generic_product_page_with_the_example_selectors():
+    adapter = build_adapter(example_books(), None)
+    html = """<html><head><meta charset="utf-8"></head><body>
+      <div class="cart">Cart 5.00 ₾</div>
+      <div class="product"><h1>Dune</h1>
+        <p class="price"><span class="amount">32.00 ₾</span></p>
+        <p>In stock</p><p>ISBN: 978-0-441-17271-9</p></div>
+    </body></html>""".encode("utf-8")
+    offer = adapter.parse_offer(ProductRef(store="books", url="https://books.example/product/dune/", store_product_id="dune"), html)
+    # product_region keeps the header cart's amount out; product_price picks the price
+    assert (offer.title, offer.price_gel, offer.isbn, offer.in_stock) == ("Dune", 32.0, "9780441172719", True)
+
+
+def test_generic_adapter_validates_its_selectors():
+    config = example_books()
+    with pytest.raises(ValueError, match="unknown selectors"):
+        GenericAdapter(None, config=config_from_dict({"selectors": {**config.selectors, "cards": "li"}}, config))
+    with pytest.raises(ValueError, match="needs listing_url"):
+        GenericAdapter(None, config=config_from_dict({"selectors": {"link": "a"}}, config))
+    with pytest.raises(ValueError):
+        GenericAdapter(None)